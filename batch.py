@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Batch mode: a pool of warm worker processes pulls PDFs from a queue.
+
+Each worker imports the pipeline (cv2, numpy, pytesseract) once at start-up
+and then processes documents until the pool is shut down. Tesseract and the
+numeric libraries are pinned to one thread per worker so N workers use N
+cores instead of oversubscribing them.
+
+    python3 batch.py [--workers N] [PDF or folder ...]
+    python3 batch.py --split SCAN.pdf     # scanned stacks, see split_batch.py
+    python3 batch.py --pipelined [...]    # one process, stages overlapped (scheduler.py)
+
+Jobs left unfinished by an interrupted run (see journal.py) are resumed
+first. Send SIGUSR1 for a per-stage latency summary while the batch runs.
+"""
+import os, sys, argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import journal
+from extractors import telemetry
+
+INCOMING_DIR = "incoming"
+WORKERS = int(os.environ.get("INVOICEBRAIN_WORKERS", os.cpu_count() or 1))
+
+# Thread limits for every library that would otherwise grab all cores
+THREAD_ENV = {
+    "OMP_THREAD_LIMIT": "1",  # tesseract ≥ 4
+    "OMP_NUM_THREADS": "1",
+    "OPENBLAS_NUM_THREADS": "1",
+    "MKL_NUM_THREADS": "1",
+}
+
+
+def _init_worker():
+    os.environ.update(THREAD_ENV)
+    import cv2
+    cv2.setNumThreads(1)
+    import pipeline  # noqa: F401  warm the imports before the first document
+
+
+def _run(pdf_path: str, force: bool = False, debug: bool = None) -> dict:
+    from pipeline import process
+    return process(pdf_path, force=force, debug=debug)
+
+
+def _resume(job_id: int, debug: bool = None):
+    from pipeline import resume
+    return resume(job_id, debug=debug)
+
+
+class WorkerPool:
+    """Long-lived pool of pipeline workers."""
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = max(1, workers)
+        # Spawned workers re-import the parent's __main__ (and with it numpy /
+        # cv2) before the initializer runs: the limits must already be in the
+        # environment they inherit.
+        os.environ.update(THREAD_ENV)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    def submit(self, pdf_path: str, force: bool = False, debug: bool = None):
+        return self.executor.submit(_run, pdf_path, force, debug)
+
+    def submit_resume(self, job_id: int, debug: bool = None):
+        return self.executor.submit(_resume, job_id, debug)
+
+    def run(self, pdf_paths, force: bool = False, debug: bool = None, job_ids=()):
+        """Process all paths and resume the given journal jobs.
+
+        `pdf_paths` may be a generator: each path is submitted as soon as it
+        is produced. Yields (path or job id, result, error) as they
+        complete; the result of a job another process holds is None.
+        """
+        futures = {self.submit_resume(j, debug): j for j in job_ids}
+        futures.update({self.submit(p, force, debug): p for p in pdf_paths})
+        for fut in as_completed(futures):
+            try:
+                yield futures[fut], fut.result(), None
+            except Exception as e:
+                yield futures[fut], None, e
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+
+def collect_pdfs(targets):
+    pdfs = []
+    for t in targets:
+        if os.path.isdir(t):
+            pdfs.extend(
+                os.path.join(t, f) for f in sorted(os.listdir(t)) if f.lower().endswith(".pdf")
+            )
+        elif t.lower().endswith(".pdf"):
+            pdfs.append(t)
+    return pdfs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process PDFs with a pool of workers.")
+    parser.add_argument("targets", nargs="*", default=[INCOMING_DIR],
+                        help="PDF files or folders (default: incoming/)")
+    parser.add_argument("-w", "--workers", type=int, default=WORKERS,
+                        help=f"number of worker processes (default: {WORKERS})")
+    parser.add_argument("--force", action="store_true",
+                        help="ignore the result cache and reprocess every document")
+    parser.add_argument("--debug", action="store_true",
+                        help="write debug artifacts for every document (default: INVOICEBRAIN_DEBUG)")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="run in this process with overlapping stages (scheduler.py); "
+                             "--workers then sets the documents in OCR at a time")
+    parser.add_argument("--split", action="store_true",
+                        help="targets are scanned stacks: split them into documents on the fly")
+    args = parser.parse_args()
+
+    # Unfinished work of an interrupted run first: its originals already
+    # left incoming/, only the journal knows about them.
+    released = journal.recover()
+    jobs = journal.due(limit=None)
+    pdfs = collect_pdfs(args.targets)
+    if not pdfs and not jobs:
+        print("ℹ️ No PDFs to process.")
+        return
+
+    kind = "scanned stacks" if args.split else "PDFs"
+    print(f"🚀 Processing {len(pdfs)} {kind} and resuming {len(jobs)} jobs "
+          f"({released} orphaned) with {args.workers} workers")
+    if args.pipelined:
+        from scheduler import AsyncPipeline
+        pool = AsyncPipeline(ocr_workers=args.workers)
+    else:
+        pool = WorkerPool(args.workers)
+    telemetry.install_summary_signal()
+    if args.split:
+        # Pages are classified here while the workers extract the
+        # documents already cut
+        import split_batch
+        pdfs = split_batch.split_all(pdfs)
+    total = failed = 0
+    try:
+        for item, result, error in pool.run(pdfs, force=args.force,
+                                            debug=True if args.debug else None, job_ids=jobs):
+            total += 1
+            label = f"job {item}" if isinstance(item, int) else item
+            if error is not None:
+                failed += 1
+                print(f"❌ {label}: {error}")
+            elif result is not None:
+                print(f"✅ {label} → {result['path']} ({result['type']})")
+    finally:
+        pool.shutdown()
+
+    print(f"🏁 Done: {total - failed} ok, {failed} failed")
+    telemetry.print_summary(last=total)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
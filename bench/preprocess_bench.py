@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: crop preprocessing before/after extractors/preprocess.py.
+
+"legacy" is the chain each crop script used to run on an RGB render
+(cvtColor + a fresh buffer per step, gamma table rebuilt per call);
+"gray" is extractors.preprocess on a grayscale render (pdftoppm -gray),
+in steady state (scratch buffers already sized). For every chain it prints
+the median time per crop and the peak memory allocated while processing
+one crop (tracemalloc sees numpy/OpenCV output buffers). The RO chains pick
+their denoising filter from the measured noise; run with
+INVOICEBRAIN_DENOISE=nlm to compare them with the legacy output.
+
+    python3 bench/preprocess_bench.py [--repeat 30] [--dpi 300]
+"""
+import os, sys, time, argparse, statistics, tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import cv2
+
+from extractors import preprocess as prep
+from extractors.header.PO_Header_Crop import HEADER_BOX as PO_HEADER_BOX
+from extractors.header.RO_Header_Crop import HEADER_BOX as RO_HEADER_BOX
+from extractors.footer.PO_Total_Crop import FOOTER_BOX as PO_FOOTER_BOX
+from extractors.footer.RO_Total_Crop import FOOTER_BOX as RO_FOOTER_BOX
+
+A4_INCHES = (8.27, 11.69)
+
+
+# --- Chains as they were inlined in the crop scripts -------------------------
+def legacy_po_header(crop):
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    table = np.array([(i / 255.0) ** (1 / 0.6) * 255 for i in np.arange(256)]).astype("uint8")
+    gray = cv2.LUT(gray, table)
+    gray = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(gray)
+    bg = cv2.morphologyEx(gray, cv2.MORPH_OPEN,
+                          cv2.getStructuringElement(cv2.MORPH_RECT, (25, 25)))
+    norm = cv2.normalize(cv2.subtract(gray, bg), None, 0, 255, cv2.NORM_MINMAX)
+    _, th = cv2.threshold(norm, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return cv2.bitwise_not(th)
+
+
+def legacy_ro_header(crop):
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    gray = cv2.fastNlMeansDenoising(gray, h=20)
+    gray = cv2.bilateralFilter(gray, 7, 75, 75)
+    gray = cv2.convertScaleAbs(gray, alpha=1.7, beta=0)
+    _, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return cv2.bitwise_not(th)
+
+
+def legacy_po_footer(crop):
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    gray = cv2.convertScaleAbs(gray, alpha=1.7, beta=0)
+    gray = cv2.bilateralFilter(gray, 7, 75, 75)
+    _, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return th
+
+
+def legacy_ro_footer(crop):
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    gray = cv2.convertScaleAbs(gray, alpha=2.0, beta=0)
+    gray = cv2.fastNlMeansDenoising(gray, h=20)
+    th = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                               cv2.THRESH_BINARY_INV, 31, 8)
+    return cv2.bitwise_not(cv2.dilate(th, np.ones((2, 2), np.uint8), iterations=1))
+
+
+CHAINS = [
+    ("po_header", PO_HEADER_BOX, legacy_po_header, prep.po_header),
+    ("ro_header", RO_HEADER_BOX, legacy_ro_header, prep.ro_header),
+    ("po_footer", PO_FOOTER_BOX, legacy_po_footer, prep.po_footer),
+    ("ro_footer", RO_FOOTER_BOX, legacy_ro_footer, prep.ro_footer),
+]
+
+
+def synthetic_crop(box, dpi, seed=0):
+    """Scan-like RGB crop of `box`: dark text lines on paper with noise."""
+    w = int(A4_INCHES[0] * dpi * (box[2] - box[0]))
+    h = int(A4_INCHES[1] * dpi * (box[3] - box[1]))
+    img = np.full((h, w, 3), 235, np.uint8)
+    scale = dpi / 150
+    for i, y in enumerate(range(int(40 * scale), h, int(45 * scale))):
+        cv2.putText(img, f"Total HT : {123456 + i * 791:,} DAC{4500000 + i} 12/03/2024",
+                    (int(10 * scale), y), cv2.FONT_HERSHEY_SIMPLEX, 0.6 * scale,
+                    (30, 30, 30), max(1, int(scale)))
+    noise = np.random.default_rng(seed).normal(0, 12, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+
+def measure(fn, crop, repeat):
+    fn(crop)  # warm-up: scratch buffers, CLAHE, OpenCV thread pools
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(crop)
+        times.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    fn(crop)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare crop preprocessing chains.")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--dpi", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'chain':<11}{'crop':>12}{'legacy ms':>11}{'gray ms':>9}"
+          f"{'legacy kB':>11}{'gray kB':>9}  same")
+    for name, box, legacy, new in CHAINS:
+        rgb = synthetic_crop(box, args.dpi)
+        gray = cv2.cvtColor(rgb, cv2.COLOR_BGR2GRAY)
+        old_ms, old_kb = measure(legacy, rgb, args.repeat)
+        new_ms, new_kb = measure(new, gray, args.repeat)
+        same = np.array_equal(legacy(rgb), new(gray))
+        print(f"{name:<11}{f'{rgb.shape[1]}x{rgb.shape[0]}':>12}{old_ms:>11.2f}{new_ms:>9.2f}"
+              f"{old_kb:>11.0f}{new_kb:>9.0f}  {'yes' if same else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
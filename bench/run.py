@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Benchmark: throughput, stage latency, memory and field accuracy.
+
+Generates synthetic documents (bench/synth.py) into a scratch working
+directory, runs the real pipeline over them (detection, header and footer
+extraction, file moves) and compares the extracted fields with the ground
+truth. The report is printed and written as JSON; with --baseline, the run
+fails when field accuracy drops more than --budget below the baseline, so
+speed work cannot silently cost accuracy.
+
+    python3 bench/run.py [--count N] [--workers N] [--out report.json]
+                         [--baseline old.json --budget 0.01]
+"""
+import os, sys, json, time, shutil, resource, argparse, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synth import generate
+
+FIELDS = ["document_type", "date", "date_norm", "order_number", "supplier_code",
+          "reception_number", "total_ht", "total_tax", "total_ttc"]
+
+
+def field_match(expected, got) -> bool:
+    if isinstance(expected, float):
+        return got is not None and abs(float(got) - expected) < 0.005
+    return str(expected) == str(got)
+
+
+def score(truths: dict, results: dict) -> dict:
+    """Per-field and per-variant accuracy over all documents."""
+    per_field, per_variant = {}, {}
+    for name, truth in truths.items():
+        res = results.get(name) or {}
+        fields = res.get("fields") or {}
+        type_ok = res.get("type") == truth["document_type"]
+        for f in FIELDS:
+            if f not in truth:
+                continue
+            ok = type_ok if f == "document_type" else field_match(truth[f], fields.get(f))
+            for bucket, key in ((per_field, f), (per_variant, truth["variant"])):
+                hit, n = bucket.get(key, (0, 0))
+                bucket[key] = (hit + ok, n + 1)
+    ratio = lambda d: {k: round(h / n, 4) for k, (h, n) in sorted(d.items())}
+    hits = sum(h for h, _ in per_field.values())
+    total = sum(n for _, n in per_field.values())
+    return {"overall": round(hits / total, 4) if total else None,
+            "fields": ratio(per_field), "variants": ratio(per_variant)}
+
+
+DENOISE_FIELDS = {
+    "header": ["date", "date_norm", "order_number", "reception_number", "supplier_code"],
+    "footer": ["total_ht", "total_tax", "total_ttc"],
+}
+
+
+def denoise_paths(spans_log: str) -> dict:
+    """document → {header_denoise, footer_denoise} from the telemetry log."""
+    paths = {}
+    with open(spans_log, encoding="utf-8") as f:
+        for line in f:
+            doc = json.loads(line)
+            paths[doc["document"]] = {k: v for k, v in doc.items() if k.endswith("_denoise")}
+    return paths
+
+
+def score_groups(truths: dict, results: dict, paths: dict, key: str, fields) -> dict:
+    """Accuracy of `fields`, grouped by the denoising path recorded under `key`."""
+    groups = {}
+    for name, truth in truths.items():
+        path = paths.get(name, {}).get(key)
+        if path is None:
+            continue  # text layer / cache: no OCR preprocessing
+        got = (results.get(name) or {}).get("fields") or {}
+        for f in fields:
+            if f in truth:
+                hit, n = groups.get(path, (0, 0))
+                groups[path] = (hit + field_match(truth[f], got.get(f)), n + 1)
+    return {k: {"accuracy": round(h / n, 4), "fields": n} for k, (h, n) in sorted(groups.items())}
+
+
+def run(count: int, workers: int, seed: int, keep: str = None) -> dict:
+    work = keep or tempfile.mkdtemp(prefix="invoicebrain-bench-")
+    corpus = os.path.join(work, "corpus")
+    truths = generate(corpus, count, seed)
+
+    # The pipeline uses cwd-relative data/ folders: run it inside the scratch dir
+    os.chdir(work)
+    os.environ["INVOICEBRAIN_SPANS_LOG"] = os.path.join(work, "spans.jsonl")
+    os.makedirs("incoming", exist_ok=True)
+    inputs = {}
+    for name in truths:
+        inputs[name] = os.path.join("incoming", name)
+        shutil.copy(os.path.join(corpus, name), inputs[name])
+
+    from extractors import telemetry
+    results = {}
+    start = time.perf_counter()
+    if workers > 1:
+        from batch import WorkerPool
+        pool = WorkerPool(workers)
+        by_path = {p: n for n, p in inputs.items()}
+        try:
+            for path, result, error in pool.run(list(inputs.values()), force=True):
+                results[by_path[path]] = result or {"error": str(error)}
+        finally:
+            pool.shutdown()
+    else:
+        from pipeline import process
+        for name, path in inputs.items():
+            try:
+                results[name] = process(path, force=True)
+            except Exception as e:
+                results[name] = {"error": str(e)}
+    elapsed = time.perf_counter() - start
+
+    stages = telemetry.summary(os.environ["INVOICEBRAIN_SPANS_LOG"])
+    paths = denoise_paths(os.environ["INVOICEBRAIN_SPANS_LOG"])
+    report = {
+        "documents": count,
+        "workers": workers,
+        "seconds": round(elapsed, 2),
+        "docs_per_sec": round(count / elapsed, 3) if elapsed else None,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "child_peak_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        "errors": sum("error" in r for r in results.values()),
+        "accuracy": score(truths, results),
+        "denoise": {
+            part: score_groups(truths, results, paths, f"{part}_denoise", fields)
+            for part, fields in DENOISE_FIELDS.items()
+        },
+        "stages": stages["stages"],
+    }
+    if not keep:
+        os.chdir(ROOT)
+        shutil.rmtree(work, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic PO/RO PDFs.")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--keep", help="keep the scratch directory at this path")
+    parser.add_argument("--out", default=os.path.join(ROOT, "bench_output.json"))
+    parser.add_argument("--baseline", help="previous report to compare accuracy with")
+    parser.add_argument("--budget", type=float, default=0.01,
+                        help="allowed drop in overall accuracy vs the baseline")
+    args = parser.parse_args()
+
+    report = run(args.count, args.workers, args.seed, args.keep)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    acc = report["accuracy"]
+    print(f"\n📊 {report['documents']} docs in {report['seconds']} s "
+          f"({report['docs_per_sec']} docs/s, {report['workers']} workers), "
+          f"peak RSS {report['peak_rss_kb']} kB, errors {report['errors']}")
+    print(f"🎯 Accuracy {acc['overall']}  by variant {acc['variants']}")
+    for part, groups in report["denoise"].items():
+        if groups:
+            print(f"🧹 {part} denoise paths {groups}")
+    for field, value in acc["fields"].items():
+        print(f"   {field:<18}{value}")
+    print(f"{'stage':<14}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, v in report["stages"].items():
+        print(f"{stage:<14}{v['count']:>6}{v['wall_p50_ms']:>10}{v['wall_p95_ms']:>10}{v['wall_p99_ms']:>10}")
+    print(f"📝 Report written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f)["accuracy"]["overall"]
+        if acc["overall"] is None or acc["overall"] < base - args.budget:
+            print(f"❌ Accuracy regression: {acc['overall']} < {base} - {args.budget}")
+            sys.exit(1)
+        print(f"✅ Accuracy within budget of baseline ({base})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# synth.py
+"""Synthetic BON DE COMMANDE / BON DE RECEPTION PDFs with ground truth.
+
+Scanned variants are drawn with PIL at 300 dpi, then degraded with noise,
+blur and a small skew; native variants are written as real PDF text with
+Helvetica so they exercise the text-layer fast path. Titles, header fields
+and totals are placed inside the ROIs the extractors crop.
+
+    python3 bench/synth.py OUT_DIR [--count N] [--seed S]
+"""
+import os, json, random, argparse, datetime
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+DPI = 300
+A4_PT = (595, 842)
+A4_PX = (int(A4_PT[0] / 72 * DPI), int(A4_PT[1] / 72 * DPI))
+FONT_PX = 40
+
+# Text positions as (x, y) page fractions, chosen inside the crop boxes
+LAYOUT = {
+    "PO": {
+        "title": (0.05, 0.11),
+        "header": [(0.05, 0.17), (0.05, 0.20), (0.05, 0.23)],
+        "footer": [(0.62, 0.705), (0.62, 0.73), (0.62, 0.755)],
+    },
+    "RO": {
+        "title": (0.05, 0.11),
+        "header": [(0.05, 0.16), (0.05, 0.19), (0.05, 0.22)],
+        "footer": [(0.57, 0.80), (0.57, 0.83), (0.57, 0.86)],
+    },
+}
+TITLES = {"PO": "BON DE COMMANDE", "RO": "BON DE RECEPTION"}
+
+
+def fr_amount(v: float) -> str:
+    """1234.5 → '1 234,50'."""
+    return f"{v:,.2f}".replace(",", " ").replace(".", ",")
+
+
+def make_truth(doc_type: str, rng: random.Random) -> dict:
+    date = datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randrange(700))
+    ht = round(rng.uniform(50, 90000), 2)
+    tax = round(ht * 0.20, 2)
+    truth = {
+        "document_type": doc_type,
+        "date": date.strftime("%d/%m/%Y"),
+        "date_norm": date.strftime("%Y%m%d"),
+        "total_ht": ht,
+        "total_tax": tax,
+        "total_ttc": round(ht + tax, 2),
+    }
+    if doc_type == "PO":
+        truth["order_number"] = f"DAC{rng.randrange(10**6, 10**8)}"
+        truth["supplier_code"] = str(rng.randrange(10**6, 10**8))
+    else:
+        truth["reception_number"] = f"DAC{rng.randrange(10**6, 10**8)}"
+        truth["order_number"] = str(rng.randrange(10**7, 10**9))
+    return truth
+
+
+def page_lines(doc_type: str, truth: dict, page_no: int, pages: int, rng: random.Random):
+    """[(x, y, text)] to draw on one page."""
+    lay = LAYOUT[doc_type]
+    lines = []
+    if page_no == 1:
+        lines.append((*lay["title"], TITLES[doc_type]))
+        if doc_type == "PO":
+            header = [
+                f"Date : {truth['date']}",
+                f"Ref : DAC {truth['order_number'][3:]}",
+                f"Code Fournisseur : {truth['supplier_code']}",
+            ]
+        else:
+            header = [
+                f"Date : {truth['date']}",
+                f"N° Reception : {truth['reception_number']}",
+                f"N° Commande : {truth['order_number']}",
+            ]
+        lines += [(*pos, text) for pos, text in zip(lay["header"], header)]
+
+    # Body rows between header and footer
+    top = 0.34 if page_no == 1 else 0.08
+    bottom = 0.66 if page_no == pages else 0.92
+    y = top
+    while y < bottom:
+        lines.append((0.05, y, f"Article {rng.randrange(1000, 9999)}   Qte {rng.randrange(1, 50)}"))
+        y += 0.03
+
+    if page_no == pages:
+        footer = [
+            f"Total HT : {fr_amount(truth['total_ht'])}",
+            f"TVA : {fr_amount(truth['total_tax'])}",
+            f"Total TTC : {fr_amount(truth['total_ttc'])}",
+        ]
+        lines += [(*pos, text) for pos, text in zip(lay["footer"], footer)]
+    return lines
+
+
+def _font():
+    for name in ("DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Arial.ttf"):
+        try:
+            return ImageFont.truetype(name, FONT_PX)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=FONT_PX)
+
+
+def scanned_page(lines, rng: random.Random, noise: float, skew: float) -> Image.Image:
+    img = Image.new("L", A4_PX, 255)
+    draw = ImageDraw.Draw(img)
+    font = _font()
+    for x, y, text in lines:
+        draw.text((x * A4_PX[0], y * A4_PX[1]), text, fill=rng.randrange(0, 60), font=font)
+    if skew:
+        img = img.rotate(skew, resample=Image.BICUBIC, fillcolor=255)
+    img = img.filter(ImageFilter.GaussianBlur(radius=0.8))
+    if noise:
+        arr = np.asarray(img, dtype=np.float32)
+        arr += np.random.default_rng(rng.randrange(2**32)).normal(0, noise, arr.shape)
+        img = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+    return img
+
+
+def write_scanned_pdf(path: str, pages_lines, rng: random.Random, noise: float, skew: float):
+    pages = [scanned_page(lines, rng, noise, skew) for lines in pages_lines]
+    pages[0].save(path, "PDF", resolution=DPI, save_all=True, append_images=pages[1:])
+
+
+def _pdf_text(text: str) -> str:
+    out = []
+    for ch in text.encode("cp1252"):
+        c = chr(ch)
+        out.append(f"\\{c}" if c in "()\\" else (c if 32 <= ch < 127 else f"\\{ch:03o}"))
+    return "".join(out)
+
+
+def write_native_pdf(path: str, pages_lines, font_pt: float = FONT_PX / DPI * 72):
+    """Minimal PDF with a Helvetica text layer (no external dependency)."""
+    w, h = A4_PT
+    objects = []  # body of objects 1..n
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # filled in below
+    pages_obj = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    kids = []
+    for lines in pages_lines:
+        ops = ["BT", f"/F1 {font_pt:.2f} Tf"]
+        for x, y, text in lines:
+            ops.append(f"1 0 0 1 {x * w:.2f} {h * (1 - y) - font_pt:.2f} Tm ({_pdf_text(text)}) Tj")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            f"<< /Type /Page /Parent {pages_obj} 0 R /MediaBox [0 0 {w} {h}] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {content} 0 R >>".encode()
+        ))
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {pages_obj} 0 R >>".encode()
+    objects[pages_obj - 1] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode()
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog, xref
+    )
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def generate(out_dir: str, count: int = 20, seed: int = 1234, native_share: float = 0.25) -> dict:
+    """Write `count` PDFs to `out_dir`; return {filename: ground truth}."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    truths = {}
+    for i in range(count):
+        doc_type = "PO" if i % 2 == 0 else "RO"
+        native = rng.random() < native_share
+        pages = rng.choice([1, 1, 2, 3, 5])
+        truth = make_truth(doc_type, rng)
+        pages_lines = [page_lines(doc_type, truth, p, pages, rng) for p in range(1, pages + 1)]
+
+        name = f"synth-{i:04d}-{doc_type}-{'native' if native else 'scan'}.pdf"
+        path = os.path.join(out_dir, name)
+        if native:
+            write_native_pdf(path, pages_lines)
+        else:
+            write_scanned_pdf(path, pages_lines, rng,
+                              noise=rng.choice([0, 6, 12, 20]), skew=rng.uniform(-1.0, 1.0))
+        truths[name] = {**truth, "variant": "native" if native else "scan", "pages": pages}
+
+    with open(os.path.join(out_dir, "truth.json"), "w", encoding="utf-8") as f:
+        json.dump(truths, f, ensure_ascii=False, indent=2)
+    return truths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic PO/RO PDFs.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+    truths = generate(args.out_dir, args.count, args.seed)
+    print(f"✅ {len(truths)} PDFs written to {args.out_dir}")
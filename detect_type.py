@@ -1,12 +1,13 @@
 import os, sys, json, shutil, datetime, uuid
-from pdf2image import convert_from_path
-import pytesseract
-import cv2
-import numpy as np
-from PIL import Image, ImageFile
-
-Image.MAX_IMAGE_PIXELS = None
-ImageFile.LOAD_TRUNCATED_IMAGES = True
+try:
+    import fcntl
+except ImportError:  # not on Windows: no reflinks
+    fcntl = None
+from extractors import page_cache
+from extractors import preprocess as prep
+from extractors.words import ocr_words, text_in
+from extractors.ocr_profiles import ocr_args
+from extractors.telemetry import annotate, span
 
 # Folders
 INCOMING = "incoming"
@@ -18,53 +19,142 @@ os.makedirs(PO_OUT, exist_ok=True)
 os.makedirs(RO_OUT, exist_ok=True)
 os.makedirs(PROCESSED, exist_ok=True)
 
-def detect_type(pdf):
-    # Convert first page
-    pages = convert_from_path(pdf, dpi=200, first_page=1, last_page=1)
-    img = np.array(pages[0])
-    h, w = img.shape[:2]
+# How the extraction copy in PO_detected/RO_detected is made:
+#   auto     reflink, else hardlink, else copy (the first the filesystem allows)
+#   reflink  copy-on-write clone (btrfs, XFS, ...): no data written
+#   link     hardlink to the processed original: no data written
+#   symlink  relative symlink to the processed original (kept pointing at it on rename)
+#   copy     full copy, as always
+# The pipeline never writes to the PDFs, so all of them read the same.
+FILE_MODES = ("auto", "reflink", "link", "symlink", "copy")
+FILE_MODE = os.environ.get("INVOICEBRAIN_FILE_MODE", "auto")
+FICLONE = 0x40049409  # linux/fs.h
+
+# Title ROI on page 1 as (x1, y1, x2, y2) fractions of the page
+TITLE_BOX = (0.0, 0.10, 0.72, 0.30)
+
+
+def classify_text(text):
+    """Map title text to PO / RO / UNKNOWN."""
+    text = text.upper()
+    if "BON DE COMMANDE" in text:
+        return "PO"
+    elif "BON DE RECEPTION" in text:
+        return "RO"
+    return "UNKNOWN"
+
+
+def read_top(pdf, dpi=300, page_no=1):
+    """One word-level OCR pass over the top of page 1 (or `page_no`).
 
-    # Crop top-left area for title
-    y1, y2 = int(h * 0.1), int(h * 0.30)
-    x1, x2 = 0, int(w * 0.72)
-    crop = img[y1:y2, x1:x2]
+    TITLE_BOX covers both the title and the PO/RO header ROIs, so the same
+    words serve classification and header extraction. Returns the words and
+    the preprocessed crop they were read from (for targeted re-reads).
+    """
+    # Only the top-left band is rasterized, never the whole page
+    crop = page_cache.region(pdf, page_no, TITLE_BOX, dpi=dpi, gray=True)
+    bx1, by1, bx2, by2 = TITLE_BOX
+    page_shape = (crop.shape[0] / (by2 - by1), crop.shape[1] / (bx2 - bx1))
 
     # Enhance for OCR
-    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-    gray = cv2.bilateralFilter(gray, 7, 75, 75)
-    _, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    with span("preprocess", part="top"):
+        th = prep.top(crop)
 
     # OCR
-    text = pytesseract.image_to_string(th, lang="fra+eng").upper()
+    with span("ocr", part="top", dpi=dpi):
+        return ocr_words(th, page_shape, TITLE_BOX, dpi=dpi, **ocr_args("default", "top")), th
+
+
+def classify_words(words):
+    return classify_text(text_in(words, TITLE_BOX))
 
-    # Detect type
-    if "BON DE COMMANDE" in text:
-        doc = "PO"
-    elif "BON DE RECEPTION" in text:
-        doc = "RO"
-    else:
-        doc = "UNKNOWN"
 
+def classify(pdf):
+    words, _ = read_top(pdf)
+    return classify_words(words)
+
+
+def filed_name(doc):
+    """Temporary name of a document until it is renamed from its fields."""
     today = datetime.datetime.now().strftime("%Y%m%d")
     uid = str(uuid.uuid4())[:8]
-    newname = f"{doc}-{today}-{uid}.pdf"
-
-    # Always move original to processed folder
-    processed_path = os.path.join(PROCESSED, newname)
-    shutil.move(pdf, processed_path)
-
-    # Create a copy in corresponding folder for extraction
-    if doc == "PO":
-        dest = os.path.join(PO_OUT, newname)
-        shutil.copy(processed_path, dest)
-    elif doc == "RO":
-        dest = os.path.join(RO_OUT, newname)
-        shutil.copy(processed_path, dest)
-    else:
-        dest = processed_path  # keep unknowns only in processed
+    return f"{doc}-{today}-{uid}.pdf"
+
+
+def _reflink(src, dst):
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.remove(dst)
+            raise
+
+
+def _symlink(src, dst):
+    os.symlink(os.path.relpath(src, os.path.dirname(dst)), dst)
+
+
+_PLACE = {"reflink": _reflink, "link": os.link, "symlink": _symlink, "copy": shutil.copy}
+
+
+def place_copy(src, dest, mode=None):
+    """Make `dest` a copy of `src` the cheapest way `mode` allows; returns the way used.
+
+    `dest` appears atomically (built as `dest`.part, then renamed).
+    """
+    mode = mode or FILE_MODE
+    if mode not in FILE_MODES:
+        raise ValueError(f"unknown file mode {mode!r} (expected one of {', '.join(FILE_MODES)})")
+    methods = ("reflink", "link", "copy") if mode == "auto" else (mode,)
+    tmp = f"{dest}.part"
+    for method in methods:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        try:
+            _PLACE[method](src, tmp)
+        except OSError:
+            # EXDEV, EOPNOTSUPP, EPERM...: try the next way
+            if method == methods[-1]:
+                raise
+            continue
+        os.replace(tmp, dest)
+        return method
+
+
+def file_document(pdf, doc, newname=None):
+    """Move the original to processed/ and place a copy where extraction reads it.
+
+    The copy is a reflink, hardlink, symlink or real copy (FILE_MODE).
+
+    Safe to repeat with the same `newname` after an interruption: a move or
+    copy that already happened is not done again.
+    """
+    newname = newname or filed_name(doc)
+
+    with span("file_move"):
+        # Always move original to processed folder
+        processed_path = os.path.join(PROCESSED, newname)
+        if os.path.exists(pdf) or not os.path.exists(processed_path):
+            shutil.move(pdf, processed_path)
+
+        # Create a copy in corresponding folder for extraction
+        if doc in ("PO", "RO"):
+            dest = os.path.join(PO_OUT if doc == "PO" else RO_OUT, newname)
+            if not os.path.lexists(dest):
+                annotate(file_mode=place_copy(processed_path, dest))
+        else:
+            dest = processed_path  # keep unknowns only in processed
+            page_cache.release(processed_path)  # nothing else will read it
 
     return {"path": dest, "type": doc}
 
+
+def detect_type(pdf):
+    return file_document(pdf, classify(pdf))
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("❌ No PDF path provided")
@@ -1,25 +1,45 @@
 # RO_final_extractor.py
-import sys, json, subprocess, os, csv
+import sys, json, os
 
 BASE = os.path.dirname(os.path.abspath(__file__))
-HEADER = os.path.join(BASE, "header", "RO_Header_Crop.py")
-FOOTER = os.path.join(BASE, "footer", "RO_Total_Crop.py")
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(BASE))  # run as a script from anywhere
+
+import store
+from extractors import layout
+from extractors.telemetry import span
+from extractors.adaptive import header_ok, totals_ok
+from extractors.header.RO_Header_Crop import HEADER_ANCHORS, HEADER_BOX, read_header
+from extractors.footer.RO_Total_Crop import FOOTER_ANCHORS, FOOTER_BOX, read_footer
+
+
+def ocr_header(pdf_path: str):
+    """(header fields, DPI) read from the header region of page 1."""
+    return layout.read(pdf_path, "RO", "header", 1, HEADER_BOX, HEADER_ANCHORS,
+                       read_header, lambda h: header_ok(h, "reception_number"))
 
 
-def safe_json_output(cmd):
-    """Return last valid JSON line emitted by the subprocess, or {}."""
-    out = subprocess.check_output(cmd, text=True).splitlines()
-    for line in reversed(out):
-        try:
-            return json.loads(line)
-        except json.JSONDecodeError:
-            continue
-    return {}
+def ocr_footer(pdf_path: str, supplier=None):
+    """(totals, DPI) read from the totals region of the last page.
 
+    `supplier` (code from the header, when known) selects its learned layout.
+    """
+    return layout.read(pdf_path, "RO", "footer", -1, FOOTER_BOX, FOOTER_ANCHORS,
+                       read_footer, totals_ok, supplier)
 
-def extract_RO_data(pdf_path: str):
-    header = safe_json_output(["python3", HEADER, pdf_path])
-    footer = safe_json_output(["python3", FOOTER, pdf_path])
+
+def extract_RO_data(pdf_path: str, header=None, footer=None, header_dpi=None, footer_dpi=None):
+    """Extract and save fields; `header`/`footer` skip OCR when already known.
+
+    OCR starts at the lowest DPI level and escalates only when the header
+    (date + DAC) or the totals (HT + TVA = TTC) fail validation. The two
+    reads are independent: ocr_header() / ocr_footer() may run elsewhere
+    (concurrently, see scheduler.py) and be passed in.
+    """
+    if header is None:
+        header, header_dpi = ocr_header(pdf_path)
+    if footer is None:
+        footer, footer_dpi = ocr_footer(pdf_path, header.get("supplier_code"))
 
     data = {**header, **footer}
 
@@ -37,18 +57,13 @@ def extract_RO_data(pdf_path: str):
 
     clean = {k: data.get(k) for k in keys if data.get(k)}
 
-    name = os.path.splitext(os.path.basename(pdf_path))[0]
-    csv_path = os.path.join(os.path.dirname(pdf_path), f"{name}.csv")
-
-    with open(csv_path, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(["field", "value"])
-        for k, v in clean.items():
-            w.writerow([k, v])
-
     print(json.dumps(clean, ensure_ascii=False))
-    print("✅ CSV saved:", csv_path)
-    return clean
+    # Results go to the SQLite store (process_doc); the CSV is opt-in
+    if store.WRITE_CSV:
+        with span("csv_write"):
+            print("✅ CSV saved:", store.write_csv(pdf_path, clean))
+    print(f"🔎 DPI used: header={header_dpi} footer={footer_dpi}")
+    return {**clean, "header_dpi": header_dpi, "footer_dpi": footer_dpi}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,55 @@
+# adaptive.py
+"""Adaptive DPI: OCR cheap first, re-render at a higher DPI only on failure.
+
+Most footers and headers read fine below 300 dpi. Each stage walks
+DPI_LEVELS from lowest to highest and stops at the first level whose result
+passes its check: HT + TVA ≈ TTC for totals, a real calendar date and a DAC
+number for headers. The level a document finished at is reported so the
+share of expensive re-renders can be tracked.
+"""
+import os, re, datetime
+
+DPI_LEVELS = tuple(sorted(
+    int(d) for d in os.environ.get("INVOICEBRAIN_DPI_LEVELS", "200,300").split(",")
+))
+TOTALS_TOLERANCE = 0.02  # absolute, plus 0.1 % of TTC for rounding
+
+
+def valid_date(date):
+    if not date:
+        return False
+    try:
+        datetime.datetime.strptime(date, "%d/%m/%Y")
+    except ValueError:
+        return False
+    return True
+
+
+def valid_dac(dac):
+    return bool(dac and re.fullmatch(r"DAC\d{5,15}", dac))
+
+
+def header_ok(header: dict, dac_field: str) -> bool:
+    return valid_date(header.get("date")) and valid_dac(header.get(dac_field))
+
+
+def totals_ok(footer: dict) -> bool:
+    ht, tax, ttc = footer.get("total_ht"), footer.get("total_tax"), footer.get("total_ttc")
+    if ht is None or tax is None or ttc is None:
+        return False
+    return abs(ht + tax - ttc) <= TOTALS_TOLERANCE + ttc * 0.001
+
+
+def escalate(extract, render, check, levels=DPI_LEVELS):
+    """Run `extract(render(dpi), dpi)` per level until `check` passes.
+
+    Returns (result, dpi). When no level passes, the result of the highest
+    level is kept, as it is the best the OCR can do.
+    """
+    result, dpi = None, None
+    for dpi in levels:
+        result = extract(render(dpi), dpi)  # the OCR is told the resolution
+        if check(result):
+            break
+        print(f"🔁 Check failed at {dpi} dpi")
+    return result, dpi
@@ -0,0 +1,112 @@
+# debug_dump.py
+"""Optional debug artifacts (crops, cleaned images, OCR text).
+
+Off by default. INVOICEBRAIN_DEBUG selects the mode:
+    off / 0      never write artifacts (default)
+    all / 1      write them for every document
+    10%  / 0.1   write them for a sample of documents
+
+A single document can be forced on with document(name, enabled=True).
+Files land in <stage debug dir>/<document>/<name>, so parallel workers never
+clobber each other, and PNG encoding plus disk writes happen on a
+background thread instead of in the extraction path.
+"""
+import os, re, queue, atexit, hashlib, threading, contextvars
+from contextlib import contextmanager
+
+import cv2
+
+
+def _parse_rate(value: str) -> float:
+    value = value.strip().lower()
+    if value in ("", "off", "0", "false", "no"):
+        return 0.0
+    if value in ("all", "on", "1", "true", "yes"):
+        return 1.0
+    if value.endswith("%"):
+        return float(value[:-1]) / 100
+    return float(value)
+
+
+SAMPLE_RATE = _parse_rate(os.environ.get("INVOICEBRAIN_DEBUG", "off"))
+
+_current = contextvars.ContextVar("debug_document", default=None)
+_queue: "queue.Queue" = queue.Queue(maxsize=256)
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _sampled(name: str, rate: float) -> bool:
+    if rate <= 0:
+        return False
+    if rate >= 1:
+        return True
+    # Stable per document: re-running the same file gives the same decision
+    bucket = int(hashlib.sha1(name.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return bucket < rate
+
+
+@contextmanager
+def document(name: str, enabled: bool = None):
+    """Scope debug output to one document; `enabled` overrides sampling."""
+    # Only a .pdf extension is dropped: stems may contain dots of their own
+    base = re.sub(r"\.pdf$", "", os.path.basename(name), flags=re.I)
+    safe = re.sub(r"[^\w.\-]", "_", base)
+    on = _sampled(safe, SAMPLE_RATE) if enabled is None else enabled
+    token = _current.set(safe if on else None)
+    try:
+        yield on
+    finally:
+        _current.reset(token)
+
+
+def enabled() -> bool:
+    return _current.get() is not None
+
+
+def _write_loop():
+    while True:
+        path, payload = _queue.get()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if isinstance(payload, str):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(payload)
+            else:
+                cv2.imwrite(path, payload)
+        except Exception as e:
+            print(f"⚠️ Could not write debug artifact {path}: {e}")
+        finally:
+            _queue.task_done()
+
+
+def _submit(base_dir: str, filename: str, payload):
+    global _writer
+    doc = _current.get()
+    if doc is None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, daemon=True, name="debug-writer")
+            _writer.start()
+    _queue.put((os.path.join(base_dir, doc, filename), payload))
+
+
+def save_image(base_dir: str, filename: str, img):
+    """Queue an image for writing (copied, callers may reuse the buffer)."""
+    if enabled():
+        _submit(base_dir, filename, img.copy())
+
+
+def save_text(base_dir: str, filename: str, text: str):
+    if enabled():
+        _submit(base_dir, filename, text)
+
+
+def flush():
+    """Block until every queued artifact is on disk."""
+    if _writer is not None:
+        _queue.join()
+
+
+atexit.register(flush)
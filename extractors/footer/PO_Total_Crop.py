@@ -1,58 +1,26 @@
-import os, re, cv2, sys, json
-import numpy as np
-from pdf2image import convert_from_path
-from PIL import Image, ImageFile
-import pytesseract
-
-Image.MAX_IMAGE_PIXELS = None
-ImageFile.LOAD_TRUNCATED_IMAGES = True
-
-if len(sys.argv) < 2:
-    print("❌ No PDF path provided")
-    sys.exit(1)
-
-PDF_PATH = sys.argv[1]
-if not os.path.exists(PDF_PATH):
-    print(f"❌ PDF not found: {PDF_PATH}")
-    sys.exit(1)
+import os, re, sys, json
 
 BASE = os.path.dirname(os.path.abspath(__file__))
-DEBUG = os.path.join(BASE, "debug")
-os.makedirs(DEBUG, exist_ok=True)
-
-
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(BASE)))  # run as a script from anywhere
 
+from extractors import page_cache, debug_dump, ocr
+from extractors import preprocess as prep
+from extractors.ocr_profiles import ocr_args
+from extractors.telemetry import span
 
-# Convert PDF → last page
-pages = convert_from_path(PDF_PATH, dpi=300)
-page = np.array(pages[-1])
-h, w = page.shape[:2]
+DEBUG = os.path.join(BASE, "debug")  # artifacts only when debug_dump is enabled
 
-# 🔧 Slightly bigger crop area
-y1 = int(h * 0.70)
-y2 = int(h * 0.78)
-x1 = int(w * 0.60)
-x2 = int(w * 0.98)
-crop = page[y1:y2, x1:x2]
-cv2.imwrite(os.path.join(DEBUG, "po_footer_raw.png"), crop)
+# Totals ROI on the last page as (x1, y1, x2, y2) fractions of the page
+FOOTER_BOX = (0.60, 0.70, 0.98, 0.78)
+# Labels that locate the totals when a layout moves them (extractors/layout.py)
+FOOTER_ANCHORS = (r"TOTAL\s*(HT|TTC|TAXE)", r"MONTANT\s*(HT|TTC|TAXE)", r"\bTVA\b")
 
-# Preprocess for OCR
-gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-gray = cv2.convertScaleAbs(gray, alpha=1.7, beta=0)
-gray = cv2.bilateralFilter(gray, 7, 75, 75)
-_, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-cv2.imwrite(os.path.join(DEBUG, "po_footer_clean.png"), thresh)
 
-# OCR
-raw = pytesseract.image_to_string(thresh, lang="fra+eng", config="--psm 6")
-text = raw.replace("\n", " ")
+def preprocess(crop):
+    """Binary totals image (contrast, bilateral, Otsu)."""
+    return prep.po_footer(crop)
 
-# Save OCR output
-with open(os.path.join(DEBUG, "po_footer_text.txt"), "w", encoding="utf-8") as f:
-    f.write(text)
-
-print("\n=== OCR TEXT (PO) ===")
-print(text)
 
 # -----------------------------
 # Extraction helpers
@@ -88,14 +56,52 @@ def extract_totals(text):
 
     return ht, tax, ttc
 
-# Run extraction
-ht, tax, ttc = extract_totals(text)
 
-print("\n=== FINAL TOTALS (PO) ===")
-print("Total HT :", ht)
-print("Total Taxe:", tax)
-print("Total TTC:", ttc)
-print("====================")
+def parse_footer(raw):
+    """Totals dict from the raw text of the totals box (OCR or text layer)."""
+    text = raw.replace("\n", " ")
+    ht, tax, ttc = extract_totals(text)
+    return {"total_ht": ht, "total_tax": tax, "total_ttc": ttc}
+
+
+def read_footer(crop, dpi=ocr.DEFAULT_DPI):
+    """Run preprocess → OCR → totals on a FOOTER_BOX crop (grayscale or RGB) rendered at `dpi`."""
+    with span("preprocess", part="po_footer"):
+        thresh = preprocess(crop)
+
+    debug_dump.save_image(DEBUG, "po_footer_raw.png", crop)
+    debug_dump.save_image(DEBUG, "po_footer_clean.png", thresh)
+
+    # OCR
+    with span("ocr", part="po_footer"):
+        raw = ocr.image_to_string(thresh, **ocr_args("PO", "totals"), dpi=dpi)
+
+    # Save OCR output
+    debug_dump.save_text(DEBUG, "po_footer_text.txt", raw.replace("\n", " "))
+
+    with span("parse", part="po_footer"):
+        return parse_footer(raw)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("❌ No PDF path provided")
+        sys.exit(1)
+
+    PDF_PATH = sys.argv[1]
+    if not os.path.exists(PDF_PATH):
+        print(f"❌ PDF not found: {PDF_PATH}")
+        sys.exit(1)
+
+    # Only the totals box of the last page is rasterized
+    crop = page_cache.region(PDF_PATH, -1, FOOTER_BOX, dpi=300, gray=True)
+    with debug_dump.document(PDF_PATH):
+        result = read_footer(crop)
+
+    print("\n=== FINAL TOTALS (PO) ===")
+    print("Total HT :", result["total_ht"])
+    print("Total Taxe:", result["total_tax"])
+    print("Total TTC:", result["total_ttc"])
+    print("====================")
 
-result = {"total_ht": ht, "total_tax": tax, "total_ttc": ttc}
-print(json.dumps(result))
+    print(json.dumps(result))
@@ -1,70 +1,27 @@
-import os, re, sys, json, cv2
-import numpy as np
-from pdf2image import convert_from_path
-from PIL import Image, ImageFile
-import pytesseract
-
-Image.MAX_IMAGE_PIXELS = None
-ImageFile.LOAD_TRUNCATED_IMAGES = True
-
-# === Input check ===
-if len(sys.argv) < 2:
-    print("❌ No PDF path provided")
-    sys.exit(1)
-
-PDF_PATH = sys.argv[1]
-if not os.path.exists(PDF_PATH):
-    print(f"❌ PDF not found: {PDF_PATH}")
-    sys.exit(1)
+import os, re, sys, json
 
 # === Setup debug folder ===
 BASE = os.path.dirname(os.path.abspath(__file__))
-DEBUG = os.path.join(BASE, "debug")
-os.makedirs(DEBUG, exist_ok=True)
-
-# === Convert PDF → last page image ===
-pages = convert_from_path(PDF_PATH, dpi=300)
-page = np.array(pages[-1])
-h, w = page.shape[:2]
-
-# === Crop bottom-right area (adjust if needed) ===
-y1 = int(h * 0.78)
-y2 = int(h * 0.90)
-x1 = int(w * 0.55)
-x2 = int(w * 0.98)
-crop = page[y1:y2, x1:x2]
-cv2.imwrite(os.path.join(DEBUG, "ro_footer_raw.png"), crop)
-
-# === Preprocess for OCR ===
-gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(BASE)))  # run as a script from anywhere
 
-# Enhance contrast and denoise
-gray = cv2.convertScaleAbs(gray, alpha=2.0, beta=0)
-gray = cv2.fastNlMeansDenoising(gray, h=20)
+from extractors import page_cache, debug_dump, ocr
+from extractors import preprocess as prep
+from extractors.ocr_profiles import ocr_args
+from extractors.telemetry import span
 
-# Adaptive threshold for thin fonts
-thresh = cv2.adaptiveThreshold(gray, 255,
-    cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 31, 8)
+DEBUG = os.path.join(BASE, "debug")  # artifacts only when debug_dump is enabled
 
-# Morphological dilation to bolden thin digits
-kernel = np.ones((2, 2), np.uint8)
-dilated = cv2.dilate(thresh, kernel, iterations=1)
+# Totals ROI on the last page as (x1, y1, x2, y2) fractions of the page
+FOOTER_BOX = (0.55, 0.78, 0.98, 0.90)
+# Labels that locate the totals when a layout moves them (extractors/layout.py)
+FOOTER_ANCHORS = (r"TOTAL\s*(HT|TTC|TAXE)", r"MONTANT\s*(HT|TTC|TAXE)", r"\bTVA\b")
 
-# Invert back (black text on white)
-final = cv2.bitwise_not(dilated)
-cv2.imwrite(os.path.join(DEBUG, "ro_footer_clean.png"), final)
 
-# === OCR ===
-raw = pytesseract.image_to_string(
-    final, lang="fra+eng", config="--psm 6"
-)
-text = raw.replace("\n", " ").replace("—", "-").replace(";", ":")
+def preprocess(crop):
+    """Binary totals image (contrast, noise-dependent denoise, adaptive threshold, dilate)."""
+    return prep.ro_footer(crop)
 
-with open(os.path.join(DEBUG, "ro_footer_text.txt"), "w", encoding="utf-8") as f:
-    f.write(text)
-
-print("\n=== OCR TEXT (RO) ===")
-print(text)
 
 # === Extraction helpers ===
 def normalize_number(v):
@@ -102,19 +59,60 @@ def extract_totals(text):
 
     return ht, tax, ttc
 
-# === Run extraction ===
-ht, tax, ttc = extract_totals(text)
-
-print("\n=== FINAL TOTALS (RO) ===")
-print("Total HT :", ht)
-print("Total Taxe:", tax)
-print("Total TTC:", ttc)
-print("====================")
-
-# === Final JSON output ===
-result = {
-    "total_ht": ht,
-    "total_tax": tax,
-    "total_ttc": ttc
-}
-print(json.dumps(result, ensure_ascii=False))
+
+def clean_text(raw):
+    return raw.replace("\n", " ").replace("—", "-").replace(";", ":")
+
+
+def parse_footer(raw):
+    """Totals dict from the raw text of the totals box (OCR or text layer)."""
+    ht, tax, ttc = extract_totals(clean_text(raw))
+    return {
+        "total_ht": ht,
+        "total_tax": tax,
+        "total_ttc": ttc
+    }
+
+
+def read_footer(crop, dpi=ocr.DEFAULT_DPI):
+    """Run preprocess → OCR → totals on a FOOTER_BOX crop (grayscale or RGB) rendered at `dpi`."""
+    with span("preprocess", part="ro_footer"):
+        final = preprocess(crop)
+
+    debug_dump.save_image(DEBUG, "ro_footer_raw.png", crop)
+    debug_dump.save_image(DEBUG, "ro_footer_clean.png", final)
+
+    # === OCR ===
+    with span("ocr", part="ro_footer"):
+        raw = ocr.image_to_string(final, **ocr_args("RO", "totals"), dpi=dpi)
+
+    debug_dump.save_text(DEBUG, "ro_footer_text.txt", clean_text(raw))
+
+    with span("parse", part="ro_footer"):
+        return parse_footer(raw)
+
+
+if __name__ == "__main__":
+    # === Input check ===
+    if len(sys.argv) < 2:
+        print("❌ No PDF path provided")
+        sys.exit(1)
+
+    PDF_PATH = sys.argv[1]
+    if not os.path.exists(PDF_PATH):
+        print(f"❌ PDF not found: {PDF_PATH}")
+        sys.exit(1)
+
+    # === Only the totals box of the last page is rasterized ===
+    crop = page_cache.region(PDF_PATH, -1, FOOTER_BOX, dpi=300, gray=True)
+    with debug_dump.document(PDF_PATH):
+        result = read_footer(crop)
+
+    print("\n=== FINAL TOTALS (RO) ===")
+    print("Total HT :", result["total_ht"])
+    print("Total Taxe:", result["total_tax"])
+    print("Total TTC:", result["total_ttc"])
+    print("====================")
+
+    # === Final JSON output ===
+    print(json.dumps(result, ensure_ascii=False))
@@ -1,100 +1,89 @@
 # PO_Header_Crop.py
-import sys, os, cv2, pytesseract, json, re
-import numpy as np
-from pdf2image import convert_from_path
-from PIL import Image, ImageFile
-
-Image.MAX_IMAGE_PIXELS = None
-ImageFile.LOAD_TRUNCATED_IMAGES = True
+import sys, os, json, re
 
 BASE = os.path.dirname(os.path.abspath(__file__))
-DEBUG = os.path.join(BASE, "debug")
-os.makedirs(DEBUG, exist_ok=True)
-
-# === Input PDF ===
-if len(sys.argv) < 2:
-    print("❌ No PDF path provided")
-    sys.exit(1)
-
-pdf = sys.argv[1]
-pages = convert_from_path(pdf, dpi=300, first_page=1, last_page=1)
-img = np.array(pages[0])
-h, w = img.shape[:2]
-
-# === Crop header area (works for your PDFs) ===
-y1, y2 = int(h * 0.15), int(h * 0.30)
-x1, x2 = 0, int(w * 0.60)
-crop = img[y1:y2, x1:x2]
-cv2.imwrite(os.path.join(DEBUG, "po_header_raw.png"), crop)
-
-# === Preprocess ===
-gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-
-# Step 1: gamma correction (boost dark ink)
-gamma = 0.6
-invGamma = 1.0 / gamma
-table = np.array([(i / 255.0) ** invGamma * 255 for i in np.arange(256)]).astype("uint8")
-gray = cv2.LUT(gray, table)
-
-# Step 2: CLAHE for local contrast
-clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-gray = clahe.apply(gray)
-
-# Step 3: remove smooth background using morphological opening
-bg = cv2.morphologyEx(gray, cv2.MORPH_OPEN,
-                      cv2.getStructuringElement(cv2.MORPH_RECT, (25,25)))
-norm = cv2.subtract(gray, bg)
-norm = cv2.normalize(norm, None, 0, 255, cv2.NORM_MINMAX)
-
-# Step 4: threshold with Otsu
-_, th = cv2.threshold(norm, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-
-# Step 5: invert (black text on white)
-final = cv2.bitwise_not(th)
-
-cv2.imwrite(os.path.join(DEBUG, "po_header_clean.png"), final)
-
-# === OCR ===
-text = pytesseract.image_to_string(
-    final,
-    lang="fra+eng",
-    config="--psm 6 --oem 3 -c preserve_interword_spaces=1"
-)
-text_u = text.upper()
-with open(os.path.join(DEBUG, "po_header_text.txt"), "w", encoding="utf-8") as f:
-    f.write(text_u)
-
-# === Normalize spacing and fix OCR typos ===
-text_u = re.sub(r"\s+", " ", text_u)
-for wrong, right in {
-    "FORTIS DIE": "FOURNISSEUR",
-    "FOURNI SSEUR": "FOURNISSEUR",
-}.items():
-    text_u = text_u.replace(wrong, right)
-
-# === Extract fields ===
-# Date
-dm = re.search(r"\b(\d{2}/\d{2}/\d{4})\b", text_u)
-date = dm.group(1) if dm else None
-date_norm = f"{date[6:]}{date[3:5]}{date[:2]}" if date else None
-
-# PO reference
-po = re.search(r"DAC\s*[/\-]?\s*(\d{5,15})", text_u)
-po_reference = f"DAC{po.group(1)}" if po else None
-
-# Supplier code
-supp_match = re.search(r"CODE\s*FOURNI[SS]EUR\s*[:\-=]?\s*(\d{4,10})", text_u)
-if supp_match:
-    supplier_code = supp_match.group(1)
-else:
-    nums = re.findall(r"\b\d{6,10}\b", text_u)
-    supplier_code = nums[-1] if nums else None
-
-# === Output JSON ===
-print(json.dumps({
-    "document_type": "PO",
-    "date": date,
-    "date_norm": date_norm,
-    "po_reference": po_reference,
-    "supplier_code": supplier_code
-}, ensure_ascii=False))
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(BASE)))  # run as a script from anywhere
+
+from extractors import page_cache, debug_dump, ocr
+from extractors import preprocess as prep
+from extractors.ocr_profiles import ocr_args
+from extractors.telemetry import span
+
+DEBUG = os.path.join(BASE, "debug")  # artifacts only when debug_dump is enabled
+
+# Header ROI on page 1 as (x1, y1, x2, y2) fractions of the page
+HEADER_BOX = (0.0, 0.15, 0.60, 0.30)
+# Labels that locate the header when a layout moves it (extractors/layout.py)
+HEADER_ANCHORS = (r"DAC\s*[/\-]?\s*\d", r"CODE\s*FOURNI", r"\bDATE\b",
+                  r"\b\d{2}[/.]\d{2}[/.]\d{2,4}\b")
+
+
+def preprocess(crop):
+    """Binary header image (gamma, CLAHE, background removal, Otsu)."""
+    return prep.po_header(crop)
+
+
+def parse_header(text_u):
+    """Extract PO header fields from upper-cased header text."""
+    # === Normalize spacing and fix OCR typos ===
+    text_u = re.sub(r"\s+", " ", text_u)
+    for wrong, right in {
+        "FORTIS DIE": "FOURNISSEUR",
+        "FOURNI SSEUR": "FOURNISSEUR",
+    }.items():
+        text_u = text_u.replace(wrong, right)
+
+    # Date
+    dm = re.search(r"\b(\d{2}/\d{2}/\d{4})\b", text_u)
+    date = dm.group(1) if dm else None
+    date_norm = f"{date[6:]}{date[3:5]}{date[:2]}" if date else None
+
+    # PO reference
+    po = re.search(r"DAC\s*[/\-]?\s*(\d{5,15})", text_u)
+    po_reference = f"DAC{po.group(1)}" if po else None
+
+    # Supplier code
+    supp_match = re.search(r"CODE\s*FOURNI[SS]EUR\s*[:\-=]?\s*(\d{4,10})", text_u)
+    if supp_match:
+        supplier_code = supp_match.group(1)
+    else:
+        nums = re.findall(r"\b\d{6,10}\b", text_u)
+        supplier_code = nums[-1] if nums else None
+
+    return {
+        "document_type": "PO",
+        "date": date,
+        "date_norm": date_norm,
+        "po_reference": po_reference,
+        "supplier_code": supplier_code
+    }
+
+
+def read_header(crop, dpi=ocr.DEFAULT_DPI):
+    """Run preprocess → OCR → parse on a HEADER_BOX crop (grayscale or RGB) rendered at `dpi`."""
+    with span("preprocess", part="po_header"):
+        final = preprocess(crop)
+
+    debug_dump.save_image(DEBUG, "po_header_raw.png", crop)
+    debug_dump.save_image(DEBUG, "po_header_clean.png", final)
+
+    # === OCR ===
+    with span("ocr", part="po_header"):
+        text = ocr.image_to_string(final, **ocr_args("PO", "header"), dpi=dpi)
+    text_u = text.upper()
+    debug_dump.save_text(DEBUG, "po_header_text.txt", text_u)
+
+    with span("parse", part="po_header"):
+        return parse_header(text_u)
+
+
+if __name__ == "__main__":
+    # === Input PDF ===
+    if len(sys.argv) < 2:
+        print("❌ No PDF path provided")
+        sys.exit(1)
+
+    crop = page_cache.region(sys.argv[1], 1, HEADER_BOX, dpi=300, gray=True)
+    with debug_dump.document(sys.argv[1]):
+        print(json.dumps(read_header(crop), ensure_ascii=False))
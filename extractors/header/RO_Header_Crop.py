@@ -1,90 +1,100 @@
 # RO_Header_Crop.py
-import sys, os, cv2, pytesseract, json, re
-import numpy as np
-from pdf2image import convert_from_path
-from PIL import Image, ImageFile
-
-Image.MAX_IMAGE_PIXELS = None
-ImageFile.LOAD_TRUNCATED_IMAGES = True
+import sys, os, json, re
 
 BASE = os.path.dirname(os.path.abspath(__file__))
-DEBUG = os.path.join(BASE, "debug")
-os.makedirs(DEBUG, exist_ok=True)
-
-# === Input PDF ===
-if len(sys.argv) < 2:
-    print("❌ No PDF path provided")
-    sys.exit(1)
-
-pdf = sys.argv[1]
-pages = convert_from_path(pdf, dpi=300, first_page=1, last_page=1)
-img = np.array(pages[0])
-h, w = img.shape[:2]
-
-# === Crop header area ===
-y1, y2 = int(h * 0.1), int(h * 0.29)
-x1, x2 = int(w * 0.0), int(w * 0.60)
-crop = img[y1:y2, x1:x2]
-cv2.imwrite(os.path.join(DEBUG, "ro_header_raw.png"), crop)
-
-# === Preprocess ===
-gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-gray = cv2.fastNlMeansDenoising(gray, h=20)
-gray = cv2.bilateralFilter(gray, 7, 75, 75)
-gray = cv2.convertScaleAbs(gray, alpha=1.7, beta=0)
-_, th = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-th = cv2.bitwise_not(th)
-cv2.imwrite(os.path.join(DEBUG, "ro_header_clean.png"), th)
-
-# === OCR ===
-text = pytesseract.image_to_string(th, lang="fra+eng")
-text_u = text.upper()
-with open(os.path.join(DEBUG, "ro_header_text.txt"), "w", encoding="utf-8") as f:
-    f.write(text_u)
-
-# Normalize spacing
-text_u = re.sub(r"\s+", " ", text_u)
-
-# === Extract fields ===
-
-# 📅 Date
-date = None
-dm = re.search(r"\b(\d{2}/\d{2}/\d{4})\b", text_u)
-if dm:
-    date = dm.group(1)
-    dd, mm, yy = date.split("/")
-    date_norm = f"{yy}{mm}{dd}"
-else:
-    date_norm = None
-
-# 🔍 Reception number (DAC)
-reception_number = None
-dac = re.search(r"DAC\s*[/\-]?\s*(\d{5,15})", text_u)
-if dac:
-    reception_number = f"DAC{dac.group(1)}"
-
-# 🔍 Order number (N° Commande)
-# Fallback: look for a long standalone number after DAC/date
-order_number = None
-if not order_number:
-    # find all long numeric blocks
-    nums = re.findall(r"\b\d{6,12}\b", text_u)
-    # DAC digits (if any)
-    dac_digits = re.sub(r"\D", "", reception_number) if reception_number else None
-    # pick number that isn't DAC and isn't part of the date
-    for n in nums:
-        if dac_digits and n == dac_digits:
-            continue
-        if date and n in date.replace("/", ""):
-            continue
-        order_number = n
-        break
-
-# === Output JSON ===
-print(json.dumps({
-    "document_type": "RO",
-    "date": date,
-    "date_norm": date_norm,
-    "reception_number": reception_number,  # N° Réception
-    "order_number": order_number           # N° Commande
-}, ensure_ascii=False))
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(BASE)))  # run as a script from anywhere
+
+from extractors import page_cache, debug_dump, ocr
+from extractors import preprocess as prep
+from extractors.ocr_profiles import ocr_args
+from extractors.telemetry import span
+
+DEBUG = os.path.join(BASE, "debug")  # artifacts only when debug_dump is enabled
+
+# Header ROI on page 1 as (x1, y1, x2, y2) fractions of the page
+HEADER_BOX = (0.0, 0.10, 0.60, 0.29)
+# Labels that locate the header when a layout moves it (extractors/layout.py)
+HEADER_ANCHORS = (r"DAC\s*[/\-]?\s*\d", r"COMMANDE\s*[:\-]?\s*\d", r"\bDATE\b",
+                  r"\b\d{2}[/.]\d{2}[/.]\d{2,4}\b")
+
+
+def preprocess(crop):
+    """Binary header image (noise-dependent denoise, bilateral, contrast, Otsu)."""
+    return prep.ro_header(crop)
+
+
+def parse_header(text_u):
+    """Extract RO header fields from upper-cased header text."""
+    # Normalize spacing
+    text_u = re.sub(r"\s+", " ", text_u)
+
+    # 📅 Date
+    date = None
+    dm = re.search(r"\b(\d{2}/\d{2}/\d{4})\b", text_u)
+    if dm:
+        date = dm.group(1)
+        dd, mm, yy = date.split("/")
+        date_norm = f"{yy}{mm}{dd}"
+    else:
+        date_norm = None
+
+    # 🔍 Reception number (DAC)
+    reception_number = None
+    dac = re.search(r"DAC\s*[/\-]?\s*(\d{5,15})", text_u)
+    if dac:
+        reception_number = f"DAC{dac.group(1)}"
+
+    # 🔍 Order number (N° Commande)
+    # Fallback: look for a long standalone number after DAC/date
+    order_number = None
+    if not order_number:
+        # find all long numeric blocks
+        nums = re.findall(r"\b\d{6,12}\b", text_u)
+        # DAC digits (if any)
+        dac_digits = re.sub(r"\D", "", reception_number) if reception_number else None
+        # pick number that isn't DAC and isn't part of the date
+        for n in nums:
+            if dac_digits and n == dac_digits:
+                continue
+            if date and n in date.replace("/", ""):
+                continue
+            order_number = n
+            break
+
+    return {
+        "document_type": "RO",
+        "date": date,
+        "date_norm": date_norm,
+        "reception_number": reception_number,  # N° Réception
+        "order_number": order_number           # N° Commande
+    }
+
+
+def read_header(crop, dpi=ocr.DEFAULT_DPI):
+    """Run preprocess → OCR → parse on a HEADER_BOX crop (grayscale or RGB) rendered at `dpi`."""
+    with span("preprocess", part="ro_header"):
+        th = preprocess(crop)
+
+    debug_dump.save_image(DEBUG, "ro_header_raw.png", crop)
+    debug_dump.save_image(DEBUG, "ro_header_clean.png", th)
+
+    # === OCR ===
+    with span("ocr", part="ro_header"):
+        text = ocr.image_to_string(th, **ocr_args("RO", "header"), dpi=dpi)
+    text_u = text.upper()
+    debug_dump.save_text(DEBUG, "ro_header_text.txt", text_u)
+
+    with span("parse", part="ro_header"):
+        return parse_header(text_u)
+
+
+if __name__ == "__main__":
+    # === Input PDF ===
+    if len(sys.argv) < 2:
+        print("❌ No PDF path provided")
+        sys.exit(1)
+
+    crop = page_cache.region(sys.argv[1], 1, HEADER_BOX, dpi=300, gray=True)
+    with debug_dump.document(sys.argv[1]):
+        print(json.dumps(read_header(crop), ensure_ascii=False))
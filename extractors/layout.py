@@ -0,0 +1,281 @@
+# layout.py
+"""Per-supplier layout templates: where the header and totals really are.
+
+The crop modules read fixed boxes (FOOTER_BOX = 70–78 % of the page height
+for PO totals, ...). A supplier whose layout is shifted gets its totals cut
+off, extract_totals() falls back to guessing from the biggest numbers and
+the document is re-run by hand.
+
+read() reads a region through a chain of boxes, each with the usual DPI
+escalation, and stops at the first that passes the check:
+
+  1. the template learned for the supplier code, or else for the nearest
+     page fingerprint (64-bit difference hash of a FINGERPRINT_DPI render);
+  2. the module's default box;
+  3. a box found from label anchors ("Total TTC", "DAC", "Code
+     Fournisseur", ...), OCRed on one ANCHOR_DPI render of the whole page.
+
+A box found by anchors that passes is stored as the template of the
+supplier and of the fingerprint, so later documents of that layout go
+straight to a small, well-placed region. Each success counts a hit; a
+failing template loses its hits, and one that fails again before its next
+success is dropped, so a stale template does not cost every later document
+an extra read. Templates live in the `layouts` table of the store database.
+
+    python3 -m extractors.layout list
+    python3 -m extractors.layout forget DOC_TYPE PART [KEY]
+"""
+import re, sys, json, time, sqlite3, argparse, threading
+
+import cv2
+
+import store
+from extractors import page_cache
+from extractors import preprocess as prep
+from extractors.adaptive import escalate
+from extractors.ocr_profiles import ocr_args
+from extractors.telemetry import annotate, span
+from extractors.words import ocr_words
+
+FINGERPRINT_DPI = 12  # enough for the block structure of a page
+ANCHOR_DPI = 100  # labels are large enough to read at this resolution
+MAX_DISTANCE = 10  # differing fingerprint bits still counted as the same layout
+BLOCK_GAP = 3  # line heights between matching lines that start a new block
+FULL_PAGE = (0.0, 0.0, 1.0, 1.0)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS layouts (
+    doc_type    TEXT NOT NULL,
+    part        TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    box         TEXT NOT NULL,
+    hits        INTEGER NOT NULL DEFAULT 0,
+    learned_at  TEXT NOT NULL,
+    PRIMARY KEY (doc_type, part, kind, key)
+);
+"""
+
+_lock = threading.Lock()
+_fingerprints = {}  # (doc_type, part) → {fingerprint: box}, loaded once per process
+
+
+def _setup(conn: sqlite3.Connection):
+    conn.executescript(SCHEMA)
+    _fingerprints.clear()
+
+
+def connect() -> sqlite3.Connection:
+    return store.connection("layout", _setup)
+
+
+def fingerprint(pdf_path: str, page_no: int) -> str:
+    """Difference hash of a tiny render of the page, as 16 hex digits."""
+    # Its own render: a copy downsampled from the anchor render differs
+    # from the direct one by more than MAX_DISTANCE bits at times
+    small = page_cache.thumbnail(pdf_path, page_no, FINGERPRINT_DPI)
+    g = cv2.resize(small, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (g[:, 1:] > g[:, :-1]).flatten()
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+
+def _distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def _by_fingerprint(doc_type: str, part: str) -> dict:
+    key = (doc_type, part)
+    if key not in _fingerprints:
+        rows = connect().execute(
+            "SELECT key, box FROM layouts WHERE doc_type = ? AND part = ? AND kind = 'fingerprint'",
+            key,
+        ).fetchall()
+        _fingerprints[key] = {k: tuple(json.loads(b)) for k, b in rows}
+    return _fingerprints[key]
+
+
+def lookup(doc_type: str, part: str, supplier=None, pdf_path=None, page_no=None):
+    """(box, template key) learned for the supplier or the page's layout, else (None, None)."""
+    if supplier:
+        row = connect().execute(
+            "SELECT box FROM layouts WHERE doc_type = ? AND part = ? AND kind = 'supplier' AND key = ?",
+            (doc_type, part, supplier),
+        ).fetchone()
+        if row:
+            return tuple(json.loads(row[0])), ("supplier", supplier)
+    known = _by_fingerprint(doc_type, part)
+    if known and pdf_path:
+        fp = fingerprint(pdf_path, page_no)
+        nearest = min(known, key=lambda k: _distance(k, fp))
+        if _distance(nearest, fp) <= MAX_DISTANCE:
+            return known[nearest], ("fingerprint", nearest)
+    return None, None
+
+
+def has_supplier_templates(doc_type: str, part: str) -> bool:
+    """Whether a template was learned for some supplier's `part` of `doc_type`."""
+    return connect().execute(
+        "SELECT 1 FROM layouts WHERE doc_type = ? AND part = ? AND kind = 'supplier' LIMIT 1",
+        (doc_type, part),
+    ).fetchone() is not None
+
+
+def learn(doc_type: str, part: str, box, supplier=None, fp=None):
+    """Store `box` as the template of the supplier and of the fingerprint."""
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    keys = [(kind, key) for kind, key in (("supplier", supplier), ("fingerprint", fp)) if key]
+    with _lock:
+        conn = connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO layouts (doc_type, part, kind, key, box, learned_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (doc_type, part, kind, key) DO UPDATE SET box = excluded.box, "
+                "hits = 0, learned_at = excluded.learned_at",
+                [(doc_type, part, kind, key, json.dumps([round(v, 4) for v in box]), now)
+                 for kind, key in keys],
+            )
+    if fp:
+        _by_fingerprint(doc_type, part)[fp] = tuple(box)
+
+
+def _hit(doc_type: str, part: str, template):
+    with _lock:
+        conn = connect()
+        with conn:
+            conn.execute(
+                "UPDATE layouts SET hits = hits + 1 WHERE doc_type = ? AND part = ? AND kind = ? AND key = ?",
+                (doc_type, part, *template),
+            )
+
+
+def _miss(doc_type: str, part: str, template) -> bool:
+    """Demote a template that failed; drop it if it failed before succeeding again.
+
+    Returns True when the template was dropped.
+    """
+    where = "WHERE doc_type = ? AND part = ? AND kind = ? AND key = ?"
+    with _lock:
+        conn = connect()
+        with conn:
+            dropped = conn.execute(f"DELETE FROM layouts {where} AND hits = 0",
+                                   (doc_type, part, *template)).rowcount
+            conn.execute(f"UPDATE layouts SET hits = 0 {where}", (doc_type, part, *template))
+    if dropped and template[0] == "fingerprint":
+        _by_fingerprint(doc_type, part).pop(template[1], None)
+    return bool(dropped)
+
+
+def locate(pdf_path: str, page_no: int, anchors, margin=(0.02, 0.015), block=None):
+    """Box around the lines of `page_no` that match the anchor patterns, or None.
+
+    The box spans from the leftmost matching label to the right margin of
+    the page (values are printed right of their labels). With block="first"
+    or "last", only the topmost or lowest run of matching lines counts: runs
+    are split where matching lines are more than BLOCK_GAP line heights
+    apart (dates of the line items below a header, the TOTAL HT column
+    header above the totals).
+    """
+    with span("anchors", page=page_no, dpi=ANCHOR_DPI):
+        page = page_cache.region(pdf_path, page_no, FULL_PAGE, dpi=ANCHOR_DPI, gray=True)
+        words = ocr_words(prep.top(page), page.shape, FULL_PAGE, dpi=ANCHOR_DPI,
+                          **ocr_args("default", "anchors"))
+    lines = {}
+    for w in words:
+        lines.setdefault(w["line"], []).append(w)
+    matches = []  # (top, bottom, word boxes) of each matching line
+    for ws in lines.values():
+        text = " ".join(w["text"] for w in sorted(ws, key=lambda w: w["box"][0])).upper()
+        if any(re.search(a, text) for a in anchors):
+            boxes = [w["box"] for w in ws]
+            matches.append((min(b[1] for b in boxes), max(b[3] for b in boxes), boxes))
+    if not matches:
+        return None
+    matches.sort(key=lambda m: m[0])
+    if block:
+        gap = BLOCK_GAP * max(bottom - top for top, bottom, _ in matches)
+        runs = [[matches[0]]]
+        for m in matches[1:]:
+            if m[0] - runs[-1][-1][1] > gap:
+                runs.append([])
+            runs[-1].append(m)
+        matches = runs[0] if block == "first" else runs[-1]
+    boxes = [b for _, _, bs in matches for b in bs]
+    mx, my = margin
+    return (max(0.0, min(b[0] for b in boxes) - mx), max(0.0, min(b[1] for b in boxes) - my),
+            1.0 - mx, min(1.0, max(b[3] for b in boxes) + my))
+
+
+def read(pdf_path: str, doc_type: str, part: str, page_no: int, default_box, anchors,
+         read_crop, check, supplier=None):
+    """(result, dpi) of one region, through template, default and anchored boxes.
+
+    `read_crop(crop, dpi)` turns a grayscale crop into a result, `check`
+    accepts it.
+    The way the region was found is annotated as `<part>_layout`.
+    """
+    if page_no < 0:
+        page_no = page_cache.page_count(pdf_path) + 1 + page_no
+
+    def attempt(box):
+        return escalate(
+            read_crop,
+            lambda dpi: page_cache.region(pdf_path, page_no, box, dpi=dpi, gray=True),
+            check,
+        )
+
+    template_box, template = lookup(doc_type, part, supplier, pdf_path, page_no)
+    if template_box:
+        result, dpi = attempt(template_box)
+        if check(result):
+            _hit(doc_type, part, template)
+            annotate(**{f"{part}_layout": f"template:{template[0]}"})
+            return result, dpi
+        dropped = _miss(doc_type, part, template)
+        print(f"🔁 {doc_type} {part} template ({template[0]}) failed"
+              f"{', dropped' if dropped else ''}, trying the default box")
+
+    result, dpi = attempt(default_box)
+    if check(result):
+        annotate(**{f"{part}_layout": "default"})
+        return result, dpi
+
+    # The region is not where the box says: look for its labels
+    # The header is the topmost block of labels, the totals the lowest one
+    box = locate(pdf_path, page_no, anchors, block="first" if part == "header" else "last")
+    if box and box not in (tuple(default_box), template_box):
+        found, found_dpi = attempt(box)
+        if check(found):
+            print(f"📐 {doc_type} {part} found by anchors at {tuple(round(v, 3) for v in box)}")
+            learn(doc_type, part, box, supplier, fingerprint(pdf_path, page_no))
+            annotate(**{f"{part}_layout": "anchors"})
+            return found, found_dpi
+    annotate(**{f"{part}_layout": "unresolved"})
+    return result, dpi
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the learned layout templates.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="templates as JSON lines")
+    f = sub.add_parser("forget", help="drop templates (all of a doc type and part, or one key)")
+    f.add_argument("doc_type", choices=["PO", "RO"])
+    f.add_argument("part", choices=["header", "footer"])
+    f.add_argument("key", nargs="?")
+    args = parser.parse_args()
+
+    conn = connect()
+    if args.cmd == "list":
+        for row in conn.execute("SELECT * FROM layouts ORDER BY doc_type, part, kind, hits DESC"):
+            cols = ("doc_type", "part", "kind", "key", "box", "hits", "learned_at")
+            print(json.dumps(dict(zip(cols, row)), ensure_ascii=False))
+    else:
+        sql, params = "DELETE FROM layouts WHERE doc_type = ? AND part = ?", [args.doc_type, args.part]
+        if args.key:
+            sql += " AND key = ?"
+            params.append(args.key)
+        with conn:
+            print(f"🗑️ {conn.execute(sql, params).rowcount} templates dropped")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
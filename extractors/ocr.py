@@ -0,0 +1,128 @@
+# ocr.py
+"""OCR backend used by every stage.
+
+Two engines behind the same two calls, image_to_string() and image_to_data():
+
+  tesserocr    Tesseract C API kept alive in-process. Language models are
+               loaded once per (lang, oem, config) and thread, numpy arrays
+               are handed over as raw bytes: no process spawn, no temp file.
+  pytesseract  one `tesseract` process per call (fallback, always works).
+
+INVOICEBRAIN_OCR_BACKEND=auto|tesserocr|pytesseract picks one; auto uses
+tesserocr when it is installed.
+"""
+import os, shlex, threading
+import numpy as np
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # optional dependency
+    tesserocr = None
+
+BACKEND = os.environ.get("INVOICEBRAIN_OCR_BACKEND", "auto").lower()
+DEFAULT_DPI = 300
+
+_local = threading.local()
+
+
+def backend() -> str:
+    if BACKEND == "tesserocr" and tesserocr is None:
+        raise RuntimeError("INVOICEBRAIN_OCR_BACKEND=tesserocr but tesserocr is not installed")
+    if BACKEND in ("auto", "tesserocr") and tesserocr is not None:
+        return "tesserocr"
+    return "pytesseract"
+
+
+def parse_config(config: str):
+    """'--psm 6 --oem 3 -c a=b' → (psm, oem, {a: b})."""
+    psm, oem, variables = 3, 3, {}
+    args = shlex.split(config or "")
+    i = 0
+    while i < len(args):
+        if args[i] == "--psm":
+            psm = int(args[i + 1]); i += 2
+        elif args[i] == "--oem":
+            oem = int(args[i + 1]); i += 2
+        elif args[i] == "-c":
+            k, _, v = args[i + 1].partition("="); variables[k] = v; i += 2
+        else:
+            i += 1
+    return psm, oem, variables
+
+
+def _engine(lang: str, config: str):
+    """Persistent per-thread tesserocr API for this lang/config."""
+    engines = getattr(_local, "engines", None)
+    if engines is None:
+        engines = _local.engines = {}
+    key = (lang, config)
+    api = engines.get(key)
+    if api is None:
+        psm, oem, variables = parse_config(config)
+        api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm, oem=oem)
+        for k, v in variables.items():
+            api.SetVariable(k, v)
+        engines[key] = api
+    return api
+
+
+def _set_image(api, img, dpi):
+    img = np.ascontiguousarray(img)
+    if img.ndim == 2:
+        bpp = 1
+    else:
+        bpp = img.shape[2]
+    h, w = img.shape[:2]
+    api.SetImageBytes(img.tobytes(), w, h, bpp, w * bpp)
+    api.SetSourceResolution(dpi)
+
+
+def _with_dpi(config: str, dpi) -> str:
+    # The CLI's counterpart of SetSourceResolution(): both backends assume the same size
+    return f"{config} --dpi {dpi}".strip()
+
+
+def image_to_string(img, lang="fra+eng", config="", dpi=DEFAULT_DPI) -> str:
+    if backend() == "tesserocr":
+        api = _engine(lang, config)
+        _set_image(api, img, dpi)
+        return api.GetUTF8Text()
+    return pytesseract.image_to_string(img, lang=lang, config=_with_dpi(config, dpi))
+
+
+def image_to_data(img, lang="fra+eng", config="", dpi=DEFAULT_DPI) -> dict:
+    """Word boxes in pytesseract's Output.DICT layout (word level only)."""
+    if backend() != "tesserocr":
+        return pytesseract.image_to_data(
+            img, lang=lang, config=_with_dpi(config, dpi), output_type=pytesseract.Output.DICT
+        )
+
+    api = _engine(lang, config)
+    _set_image(api, img, dpi)
+    api.Recognize()
+    RIL = tesserocr.RIL
+    data = {k: [] for k in ("text", "left", "top", "width", "height",
+                            "block_num", "par_num", "line_num", "conf")}
+    block = par = line = 0
+    for r in tesserocr.iterate_level(api.GetIterator(), RIL.WORD):
+        if r.IsAtBeginningOf(RIL.BLOCK):
+            block, par = block + 1, 0
+        if r.IsAtBeginningOf(RIL.PARA):
+            par, line = par + 1, 0
+        if r.IsAtBeginningOf(RIL.TEXTLINE):
+            line += 1
+        box = r.BoundingBox(RIL.WORD)
+        if box is None:
+            continue
+        x1, y1, x2, y2 = box
+        data["text"].append(r.GetUTF8Text(RIL.WORD) or "")
+        data["left"].append(x1)
+        data["top"].append(y1)
+        data["width"].append(x2 - x1)
+        data["height"].append(y2 - y1)
+        data["block_num"].append(block)
+        data["par_num"].append(par)
+        data["line_num"].append(line)
+        data["conf"].append(r.Confidence(RIL.WORD))
+    return data
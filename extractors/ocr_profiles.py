@@ -0,0 +1,64 @@
+# ocr_profiles.py
+"""Per-document-type, per-field OCR settings.
+
+Free text (title band, headers, anchor labels) keeps the default fra+eng
+models. Regions that only hold labels and numbers do not need two language
+models or the full character set: a single model plus a character
+whitelist is faster and cannot hallucinate letters into amounts. Single
+fields (DAC number, date) are re-read as one text line (--psm 7).
+
+Profiles can be overridden with a JSON file named by INVOICEBRAIN_OCR_PROFILES,
+shaped like PROFILES ({"RO": {"totals": {"lang": "eng"}}, ...}); missing keys
+keep their defaults.
+"""
+import os, json, copy
+
+DIGITS = "0123456789"
+# Letters of every label extract_totals() looks for (Total/Montant HT, TVA, Taxe, TTC)
+TOTAL_LABELS = "TotalMntHVAaxeC"
+
+_DEFAULTS = {
+    # Title + header pass before the type is known
+    "top": {"psm": 6},
+    "header": {"psm": 6, "vars": {"preserve_interword_spaces": "1"}},
+    "totals": {
+        "lang": "fra", "psm": 6,
+        "whitelist": DIGITS + " .,:-" + TOTAL_LABELS + TOTAL_LABELS.upper(),
+    },
+    "date": {"lang": "eng", "psm": 7, "whitelist": DIGITS + "/"},
+    "dac": {"lang": "eng", "psm": 7, "whitelist": "DAC/-" + DIGITS},
+    # Label search over a whole low-DPI page (layout.locate): sparse text
+    "anchors": {"psm": 11},
+}
+
+PROFILES = {
+    "default": _DEFAULTS,
+    "PO": copy.deepcopy(_DEFAULTS),
+    "RO": copy.deepcopy(_DEFAULTS),
+}
+# RO headers were always read with Tesseract's automatic segmentation
+PROFILES["RO"]["header"] = {"psm": 3}
+
+
+def _load_overrides(path):
+    with open(path, encoding="utf-8") as f:
+        overrides = json.load(f)
+    for doc_type, fields in overrides.items():
+        target = PROFILES.setdefault(doc_type, copy.deepcopy(_DEFAULTS))
+        for field, settings in fields.items():
+            target.setdefault(field, {}).update(settings)
+
+
+if os.environ.get("INVOICEBRAIN_OCR_PROFILES"):
+    _load_overrides(os.environ["INVOICEBRAIN_OCR_PROFILES"])
+
+
+def ocr_args(doc_type: str, field: str) -> dict:
+    """lang/config keyword arguments for ocr.image_to_string / image_to_data."""
+    profile = PROFILES.get(doc_type, PROFILES["default"]).get(field) or PROFILES["default"][field]
+    config = [f"--psm {profile.get('psm', 6)}", f"--oem {profile.get('oem', 3)}"]
+    variables = dict(profile.get("vars", {}))
+    if profile.get("whitelist"):
+        variables["tessedit_char_whitelist"] = "".join(sorted(set(profile["whitelist"]) - {" "}))
+    config += [f"-c {k}={v}" for k, v in variables.items()]
+    return {"lang": profile.get("lang", "fra+eng"), "config": " ".join(config)}
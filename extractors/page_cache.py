@@ -0,0 +1,282 @@
+# page_cache.py
+"""Per-document page raster cache.
+
+detect_type.py and the header/footer crop scripts all need page 1 (and the
+footers the last page) of the same PDF, but each used to rasterize it again.
+Renders are now kept keyed by the PDF content hash: the stages see the
+document under different paths (incoming/, data/processed/,
+data/PO_detected/), but the bytes stay the same. Each region is rendered
+at the DPI first asked for; a stage asking for less gets a downsampled
+copy of the best cached render, and only a request for more (adaptive DPI
+escalation) renders it again.
+
+The pipeline only ever reads a few ROIs (title/header band, totals box), so
+region() asks pdftoppm to rasterize just that rectangle (-x/-y/-W/-H) and
+reads the PPM from its stdout: no full-page bitmap, no temporary files.
+Regions are cached per page, box and DPI, and a region that lies inside one
+already cached at the same or a higher DPI (the header box inside the title
+band of classification) is cut out of it instead of being rendered again.
+
+Rasters live only in memory until release(): every stage now runs in one
+interpreter (pipeline.process, scheduler.py), and the crop scripts run by
+hand would leave files behind. Stages split across processes set
+PERSIST = True to share them as files in CACHE_DIR, and must release().
+"""
+import os, re, hashlib, shutil, subprocess
+import numpy as np
+import cv2
+from extractors.telemetry import span
+from extractors.text_layer import page_count as _pdf_page_count, page_size
+
+CACHE_DIR = os.path.join("data", "cache", "pages")
+RENDER_DPI = 300  # default when a stage does not ask for a DPI
+RENDER_TIMEOUT = 60  # seconds per pdftoppm call
+BOX_SCALE = 10000  # box fractions are kept in cache names as integers of this scale
+PERSIST = False  # True: also write rasters to CACHE_DIR for out-of-process stages
+
+_hashes = {}
+_memory = {}
+
+
+def file_hash(pdf_path: str) -> str:
+    """SHA-1 of the PDF bytes (memoized per path/size/mtime)."""
+    st = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), st.st_size, st.st_mtime_ns)
+    if key not in _hashes:
+        h = hashlib.sha1()
+        with open(pdf_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        if len(_hashes) > 4096:
+            _hashes.clear()
+        _hashes[key] = h.hexdigest()
+    return _hashes[key]
+
+
+def _doc_dir(pdf_path: str) -> str:
+    return os.path.join(CACHE_DIR, file_hash(pdf_path))
+
+
+def _load(path: str):
+    if path in _memory:
+        return _memory[path]
+    if not os.path.exists(path):
+        return None
+    # Copy-on-write map: crops only touch the rows they slice.
+    return np.load(path, mmap_mode="c")
+
+
+def _store(path: str, img: np.ndarray):
+    _memory[path] = img
+    if not PERSIST:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, img)
+    os.replace(tmp, path)
+
+
+def _resample(img: np.ndarray, src_dpi: int, dpi: int) -> np.ndarray:
+    if dpi == src_dpi:
+        return img
+    scale = dpi / src_dpi
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def _cached_dpis(doc_dir: str, which: str):
+    prefix = f"{which}@"
+    names = {os.path.basename(k) for k in list(_memory) if os.path.dirname(k) == doc_dir}
+    if PERSIST and os.path.isdir(doc_dir):
+        names.update(os.listdir(doc_dir))
+    return sorted(
+        int(n[len(prefix):-4]) for n in names if n.startswith(prefix) and n.endswith(".npy")
+    )
+
+
+def page_count(pdf_path: str) -> int:
+    """Number of pages, read from the PDF trailer by pdfinfo (no rendering)."""
+    path = os.path.join(_doc_dir(pdf_path), "pages.txt")
+    if path in _memory:
+        return _memory[path]
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return int(f.read())
+    with span("page_count"):
+        count = _pdf_page_count(pdf_path)
+    _memory[path] = count
+    if not PERSIST:
+        return count
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(str(count))
+    return count
+
+
+def _read_pnm(data: bytes) -> np.ndarray:
+    """Decode a binary PGM (P5) / PPM (P6) with maxval 255, as pdftoppm writes it."""
+    fields, pos = [], 0
+    while len(fields) < 4:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b"#":
+            pos = data.index(b"\n", pos) + 1
+            continue
+        end = pos
+        while end < len(data) and not data[end:end + 1].isspace():
+            end += 1
+        fields.append(data[pos:end])
+        pos = end
+    pos += 1  # single whitespace byte after maxval
+    magic, w, h = fields[0], int(fields[1]), int(fields[2])
+    if magic not in (b"P5", b"P6") or int(fields[3]) != 255:
+        raise ValueError(f"unsupported PNM from pdftoppm: {magic!r} maxval {fields[3]!r}")
+    channels = 3 if magic == b"P6" else 1
+    img = np.frombuffer(data, np.uint8, count=w * h * channels, offset=pos)
+    shape = (h, w, 3) if channels == 3 else (h, w)
+    return img.reshape(shape).copy()  # writable, independent of the pipe buffer
+
+
+def _page_size(pdf_path: str, page_no: int):
+    """Displayed page size in points, memoized per document and page."""
+    key = os.path.join(_doc_dir(pdf_path), f"size{page_no}")
+    if key not in _memory:
+        _memory[key] = page_size(pdf_path, page_no)
+    return _memory[key]
+
+
+def _pixels(pdf_path: str, page_no: int, box, dpi: int):
+    """Pixel box of `box` within a full-page render at `dpi`."""
+    w_pt, h_pt = _page_size(pdf_path, page_no)
+    w, h = w_pt * dpi / 72, h_pt * dpi / 72
+    return int(w * box[0]), int(h * box[1]), int(w * box[2]), int(h * box[3])
+
+
+def _render_region(pdf_path: str, page_no: int, box, dpi: int, gray: bool) -> np.ndarray:
+    """Rasterize only `box` (page fractions) of one page at `dpi`."""
+    x1, y1, x2, y2 = _pixels(pdf_path, page_no, box, dpi)
+    cmd = [
+        "pdftoppm", "-r", str(dpi), "-f", str(page_no), "-l", str(page_no),
+        "-x", str(x1), "-y", str(y1), "-W", str(x2 - x1), "-H", str(y2 - y1),
+    ]
+    if gray:
+        cmd.append("-gray")  # 8-bit PGM straight from poppler, no colour conversion
+    cmd.append(pdf_path)
+    with span("render", page=page_no, dpi=dpi, region=True):
+        out = subprocess.run(
+            cmd, capture_output=True, timeout=RENDER_TIMEOUT, check=True
+        ).stdout
+        return _read_pnm(out)
+
+
+def _cached(pdf_path: str, which: str, dpi: int, render) -> np.ndarray:
+    doc_dir = _doc_dir(pdf_path)
+    higher = [d for d in _cached_dpis(doc_dir, which) if d >= dpi]
+    if higher:
+        src_dpi = higher[0]
+        img = _load(os.path.join(doc_dir, f"{which}@{src_dpi}.npy"))
+        if img is not None:
+            return _resample(img, src_dpi, dpi)
+    img = render()
+    _store(os.path.join(doc_dir, f"{which}@{dpi}.npy"), img)
+    return img
+
+
+# p<page>_<x1>-<y1>-<x2>-<y2>[_gray]@<dpi>.npy, box in BOX_SCALE units
+_REGION = re.compile(r"^p(\d+)_(\d+)-(\d+)-(\d+)-(\d+)(_gray)?@(\d+)\.npy$")
+
+
+def _region_name(page_no: int, box, gray: bool) -> str:
+    which = f"p{page_no}_" + "-".join(str(round(v * BOX_SCALE)) for v in box)
+    return which + "_gray" if gray else which
+
+
+def _containing(doc_dir: str, page_no: int, box, dpi: int, gray: bool):
+    """(name, box, dpi) of the cached region best suited to cut `box` from, or None.
+
+    Lowest DPI at or above `dpi` first (least resampling), then smallest box.
+    """
+    names = {os.path.basename(k) for k in list(_memory) if os.path.dirname(k) == doc_dir}
+    if PERSIST and os.path.isdir(doc_dir):
+        names.update(os.listdir(doc_dir))
+    want = [round(v * BOX_SCALE) for v in box]
+    found = []
+    for name in names:
+        m = _REGION.match(name)
+        if not m or int(m.group(1)) != page_no or bool(m.group(6)) != gray:
+            continue
+        cbox, cdpi = [int(v) for v in m.group(2, 3, 4, 5)], int(m.group(7))
+        if (cdpi >= dpi and cbox[0] <= want[0] and cbox[1] <= want[1]
+                and cbox[2] >= want[2] and cbox[3] >= want[3]):
+            area = (cbox[2] - cbox[0]) * (cbox[3] - cbox[1])
+            found.append((cdpi, area, name, tuple(v / BOX_SCALE for v in cbox)))
+    if not found:
+        return None
+    cdpi, _, name, cbox = min(found)
+    return name, cbox, cdpi
+
+
+def region(pdf_path: str, page_no: int, box, dpi: int = RENDER_DPI,
+           gray: bool = False) -> np.ndarray:
+    """Return `box` (x1, y1, x2, y2 page fractions) of a page as an RGB array.
+
+    `page_no` counts from 1; negative values count from the end (-1 = last
+    page). Only the box is rasterized, never the rest of the page.
+    `gray=True` returns a 2-D uint8 array rendered in grayscale by poppler
+    (what the OCR stages want).
+    """
+    if page_no < 0:
+        page_no = page_count(pdf_path) + 1 + page_no
+    doc_dir = _doc_dir(pdf_path)
+    source = _containing(doc_dir, page_no, box, dpi, gray)
+    if source:
+        name, cbox, src_dpi = source
+        img = _load(os.path.join(doc_dir, name))
+        if img is not None:
+            # Same pixel grid as a direct render of `box` at src_dpi
+            x1, y1, x2, y2 = _pixels(pdf_path, page_no, box, src_dpi)
+            cx1, cy1, _, _ = _pixels(pdf_path, page_no, cbox, src_dpi)
+            crop = img[max(0, y1 - cy1):y2 - cy1, max(0, x1 - cx1):x2 - cx1]
+            return _resample(crop, src_dpi, dpi)
+    img = _render_region(pdf_path, page_no, box, dpi, gray)
+    _store(os.path.join(doc_dir, f"{_region_name(page_no, box, gray)}@{dpi}.npy"), img)
+    return img
+
+
+def thumbnail(pdf_path: str, page_no: int, dpi: int) -> np.ndarray:
+    """Whole page in grayscale, always rendered by poppler at `dpi` itself.
+
+    Unlike region(), never a downsampled copy of a larger cached render:
+    the result does not depend on what other stages rendered before.
+    """
+    if page_no < 0:
+        page_no = page_count(pdf_path) + 1 + page_no
+    return _cached(
+        pdf_path, f"p{page_no}_thumb{dpi}", dpi,
+        lambda: _render_region(pdf_path, page_no, (0.0, 0.0, 1.0, 1.0), dpi, True),
+    )
+
+
+def release(pdf_path: str):
+    """Drop the cached rasters of a document once the pipeline is done with it."""
+    release_digest(file_hash(pdf_path))
+
+
+def release_page(pdf_path: str, page_no: int):
+    """Drop the cached regions of one page (page-by-page readers keep memory flat)."""
+    doc_dir = _doc_dir(pdf_path)
+    prefix = f"p{page_no}_"
+    for key in [k for k in list(_memory)
+                if os.path.dirname(k) == doc_dir and os.path.basename(k).startswith(prefix)]:
+        _memory.pop(key, None)
+        if os.path.exists(key):
+            os.remove(key)
+
+
+def release_digest(digest: str):
+    """Same as release(), for callers that only kept the content hash."""
+    doc_dir = os.path.join(CACHE_DIR, digest)
+    # list(): other threads (scheduler.py) may be caching their documents
+    for key in [k for k in list(_memory) if os.path.dirname(k) == doc_dir]:
+        _memory.pop(key, None)
+    shutil.rmtree(doc_dir, ignore_errors=True)
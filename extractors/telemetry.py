@@ -0,0 +1,175 @@
+# telemetry.py
+"""Per-document, per-stage timing and resource spans.
+
+Stages wrap their work in `with span("ocr"):`. Each span records wall time,
+CPU time of this process and of waited-for children (tesseract and poppler
+run as subprocesses), and the peak RSS of both so far. All spans of one
+document are appended as a single JSON line to SPANS_LOG when the document
+finishes, so worker processes can share the file.
+
+    python3 -m extractors.telemetry summary [spans.jsonl] [--last N]
+"""
+import os, json, time, resource, contextvars, argparse
+from contextlib import contextmanager
+
+SPANS_LOG = os.environ.get(
+    "INVOICEBRAIN_SPANS_LOG", os.path.join("data", "telemetry", "spans.jsonl")
+)
+
+_current = contextvars.ContextVar("telemetry_document", default=None)
+
+
+def _usage():
+    self_ru = resource.getrusage(resource.RUSAGE_SELF)
+    child_ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (
+        time.perf_counter(),
+        time.process_time(),
+        child_ru.ru_utime + child_ru.ru_stime,
+        self_ru.ru_maxrss,
+        child_ru.ru_maxrss,
+    )
+
+
+@contextmanager
+def document(pdf_path: str):
+    """Collect the spans of one document and write them out at the end."""
+    doc = {"document": os.path.basename(pdf_path), "pid": os.getpid(),
+           "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "spans": []}
+    token = _current.set(doc)
+    status = "ok"
+    try:
+        with span("total"):
+            yield doc
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _current.reset(token)
+        doc["status"] = status
+        _write(doc)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time one stage of the current document (no-op outside document())."""
+    doc = _current.get()
+    if doc is None:
+        yield
+        return
+    wall0, cpu0, child0, _, _ = _usage()
+    try:
+        yield
+    finally:
+        wall1, cpu1, child1, rss, child_rss = _usage()
+        record = {
+            "stage": name,
+            "wall_ms": round((wall1 - wall0) * 1000, 2),
+            "cpu_ms": round((cpu1 - cpu0) * 1000, 2),
+            "child_cpu_ms": round((child1 - child0) * 1000, 2),
+            "peak_rss_kb": rss,
+            "child_peak_rss_kb": child_rss,
+        }
+        record.update(attrs)
+        doc["spans"].append(record)
+
+
+def add_span(name: str, wall_ms: float, **attrs):
+    """Record a span timed elsewhere (e.g. the wait in a scheduler queue)."""
+    doc = _current.get()
+    if doc is not None:
+        _, _, _, rss, child_rss = _usage()
+        record = {"stage": name, "wall_ms": round(wall_ms, 2), "cpu_ms": 0.0,
+                  "child_cpu_ms": 0.0, "peak_rss_kb": rss, "child_peak_rss_kb": child_rss}
+        record.update(attrs)
+        doc["spans"].append(record)
+
+
+def annotate(**attrs):
+    """Attach attributes (doc type, DPI, source, ...) to the current document."""
+    doc = _current.get()
+    if doc is not None:
+        doc.update(attrs)
+
+
+def _write(doc: dict):
+    os.makedirs(os.path.dirname(SPANS_LOG) or ".", exist_ok=True)
+    line = json.dumps(doc, ensure_ascii=False, default=str) + "\n"
+    # One O_APPEND write per document keeps lines whole across workers.
+    fd = os.open(SPANS_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summary(path: str = SPANS_LOG, last: int = None) -> dict:
+    """p50/p95/p99 wall and CPU time per stage over the logged documents."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            docs = [json.loads(l) for l in f if l.strip()]
+    except FileNotFoundError:
+        docs = []
+    if last:
+        docs = docs[-last:]
+
+    per_stage = {}
+    for d in docs:
+        # Sum repeated spans (e.g. two OCR calls) per document and stage
+        totals = {}
+        for s in d["spans"]:
+            t = totals.setdefault(s["stage"], [0.0, 0.0])
+            t[0] += s["wall_ms"]
+            t[1] += s["cpu_ms"] + s.get("child_cpu_ms", 0)
+        for stage, (wall, cpu) in totals.items():
+            per_stage.setdefault(stage, {"wall": [], "cpu": []})
+            per_stage[stage]["wall"].append(wall)
+            per_stage[stage]["cpu"].append(cpu)
+
+    stages = {}
+    for stage, v in sorted(per_stage.items()):
+        stages[stage] = {"count": len(v["wall"])}
+        for metric in ("wall", "cpu"):
+            for q in (50, 95, 99):
+                stages[stage][f"{metric}_p{q}_ms"] = round(_percentile(v[metric], q / 100), 2)
+    peak = max((s["peak_rss_kb"] for d in docs for s in d["spans"]), default=None)
+    return {"documents": len(docs), "errors": sum(d.get("status") == "error" for d in docs),
+            "peak_rss_kb": peak, "stages": stages}
+
+
+def print_summary(path: str = SPANS_LOG, last: int = None):
+    s = summary(path, last)
+    print(f"📊 {s['documents']} documents ({s['errors']} errors), peak RSS {s['peak_rss_kb']} kB")
+    print(f"{'stage':<14}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'cpu p50':>10}")
+    for stage, v in s["stages"].items():
+        print(f"{stage:<14}{v['count']:>6}{v['wall_p50_ms']:>10}{v['wall_p95_ms']:>10}"
+              f"{v['wall_p99_ms']:>10}{v['cpu_p50_ms']:>10}")
+
+
+def install_summary_signal():
+    """Print the summary when the process receives SIGUSR1."""
+    import signal
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda *_: print_summary())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize per-stage spans.")
+    parser.add_argument("command", choices=["summary"])
+    parser.add_argument("path", nargs="?", default=SPANS_LOG)
+    parser.add_argument("--last", type=int, help="only the last N documents")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+    if args.json:
+        print(json.dumps(summary(args.path, args.last), indent=2))
+    else:
+        print_summary(args.path, args.last)
@@ -0,0 +1,63 @@
+# text_layer.py
+"""Read the embedded text layer of digitally generated PDFs.
+
+Uses poppler's pdfinfo / pdftotext (installed with pdftoppm) to
+pull the text inside a page region, given as (x1, y1, x2, y2) fractions of
+the page like the crop boxes of the OCR scripts. Scanned PDFs simply return
+empty strings, so callers can fall back to raster + OCR.
+"""
+import re, subprocess
+
+from extractors.telemetry import span
+
+TIMEOUT = 30  # seconds per poppler call
+
+_SIZE = re.compile(r"^Page\s+(\d+)\s+size:\s+([\d.]+)\s+x\s+([\d.]+)", re.M)
+_ROT = re.compile(r"^Page\s+(\d+)\s+rot:\s+(\d+)", re.M)
+_PAGES = re.compile(r"^Pages:\s+(\d+)", re.M)
+
+
+def page_count(pdf_path: str) -> int:
+    """Number of pages, from the PDF trailer."""
+    out = subprocess.run(
+        ["pdfinfo", pdf_path], capture_output=True, text=True, timeout=TIMEOUT, check=True,
+    ).stdout
+    m = _PAGES.search(out)
+    if not m:
+        raise ValueError(f"pdfinfo reported no page count for {pdf_path}")
+    return int(m.group(1))
+
+
+def page_size(pdf_path: str, page_no: int):
+    """Page (width, height) in points as displayed (rotation applied)."""
+    out = subprocess.run(
+        ["pdfinfo", "-f", str(page_no), "-l", str(page_no), pdf_path],
+        capture_output=True, text=True, timeout=TIMEOUT, check=True,
+    ).stdout
+    m = _SIZE.search(out)
+    if not m:
+        raise ValueError(f"pdfinfo reported no size for page {page_no} of {pdf_path}")
+    w, h = float(m.group(2)), float(m.group(3))
+    rot = _ROT.search(out)
+    if rot and int(rot.group(2)) % 180 == 90:
+        w, h = h, w
+    return w, h
+
+
+def region_text(pdf_path: str, page_no: int, box, size=None) -> str:
+    """Text of the embedded layer inside `box` on `page_no` ('' if none)."""
+    w, h = size or page_size(pdf_path, page_no)
+    x1, y1, x2, y2 = box
+    # pdftotext crop coordinates are pixels at -r (72 dpi → PDF points)
+    cmd = [
+        "pdftotext", "-q", "-layout", "-r", "72",
+        "-f", str(page_no), "-l", str(page_no),
+        "-x", str(int(w * x1)), "-y", str(int(h * y1)),
+        "-W", str(int(w * (x2 - x1)) + 1), "-H", str(int(h * (y2 - y1)) + 1),
+        pdf_path, "-",
+    ]
+    with span("text_layer", page=page_no):
+        res = subprocess.run(cmd, capture_output=True, text=True, timeout=TIMEOUT)
+    if res.returncode != 0:
+        return ""
+    return res.stdout.replace("\f", "").strip()
@@ -0,0 +1,70 @@
+# words.py
+"""Word-level OCR results in page coordinates.
+
+One Tesseract image_to_data pass over a crop gives every word with its box;
+boxes are stored as fractions of the full page, so any stage can pull the
+text inside its own ROI (HEADER_BOX, TITLE_BOX, ...) without OCRing again.
+"""
+import re
+
+from extractors import ocr
+
+
+def ocr_words(img, page_shape, box, lang="fra+eng", config="--psm 6", dpi=ocr.DEFAULT_DPI):
+    """Words of `img` (the crop of `box` from a page of `page_shape`, rendered at `dpi`)."""
+    ph, pw = page_shape[:2]
+    bx1, by1 = box[0], box[1]
+    data = ocr.image_to_data(img, lang=lang, config=config, dpi=dpi)
+    words = []
+    for i, text in enumerate(data["text"]):
+        text = text.strip()
+        if not text:
+            continue
+        x = bx1 + data["left"][i] / pw
+        y = by1 + data["top"][i] / ph
+        words.append({
+            "text": text,
+            "px": (data["left"][i], data["top"][i],
+                   data["left"][i] + data["width"][i], data["top"][i] + data["height"][i]),
+            "box": (x, y, x + data["width"][i] / pw, y + data["height"][i] / ph),
+            "line": (data["block_num"][i], data["par_num"][i], data["line_num"][i]),
+            "conf": float(data["conf"][i]),
+        })
+    return words
+
+
+def text_in(words, box=None):
+    """Text of the words whose centre falls inside `box`, one OCR line per line."""
+    lines = {}
+    for w in words:
+        x1, y1, x2, y2 = w["box"]
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        if box and not (box[0] <= cx <= box[2] and box[1] <= cy <= box[3]):
+            continue
+        lines.setdefault(w["line"], []).append(w)
+    return "\n".join(
+        " ".join(w["text"] for w in sorted(ws, key=lambda w: w["box"][0]))
+        for _, ws in sorted(lines.items())
+    )
+
+
+def reread(img, words, anchor, pad=6, alone=False, **ocr_kwargs):
+    """OCR again, with field-specific settings, the line part starting at `anchor`.
+
+    `img` is the crop the words were read from; the first word matching the
+    `anchor` regex and the words after it on the same line are re-read as a
+    single text line (only the matching word with `alone`). Returns '' when
+    no word matches.
+    """
+    pattern = re.compile(anchor, re.I)
+    start = next((w for w in words if pattern.search(w["text"])), None)
+    if start is None:
+        return ""
+    line = [start] if alone else [
+        w for w in words if w["line"] == start["line"] and w["px"][0] >= start["px"][0]
+    ]
+    x1 = max(0, min(w["px"][0] for w in line) - pad)
+    y1 = max(0, min(w["px"][1] for w in line) - pad)
+    x2 = max(w["px"][2] for w in line) + pad
+    y2 = max(w["px"][3] for w in line) + pad
+    return ocr.image_to_string(img[y1:y2, x1:x2], **ocr_kwargs).strip()
@@ -0,0 +1,126 @@
+"""Completed-file events for the incoming folder.
+
+On Linux the folder is watched with inotify (through ctypes, no extra
+dependency): a PDF is reported once it is closed after writing
+(IN_CLOSE_WRITE) or renamed into the folder (IN_MOVED_TO), and only after
+SETTLE_SECONDS without further events for that name, so writers that
+reopen the file are debounced. Elsewhere, or with poll=True, the folder
+is listed every POLL_INTERVAL seconds and a file is reported once its
+size and mtime have stopped changing.
+
+Both watchers put ready paths on a queue.Queue from a daemon thread.
+"""
+import os, sys, time, struct, select, threading, ctypes, ctypes.util
+
+SETTLE_SECONDS = 0.5  # quiet time before a written file counts as complete
+POLL_INTERVAL = 2  # seconds between listings in polling mode
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+
+def _is_pdf(name: str) -> bool:
+    return name.lower().endswith(".pdf")
+
+
+def _list_pdfs(directory: str):
+    with os.scandir(directory) as it:
+        return {e.name: e.stat() for e in it if e.is_file() and _is_pdf(e.name)}
+
+
+class InotifyWatcher(threading.Thread):
+    """Reports completed PDFs in `directory` using inotify."""
+
+    def __init__(self, directory: str, out_queue):
+        super().__init__(daemon=True, name="inotify-watcher")
+        self.directory = directory
+        self.queue = out_queue
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO
+        )
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self.pending = {}  # name → time at which it is considered settled
+
+    def _read_events(self):
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(buf):
+            _, mask, _, length = _EVENT.unpack_from(buf, offset)
+            offset += _EVENT.size
+            name = buf[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Kernel queue overflowed: fall back to one full listing.
+                for n in _list_pdfs(self.directory):
+                    self.pending[n] = time.monotonic() + SETTLE_SECONDS
+            elif name and _is_pdf(name):
+                self.pending[name] = time.monotonic() + SETTLE_SECONDS
+
+    def run(self):
+        while True:
+            now = time.monotonic()
+            timeout = min(self.pending.values(), default=None)
+            timeout = None if timeout is None else max(0.0, timeout - now)
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+            if ready:
+                self._read_events()
+            now = time.monotonic()
+            for name, deadline in list(self.pending.items()):
+                if deadline <= now:
+                    del self.pending[name]
+                    path = os.path.join(self.directory, name)
+                    if os.path.exists(path):
+                        self.queue.put(path)
+
+
+class PollingWatcher(threading.Thread):
+    """Fallback watcher: lists the folder and waits for sizes to settle."""
+
+    def __init__(self, directory: str, out_queue, interval: float = POLL_INTERVAL):
+        super().__init__(daemon=True, name="polling-watcher")
+        self.directory = directory
+        self.queue = out_queue
+        self.interval = interval
+        self.seen = {}  # name → (size, mtime) when last listed
+        self.reported = {}  # name → (size, mtime) already queued
+
+    def run(self):
+        while True:
+            current = {
+                name: (st.st_size, st.st_mtime_ns)
+                for name, st in _list_pdfs(self.directory).items()
+            }
+            for name, sig in sorted(current.items()):
+                if self.seen.get(name) == sig and self.reported.get(name) != sig:
+                    self.reported[name] = sig
+                    self.queue.put(os.path.join(self.directory, name))
+            self.reported = {n: s for n, s in self.reported.items() if n in current}
+            self.seen = current
+            time.sleep(self.interval)
+
+
+def start_watcher(directory: str, out_queue, poll: bool = False):
+    """Start the best available watcher feeding `out_queue`; return it."""
+    watcher = None
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            watcher = InotifyWatcher(directory, out_queue)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️ inotify unavailable ({e}), falling back to polling")
+    if watcher is None:
+        watcher = PollingWatcher(directory, out_queue)
+    watcher.start()
+    return watcher
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""Crash-safe job journal: where every document is in the pipeline.
+
+A job is created when a PDF starts processing and moves through
+
+    queued → detected → extracted → renamed
+                                  ↘ failed   (retries exhausted / unsupported)
+
+Each transition is one committed UPDATE guarded by the expected current
+state, and stores what the next stage needs (the filed path, the parsed
+header/footer, the extracted fields), so a restarted watcher or batch picks
+a document up at its last completed stage instead of losing it (originals
+are moved out of incoming/ at detection) or redoing OCR.
+
+A stage that raises leaves the job in its state with attempts + 1 and a
+retry time BACKOFF_SECONDS · 2^(attempts-1) later; after MAX_ATTEMPTS it is
+failed. Running jobs hold a lease (owner pid + expiry) so two processes
+never run the same job; leases of dead local processes are released by
+recover() at start-up, which also re-records renamed documents whose store
+row was still buffered when their process stopped.
+
+    python3 journal.py list [--state failed]
+    python3 journal.py retry JOB_ID       # failed → back to its last stage
+"""
+import os, sys, json, time, sqlite3, argparse, threading
+
+import store
+
+MAX_ATTEMPTS = int(os.environ.get("INVOICEBRAIN_MAX_ATTEMPTS", "5"))
+BACKOFF_SECONDS = float(os.environ.get("INVOICEBRAIN_RETRY_BACKOFF", "30"))
+LEASE_SECONDS = 900  # longer than any single document takes
+
+STATES = ("queued", "detected", "extracted", "renamed", "failed")
+DONE = ("renamed", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            INTEGER PRIMARY KEY,
+    digest        TEXT NOT NULL,
+    source        TEXT NOT NULL,
+    path          TEXT NOT NULL,
+    state         TEXT NOT NULL,
+    resume_state  TEXT,
+    doc_type      TEXT,
+    context       TEXT,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    next_attempt  REAL NOT NULL DEFAULT 0,
+    owner         INTEGER,
+    lease_until   REAL NOT NULL DEFAULT 0,
+    error         TEXT,
+    created_at    TEXT NOT NULL,
+    updated_at    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_open ON jobs (state, next_attempt)
+    WHERE state NOT IN ('renamed', 'failed');
+CREATE INDEX IF NOT EXISTS jobs_digest ON jobs (digest);
+"""
+
+_lock = threading.Lock()
+
+
+class StaleJob(RuntimeError):
+    """The job is not in the expected state (another process moved it)."""
+
+
+def _setup(conn: sqlite3.Connection):
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+
+
+def connect() -> sqlite3.Connection:
+    """This process's journal connection (same database as the result store).
+
+    Separate from store.connect(): journal writes commit immediately, store
+    writes are batched.
+    """
+    # synchronous=FULL: a transition survives power loss
+    return store.connection("journal", _setup, synchronous="FULL")
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _write(sql: str, params) -> int:
+    with _lock:
+        conn = connect()
+        with conn:
+            return conn.execute(sql, params).rowcount
+
+
+def get(job_id: int) -> dict:
+    row = connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        raise KeyError(job_id)
+    job = dict(row)
+    job["context"] = json.loads(job["context"] or "{}")
+    return job
+
+
+def start(pdf_path: str, digest: str) -> dict:
+    """Open (or re-open, for a file seen before) the job of an incoming PDF, leased.
+
+    Returns None when the job of this file is running in another process.
+    """
+    source = os.path.abspath(pdf_path)
+    with _lock:
+        conn = connect()
+        with conn:
+            # Lookup and insert in one write transaction: a watcher and a batch
+            # seeing the same file never open two jobs for it
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE digest = ? AND source = ? AND state = 'queued'",
+                (digest, source),
+            ).fetchone()
+            if row is None:
+                job_id = conn.execute(
+                    "INSERT INTO jobs (digest, source, path, state, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'queued', ?, ?)",
+                    (digest, source, pdf_path, _now(), _now()),
+                ).lastrowid
+            else:
+                job_id = row["id"]
+    if not claim(job_id):
+        return None
+    return get(job_id)
+
+
+def claim(job_id: int) -> bool:
+    """Take the lease of an unfinished job; False if someone else holds it."""
+    return _write(
+        "UPDATE jobs SET owner = ?, lease_until = ?, updated_at = ? "
+        "WHERE id = ? AND state NOT IN ('renamed', 'failed') "
+        "AND (lease_until < ? OR owner = ?)",
+        (os.getpid(), time.time() + LEASE_SECONDS, _now(), job_id, time.time(), os.getpid()),
+    ) == 1
+
+
+def advance(job: dict, state: str, **changes):
+    """Move `job` from its current state to `state`, storing `changes`.
+
+    `changes` may set path, doc_type and context (merged into the stored
+    context). Raises StaleJob when the job is no longer in the state read.
+    """
+    assert state in STATES
+    context = dict(job["context"], **changes.pop("context", {}))
+    path = changes.pop("path", job["path"])
+    doc_type = changes.pop("doc_type", job["doc_type"])
+    done = state in DONE
+    count = _write(
+        "UPDATE jobs SET state = ?, path = ?, doc_type = ?, context = ?, error = NULL, "
+        "owner = ?, lease_until = ?, updated_at = ? WHERE id = ? AND state = ?",
+        (state, path, doc_type, json.dumps(context, ensure_ascii=False),
+         None if done else os.getpid(), 0 if done else time.time() + LEASE_SECONDS,
+         _now(), job["id"], job["state"]),
+    )
+    if count != 1:
+        raise StaleJob(f"job {job['id']} is no longer {job['state']}")
+    job.update(state=state, path=path, doc_type=doc_type, context=context)
+
+
+def note(job: dict, **changes):
+    """Store doc_type/context on `job` without changing its state."""
+    context = dict(job["context"], **changes.pop("context", {}))
+    doc_type = changes.pop("doc_type", job["doc_type"])
+    count = _write(
+        "UPDATE jobs SET doc_type = ?, context = ?, updated_at = ? WHERE id = ? AND state = ?",
+        (doc_type, json.dumps(context, ensure_ascii=False), _now(), job["id"], job["state"]),
+    )
+    if count != 1:
+        raise StaleJob(f"job {job['id']} is no longer {job['state']}")
+    job.update(doc_type=doc_type, context=context)
+
+
+def fail(job: dict, error, retry: bool = True):
+    """Record a stage failure: retry later with backoff, or give up."""
+    attempts = job["attempts"] + 1
+    if retry and attempts < MAX_ATTEMPTS:
+        delay = BACKOFF_SECONDS * 2 ** (attempts - 1)
+        _write(
+            "UPDATE jobs SET attempts = ?, next_attempt = ?, error = ?, owner = NULL, "
+            "lease_until = 0, updated_at = ? WHERE id = ?",
+            (attempts, time.time() + delay, str(error), _now(), job["id"]),
+        )
+        print(f"🔁 Job {job['id']} ({job['state']}) failed, retry {attempts}/{MAX_ATTEMPTS - 1} in {delay:.0f} s: {error}")
+    else:
+        _write(
+            "UPDATE jobs SET state = 'failed', resume_state = state, attempts = ?, error = ?, "
+            "owner = NULL, lease_until = 0, updated_at = ? WHERE id = ?",
+            (attempts, str(error), _now(), job["id"]),
+        )
+        print(f"❌ Job {job['id']} failed for good: {error}")
+
+
+def due(limit: int = 100):
+    """IDs of unfinished jobs whose retry time has come and that nobody runs."""
+    now = time.time()
+    return [r["id"] for r in connect().execute(
+        "SELECT id FROM jobs WHERE state NOT IN ('renamed', 'failed') "
+        "AND next_attempt <= ? AND lease_until < ? ORDER BY id LIMIT ?",
+        (now, now, -1 if limit is None else limit),
+    )]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def unrecorded() -> list:
+    """Renamed jobs without a row in the result store.
+
+    store.record() buffers rows for up to store.BATCH_SECONDS while the
+    renamed transition commits at once: a process that dies in between
+    loses the row, and the result cache keeps re-sends from recording it.
+    """
+    store.connect()  # the documents table exists from here on
+    rows = connect().execute(
+        "SELECT * FROM jobs WHERE state = 'renamed' "
+        "AND NOT EXISTS (SELECT 1 FROM documents WHERE documents.digest = jobs.digest) ORDER BY id"
+    ).fetchall()
+    jobs = [dict(row) for row in rows]
+    for job in jobs:
+        job["context"] = json.loads(job["context"] or "{}")
+    return jobs
+
+
+def rerecord() -> int:
+    """Write the store rows of unrecorded() jobs from their journal context; returns the count."""
+    jobs = [job for job in unrecorded() if job["context"].get("fields")]
+    for job in jobs:
+        store.record(job["digest"], {"path": job["path"], "type": job["doc_type"],
+                                     "fields": job["context"]["fields"],
+                                     "source": job["context"].get("source")})
+    store.flush()
+    return len(jobs)
+
+
+def recover() -> int:
+    """Release leases held by processes that no longer exist; returns the count.
+
+    Store rows lost by a stopped process are written again (rerecord()).
+    """
+    restored = rerecord()
+    if restored:
+        print(f"🗄️ Re-recorded {restored} documents lost by a stopped process")
+    released = 0
+    for row in connect().execute(
+        "SELECT id, owner FROM jobs WHERE state NOT IN ('renamed', 'failed') AND lease_until > ?",
+        (time.time(),),
+    ).fetchall():
+        if row["owner"] is None or not _alive(row["owner"]):
+            released += _write(
+                "UPDATE jobs SET owner = NULL, lease_until = 0 WHERE id = ? AND owner IS ?",
+                (row["id"], row["owner"]),
+            )
+    return released
+
+
+def retry(job_id: int) -> bool:
+    """Put a failed job back at the stage it failed in, with fresh attempts."""
+    return _write(
+        "UPDATE jobs SET state = COALESCE(resume_state, 'queued'), resume_state = NULL, "
+        "attempts = 0, next_attempt = 0, updated_at = ? WHERE id = ? AND state = 'failed'",
+        (_now(), job_id),
+    ) == 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the pipeline job journal.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    ls = sub.add_parser("list", help="jobs as JSON lines (default: unfinished)")
+    ls.add_argument("--state", choices=STATES)
+    r = sub.add_parser("retry", help="re-open a failed job")
+    r.add_argument("job_id", type=int)
+    args = parser.parse_args()
+
+    if args.cmd == "list":
+        if args.state:
+            rows = connect().execute("SELECT * FROM jobs WHERE state = ? ORDER BY id", (args.state,))
+        else:
+            rows = connect().execute(
+                "SELECT * FROM jobs WHERE state NOT IN ('renamed', 'failed') ORDER BY id"
+            )
+        for row in rows:
+            print(json.dumps({k: row[k] for k in row.keys() if k != "context"}, ensure_ascii=False))
+    elif retry(args.job_id):
+        print(f"🔁 Job {args.job_id} will be resumed by the next watcher / batch run")
+    else:
+        print(f"⚠️ Job {args.job_id} is not failed")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Allocation of normalized file names (PO-YYYYMMDD-DAC…[-N]).
+
+Picking a free name used to probe the PDF, CSV and processed copy of every
+candidate suffix: 3N stat calls for the Nth duplicate, racy between
+workers. The taken stems now live in an indexed SQLite table (same database
+as the result store), filled from the folders once and updated on every
+allocation. A write transaction hands out the next suffix, so concurrent
+workers never get the same stem, and the same document (content hash)
+always gets its stem back when a rename is retried. The folders are read
+again whenever a rename finds its target taken by a file the index did not
+know (added by hand); after files were removed by hand, run `reload`
+(with no pipeline running) so their stems can be handed out again.
+
+move_all() performs the PDF / CSV / processed renames of one document as a
+unit: each target is checked before the move, a failure moves back what
+was already moved (and frees the stem), and a move already done by an
+interrupted attempt is skipped.
+
+    python3 names.py reload     # rebuild the index from the folders
+"""
+import os, re, sys, time, sqlite3, threading
+
+import store
+
+# Folders whose file names share the normalized namespace
+FOLDERS = [os.path.join("data", "PO_detected"), os.path.join("data", "RO_detected"),
+           os.path.join("data", "processed")]
+
+# "<TYPE>-<date>-<number>" optionally followed by "-<suffix>"
+_STEM = re.compile(r"^([A-Z]+-\d{8}-[^-]+?)(?:-(\d+))?$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS names (
+    stem          TEXT PRIMARY KEY,
+    base          TEXT NOT NULL,
+    suffix        INTEGER NOT NULL,
+    digest        TEXT,
+    allocated_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS names_base ON names (base, suffix);
+CREATE INDEX IF NOT EXISTS names_digest ON names (base, digest);
+CREATE TABLE IF NOT EXISTS names_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+_lock = threading.Lock()
+
+
+def _setup(conn: sqlite3.Connection):
+    conn.executescript(SCHEMA)
+    if conn.execute("SELECT 1 FROM names_meta WHERE key = 'loaded'").fetchone() is None:
+        load(conn)
+
+
+def connect() -> sqlite3.Connection:
+    """This process's connection; the index is loaded from disk on first use."""
+    # isolation_level=None: transactions are explicit (BEGIN IMMEDIATE)
+    return store.connection("names", _setup, isolation_level=None, synchronous="FULL")
+
+
+def split(stem: str):
+    """'PO-20240131-DAC123-3' → ('PO-20240131-DAC123', 3); None if not normalized."""
+    m = _STEM.match(stem)
+    if not m:
+        return None
+    return m.group(1), int(m.group(2) or 1)
+
+
+def load(conn: sqlite3.Connection = None, prune: bool = False) -> int:
+    """(Re)fill the index from the file names in FOLDERS; returns the stem count.
+
+    With `prune`, stems without a file are dropped too: only while no
+    pipeline runs, as stems being renamed have no file yet.
+    """
+    conn = conn or connect()
+    stems = set()
+    for folder in FOLDERS:
+        if os.path.isdir(folder):
+            stems.update(os.path.splitext(e.name)[0] for e in os.scandir(folder))
+    rows = [(s, *split(s)) for s in stems if split(s)]
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with _lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR IGNORE INTO names (stem, base, suffix, allocated_at) VALUES (?, ?, ?, ?)",
+                [(s, base, suffix, now) for s, base, suffix in rows],
+            )
+            if prune:
+                gone = {s for (s,) in conn.execute("SELECT stem FROM names")} - stems
+                conn.executemany("DELETE FROM names WHERE stem = ?", [(s,) for s in gone])
+            conn.execute("INSERT OR REPLACE INTO names_meta VALUES ('loaded', ?)", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return len(rows)
+
+
+def allocate(base: str, digest: str = None) -> str:
+    """Reserve the first free stem for `base` (base, base-2, base-3, ...).
+
+    The same `digest` gets the stem it was given before.
+    """
+    conn = connect()
+    with _lock:
+        conn.execute("BEGIN IMMEDIATE")  # one allocator at a time, across processes
+        try:
+            row = None
+            if digest:
+                row = conn.execute(
+                    "SELECT stem FROM names WHERE base = ? AND digest = ?", (base, digest)
+                ).fetchone()
+            if row:
+                stem = row[0]
+            else:
+                # First gap in the taken suffixes (index names_base): a
+                # released stem is handed out again
+                suffix = 1
+                for (taken,) in conn.execute(
+                    "SELECT suffix FROM names WHERE base = ? ORDER BY suffix", (base,)
+                ):
+                    if taken > suffix:
+                        break
+                    suffix = max(suffix, taken + 1)
+                stem = base if suffix == 1 else f"{base}-{suffix}"
+                conn.execute(
+                    "INSERT INTO names (stem, base, suffix, digest, allocated_at) VALUES (?, ?, ?, ?, ?)",
+                    (stem, base, suffix, digest, time.strftime("%Y-%m-%dT%H:%M:%S")),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return stem
+
+
+def reserve(stem: str, digest: str = None):
+    """Mark an existing normalized stem (found on disk) as taken."""
+    parts = split(stem)
+    if parts:
+        conn = connect()  # before the lock: a first connect() loads the index under it
+        with _lock:
+            conn.execute(
+                "INSERT OR IGNORE INTO names (stem, base, suffix, digest, allocated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (stem, *parts, digest, time.strftime("%Y-%m-%dT%H:%M:%S")),
+            )
+
+
+def disown(stem: str):
+    """Keep `stem` taken but no longer tied to the document that asked for it."""
+    conn = connect()
+    with _lock:
+        conn.execute("UPDATE names SET digest = NULL WHERE stem = ?", (stem,))
+
+
+def release(stem: str):
+    """Give back a stem whose renames were rolled back."""
+    conn = connect()
+    with _lock:
+        conn.execute("DELETE FROM names WHERE stem = ?", (stem,))
+
+
+def move_all(moves):
+    """Rename every (src, dst) pair, or none of them.
+
+    Pairs whose src is gone and dst exists were done by an earlier,
+    interrupted attempt and are skipped. Raises FileExistsError (after
+    undoing the moves made so far) when a dst is taken by another file.
+    """
+    done = []
+    try:
+        for src, dst in moves:
+            if not os.path.lexists(src) and os.path.lexists(dst):
+                continue
+            if os.path.lexists(dst):
+                raise FileExistsError(f"{dst} already exists")
+            os.rename(src, dst)
+            done.append((src, dst))
+    except BaseException:
+        for src, dst in reversed(done):
+            try:
+                os.rename(dst, src)
+            except OSError as e:
+                print(f"⚠️ Could not undo rename {src} → {dst}: {e}")
+        raise
+    return done
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["reload"]:
+        print(__doc__.strip().splitlines()[-1].strip())
+        sys.exit(1)
+    print(f"📇 {load(prune=True)} normalized names indexed")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""In-process pipeline: detect → extract → rename for one PDF.
+
+Replaces the watch_incoming → detect_type.py → process_doc.py → crop-script
+subprocess chain. Everything runs in the calling interpreter, so cv2, numpy
+and pytesseract are imported once and page rasters stay in memory.
+
+Digitally generated PDFs skip rasterization and OCR altogether when their
+text layer yields the title, date, DAC number and totals inside the same
+ROIs the OCR scripts crop.
+"""
+import os, sys, json, shutil
+from contextlib import contextmanager
+
+import journal, result_cache
+from extractors import debug_dump, page_cache, telemetry, text_layer
+from extractors.header import PO_Header_Crop, RO_Header_Crop
+from extractors.footer import PO_Total_Crop, RO_Total_Crop
+from extractors.words import reread, text_in
+from extractors.ocr_profiles import ocr_args
+from extractors.adaptive import DPI_LEVELS, header_ok
+from detect_type import (PROCESSED, TITLE_BOX, classify_text, classify_words,
+                         file_document, filed_name, read_top)
+from process_doc import extract_fields, finish_document
+
+# doc type → (header module, footer module, DAC field of the parsed header)
+STAGES = {
+    "PO": (PO_Header_Crop, PO_Total_Crop, "po_reference"),
+    "RO": (RO_Header_Crop, RO_Total_Crop, "reception_number"),
+}
+
+# Byte-identical re-sends are parked here instead of being reprocessed
+DUPLICATES_DIR = os.path.join("data", "duplicates")
+
+
+def native_fields(pdf_path: str):
+    """(doc_type, header, footer) from the text layer, or None if OCR is needed."""
+    try:
+        size = text_layer.page_size(pdf_path, 1)
+        doc = classify_text(text_layer.region_text(pdf_path, 1, TITLE_BOX, size))
+        if doc not in STAGES:
+            return None
+        header_mod, footer_mod, dac_field = STAGES[doc]
+
+        header = header_mod.parse_header(
+            text_layer.region_text(pdf_path, 1, header_mod.HEADER_BOX, size).upper()
+        )
+        if not (header.get("date") and header.get(dac_field)):
+            return None
+
+        last = page_cache.page_count(pdf_path)
+        if last != 1:
+            size = text_layer.page_size(pdf_path, last)
+        footer = footer_mod.parse_footer(
+            text_layer.region_text(pdf_path, last, footer_mod.FOOTER_BOX, size)
+        )
+        if footer.get("total_ttc") is None or footer.get("total_ht") is None:
+            return None
+    except Exception as e:
+        print(f"⚠️ Text layer unusable, falling back to OCR: {e}")
+        return None
+    return doc, header, footer
+
+
+def header_from_words(doc: str, words, img, dpi: int):
+    """Header fields from the shared top-of-page OCR pass, or None if incomplete.
+
+    When the date or DAC number does not parse, only that line is re-read
+    from `img` (rendered at `dpi`) with the field's OCR profile (digit
+    whitelist, single line).
+    """
+    header_mod, _, dac_field = STAGES[doc]
+    text = text_in(words, header_mod.HEADER_BOX).upper()
+    header = header_mod.parse_header(text)
+    if header_ok(header, dac_field):
+        return header
+
+    # Each re-read is parsed alone and only fills the fields it is for: in
+    # the joined text, digit fallbacks (PO supplier code) would pick it up
+    fixes = {}
+    if not header.get(dac_field):
+        line = reread(img, words, r"DAC", dpi=dpi, **ocr_args(doc, "dac"))
+        fixes[dac_field] = header_mod.parse_header(line.upper()).get(dac_field)
+    if not header.get("date"):
+        # The date token alone: the digit whitelist would turn a label into digits
+        line = reread(img, words, r"\d{2}[/.]\d{2}", alone=True, dpi=dpi,
+                      **ocr_args(doc, "date"))
+        parsed = header_mod.parse_header(line.upper())
+        fixes.update(date=parsed.get("date"), date_norm=parsed.get("date_norm"))
+    fixes = {k: v for k, v in fixes.items() if v}
+    if fixes:
+        header.update(fixes)
+        if header_ok(header, dac_field):
+            return header
+    return None
+
+
+def _park_duplicate(pdf_path: str, digest: str, cached: dict) -> dict:
+    os.makedirs(DUPLICATES_DIR, exist_ok=True)
+    dest = os.path.join(DUPLICATES_DIR, f"{digest[:12]}-{os.path.basename(pdf_path)}")
+    shutil.move(pdf_path, dest)
+    print(f"♻️ Already processed as {cached['path']}, moved duplicate → {dest}")
+    return {"path": cached["path"], "type": cached["type"], "fields": cached["fields"],
+            "source": "cache", "duplicate": dest}
+
+
+def _classify(pdf_path: str):
+    """(doc_type, extraction context) from the text layer or the shared top pass."""
+    native = native_fields(pdf_path)
+    if native:
+        doc, header, footer = native
+        print(f"⚡ Text layer found, skipping OCR ({doc})")
+        return doc, {"header": header, "footer": footer, "source": "text"}
+
+    # Shared top pass, re-rendered at a higher DPI only while the
+    # type or the header fields are not readable
+    for dpi in DPI_LEVELS:
+        words, img = read_top(pdf_path, dpi)
+        doc = classify_words(words)
+        header = header_from_words(doc, words, img, dpi) if doc in STAGES else None
+        if header:
+            break
+    # Without a header here, the header script OCRs its own ROI
+    return doc, {"header": header, "header_dpi": dpi if header else None, "source": "ocr"}
+
+
+def _detect(job: dict) -> bool:
+    """queued → detected: classify and file the original. False if the job ended."""
+    if job["state"] != "queued":
+        return True
+    # The filed name is journaled before the original leaves incoming/,
+    # so an interrupted move is finished instead of losing the file.
+    if "filed_as" not in job["context"]:
+        if not os.path.exists(job["path"]):
+            journal.fail(job, f"{job['path']} disappeared before detection", retry=False)
+            return False
+        doc, context = _classify(job["path"])
+        journal.note(job, doc_type=doc, context=dict(context, filed_as=filed_name(doc)))
+    elif not (os.path.exists(job["path"])
+              or os.path.exists(os.path.join(PROCESSED, job["context"]["filed_as"]))):
+        # Removed between the filing and the journaled move: no retry brings it back
+        journal.fail(job, f"{job['path']} disappeared before filing", retry=False)
+        return False
+    meta = file_document(job["path"], job["doc_type"], job["context"]["filed_as"])
+    journal.advance(job, "detected", path=meta["path"])
+    return True
+
+
+def _extract(job: dict, header=None, header_dpi=None, footer=None, footer_dpi=None) -> bool:
+    """detected → extracted. Header/footer read elsewhere may be passed in."""
+    if job["state"] != "detected":
+        return True
+    ctx = job["context"]
+    meta = {"path": job["path"], "type": job["doc_type"]}
+    if ctx.get("header"):
+        header, header_dpi = ctx["header"], ctx.get("header_dpi")
+    if ctx.get("footer"):
+        footer = ctx["footer"]
+    output = extract_fields(meta, header, footer, header_dpi, footer_dpi)
+    if output is None:
+        journal.fail(job, f"unsupported document type {job['doc_type']}", retry=False)
+        return False
+    page_cache.release_digest(job["digest"])
+    journal.advance(job, "extracted", context={"fields": output})
+    return True
+
+
+def _finish(job: dict) -> bool:
+    """extracted → renamed."""
+    if job["state"] != "extracted":
+        return True
+    ctx = job["context"]
+    # Renames of an interrupted attempt are completed, not redone
+    result = finish_document(job["path"], job["doc_type"], ctx["fields"],
+                             job["digest"], ctx.get("source"))
+    journal.advance(job, "renamed", path=result["path"])
+    return True
+
+
+STEPS = (_detect, _extract, _finish)
+
+
+@contextmanager
+def _job_scope(job: dict, debug: bool = None):
+    """Debug artifacts, failure journaling and raster cleanup around a job's stages."""
+    digest = job["digest"]
+    try:
+        stem = os.path.splitext(os.path.basename(job["source"]))[0]
+        with debug_dump.document(f"{stem}-{digest[:8]}", enabled=debug):
+            yield
+    except journal.StaleJob:
+        raise  # another process owns the job now: leave its journal entry alone
+    except Exception as e:
+        journal.fail(job, e)
+        raise
+    finally:
+        page_cache.release_digest(digest)
+
+
+def _done(job: dict) -> dict:
+    """Result of a job whose stages are over; cached when fields were extracted."""
+    ctx = job["context"]
+    result = {"path": job["path"], "type": job["doc_type"], "fields": ctx.get("fields"),
+              "source": ctx.get("source")}
+    fields = result["fields"] or {}
+    telemetry.annotate(type=result["type"], source=result["source"], job=job["id"],
+                       header_dpi=fields.get("header_dpi"), footer_dpi=fields.get("footer_dpi"))
+    if result["fields"]:
+        result_cache.put(job["digest"], result)
+    return result
+
+
+def _execute(job: dict, debug: bool = None) -> dict:
+    """Run `job` from its journal state to the end, one committed transition per stage."""
+    with _job_scope(job, debug):
+        for step in STEPS:
+            if not step(job):
+                break
+    return _done(job)
+
+
+def _open(pdf_path: str, force: bool = False):
+    """(job, None) for a new PDF; (None, result) when it needs no processing.
+
+    The result is the cached one for a duplicate, None when another process
+    already runs this file.
+    """
+    with telemetry.span("hash"):
+        digest = page_cache.file_hash(pdf_path)
+    if not force:
+        cached = result_cache.get(digest)
+        if cached:
+            telemetry.annotate(type=cached["type"], source="cache")
+            return None, _park_duplicate(pdf_path, digest, cached)
+
+    job = journal.start(pdf_path, digest)
+    if job is None:
+        print(f"⏭️ {pdf_path} is already being processed by another worker")
+    return job, None
+
+
+def process(pdf_path: str, force: bool = False, debug: bool = None) -> dict:
+    """Run the whole pipeline on `pdf_path` and return path, type and fields.
+
+    A document whose bytes were already processed is answered from the
+    result cache unless `force` is set. Progress is journaled per stage
+    (journal.py), so an interrupted run is continued by resume(); None is
+    returned when another process is already running this file. Stage
+    spans go to the telemetry log. `debug` forces debug artifacts on/off
+    for this document (default: INVOICEBRAIN_DEBUG sampling).
+    """
+    with telemetry.document(pdf_path):
+        job, result = _open(pdf_path, force)
+        if job is None:
+            return result
+        return _execute(job, debug)
+
+
+def resume(job_id: int, debug: bool = None):
+    """Continue an unfinished journal job from its last completed stage.
+
+    Returns None when another process holds the job.
+    """
+    if not journal.claim(job_id):
+        return None
+    job = journal.get(job_id)
+    print(f"♻️ Resuming job {job_id} ({job['state']}): {job['path']}")
+    with telemetry.document(job["path"]):
+        telemetry.annotate(resumed_from=job["state"])
+        return _execute(job, debug)
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a not in ("--force", "--debug")]
+    if not args:
+        print("❌ No PDF path provided")
+        sys.exit(1)
+
+    pdf = args[0]
+    if not os.path.exists(pdf):
+        print(f"❌ PDF not found: {pdf}")
+        sys.exit(1)
+
+    print(json.dumps(process(pdf, force="--force" in sys.argv, debug=True if "--debug" in sys.argv else None), ensure_ascii=False))
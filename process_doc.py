@@ -1,155 +1,191 @@
 #!/usr/bin/env python3
 import json, sys, os
 
+import names, store
+from extractors import page_cache
+from extractors.telemetry import span
+
 PROCESSED_DIR = os.path.join("data", "processed")
 
+# Field that identifies each document type in its normalized name
+NUMBER_FIELD = {"PO": "order_number", "RO": "reception_number"}
+
+
+def choose_target_stem(base_stem: str, old_stem: str, digest: str = None):
+    """Return target stem and whether a rename is required.
 
-def choose_target_stem(base_stem: str, old_stem: str, base_dir: str):
-    """Return target stem and whether a rename is required."""
+    Free stems come from the name index (names.py), not from probing the
+    folders; `digest` gets a document the stem it was given before.
+    """
     def already_normalized(stem: str) -> bool:
         return stem == base_stem or stem.startswith(f"{base_stem}-")
 
     if already_normalized(old_stem):
+        names.reserve(old_stem, digest)
         return old_stem, False
 
-    suffix = 1
-    while True:
-        suffix_part = "" if suffix == 1 else f"-{suffix}"
-        candidate_stem = f"{base_stem}{suffix_part}"
-        candidate_pdf = os.path.join(base_dir, f"{candidate_stem}.pdf")
-        candidate_csv = os.path.join(base_dir, f"{candidate_stem}.csv")
-        candidate_processed = os.path.join(PROCESSED_DIR, f"{candidate_stem}.pdf")
-
-        if not (
-            os.path.exists(candidate_pdf)
-            or os.path.exists(candidate_csv)
-            or os.path.exists(candidate_processed)
-        ):
-            return candidate_stem, True
-
-        suffix += 1
-
-# === Input from detect_type.py ===
-if len(sys.argv) < 2:
-    print("❌ No JSON input provided")
-    sys.exit(1)
-
-meta = json.loads(sys.argv[1])
-pdf_path = meta.get("path")
-doc_type = meta.get("type")
-
-if not pdf_path or not os.path.exists(pdf_path):
-    print(f"❌ PDF not found: {pdf_path}")
-    sys.exit(1)
-
-print(f"📄 Processing: {pdf_path} ({doc_type})")
-
-# === Run extraction according to type ===
-if doc_type == "PO":
-    from extractors.PO_final_extractor import extract_PO_data
-    output = extract_PO_data(pdf_path)
-elif doc_type == "RO":
-    from extractors.RO_final_extractor import extract_RO_data
-    output = extract_RO_data(pdf_path)
-else:
-    print(f"⚠️ Unknown document type: {doc_type}")
-    sys.exit(1)
-
-# === Save CSV (already handled inside your extractors) ===
-print(json.dumps(output, ensure_ascii=False, indent=2))
-
-# === Rename after extraction ===
-date_norm = output.get("date_norm")
-order_number = output.get("order_number")
-
-reception_number = output.get("reception_number")
-
-if doc_type == "PO" and date_norm and order_number:
-    base_dir = os.path.dirname(pdf_path)
-    old_name = os.path.basename(pdf_path)
-    old_stem = os.path.splitext(old_name)[0]
-    base_stem = f"{doc_type}-{date_norm}-{order_number}"
-    target_stem, needs_rename = choose_target_stem(base_stem, old_stem, base_dir)
-    target_name = f"{target_stem}.pdf"
-
-    if needs_rename:
-        target_path = os.path.join(base_dir, target_name)
-        os.rename(pdf_path, target_path)
-        print(f"✅ Renamed extraction copy → {target_name}")
-        pdf_path = target_path
+    return names.allocate(base_stem, digest), True
 
-        csv_old = os.path.join(base_dir, f"{old_stem}.csv")
-        csv_new = os.path.join(base_dir, f"{target_stem}.csv")
 
-        if os.path.exists(csv_old):
-            if not os.path.exists(csv_new):
-                os.rename(csv_old, csv_new)
-                print(f"✅ Renamed CSV → {os.path.basename(csv_new)}")
-            else:
-                print(f"⚠️ CSV with name {os.path.basename(csv_new)} already exists. Skipping rename.")
-        elif not os.path.exists(csv_new):
-            print("⚠️ Could not rename CSV: original file not found.")
-    else:
-        print(f"ℹ️ Extraction copy already normalized as {target_name}.")
-
-    processed_old = os.path.join(PROCESSED_DIR, old_name)
-    processed_new = os.path.join(PROCESSED_DIR, f"{target_stem}.pdf")
-
-    if processed_old != processed_new:
-        if os.path.exists(processed_old):
-            if not os.path.exists(processed_new):
-                os.rename(processed_old, processed_new)
-                print(f"✅ Renamed processed copy → {os.path.basename(processed_new)}")
-            else:
-                print(f"⚠️ Processed copy with name {os.path.basename(processed_new)} already exists. Skipping rename.")
-        elif not os.path.exists(processed_new):
-            print("⚠️ Could not rename processed copy: original file not found.")
-elif doc_type == "RO" and date_norm and reception_number:
+def rename_outputs(pdf_path: str, doc_type: str, output: dict, digest: str = None) -> str:
+    """Rename the extraction copy, its CSV and the processed original; return the new PDF path.
+
+    The renames happen together or not at all (names.move_all); a target
+    taken by a file the index did not know about gets the next stem.
+    """
+    date_norm = output.get("date_norm")
+    number_field = NUMBER_FIELD.get(doc_type)
+    number = output.get(number_field) if number_field else None
+
+    if not (date_norm and number):
+        if number_field:
+            print(f"⚠️ Could not rename: missing date_norm or {number_field}.")
+        else:
+            print("⚠️ Skipping rename for unsupported document type.")
+        return pdf_path
+
     base_dir = os.path.dirname(pdf_path)
-    old_name = os.path.basename(pdf_path)
-    old_stem = os.path.splitext(old_name)[0]
-    base_stem = f"{doc_type}-{date_norm}-{reception_number}"
-    target_stem, needs_rename = choose_target_stem(base_stem, old_stem, base_dir)
-    target_name = f"{target_stem}.pdf"
-
-    if needs_rename:
-        target_path = os.path.join(base_dir, target_name)
-        os.rename(pdf_path, target_path)
-        print(f"✅ Renamed extraction copy → {target_name}")
-        pdf_path = target_path
+    old_stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    base_stem = f"{doc_type}-{date_norm}-{number}"
 
+    while True:
+        target_stem, needs_rename = choose_target_stem(base_stem, old_stem, digest)
+        if not needs_rename:
+            print(f"ℹ️ Extraction copy already normalized as {target_stem}.pdf.")
+            return pdf_path
+
+        moves = [(pdf_path, os.path.join(base_dir, f"{target_stem}.pdf"))]
         csv_old = os.path.join(base_dir, f"{old_stem}.csv")
         csv_new = os.path.join(base_dir, f"{target_stem}.csv")
-
-        if os.path.exists(csv_old):
-            if not os.path.exists(csv_new):
-                os.rename(csv_old, csv_new)
-                print(f"✅ Renamed CSV → {os.path.basename(csv_new)}")
-            else:
-                print(f"⚠️ CSV with name {os.path.basename(csv_new)} already exists. Skipping rename.")
-        elif not os.path.exists(csv_new):
+        if os.path.exists(csv_old) or os.path.exists(csv_new):
+            moves.append((csv_old, csv_new))
+        elif store.WRITE_CSV:
             print("⚠️ Could not rename CSV: original file not found.")
-    else:
-        print(f"ℹ️ Extraction copy already normalized as {target_name}.")
-
-    processed_old = os.path.join(PROCESSED_DIR, old_name)
-    processed_new = os.path.join(PROCESSED_DIR, f"{target_stem}.pdf")
-
-    if processed_old != processed_new:
-        if os.path.exists(processed_old):
-            if not os.path.exists(processed_new):
-                os.rename(processed_old, processed_new)
-                print(f"✅ Renamed processed copy → {os.path.basename(processed_new)}")
-            else:
-                print(f"⚠️ Processed copy with name {os.path.basename(processed_new)} already exists. Skipping rename.")
-        elif not os.path.exists(processed_new):
+        processed_old = os.path.join(PROCESSED_DIR, f"{old_stem}.pdf")
+        processed_new = os.path.join(PROCESSED_DIR, f"{target_stem}.pdf")
+        if os.path.exists(processed_old) or os.path.exists(processed_new):
+            moves.append((processed_old, processed_new))
+        else:
             print("⚠️ Could not rename processed copy: original file not found.")
-else:
+
+        try:
+            names.move_all(moves)
+        except FileExistsError as e:
+            # Taken by a file the index did not know: leave the stem to it,
+            # and re-read the folders for any other file added by hand
+            print(f"⚠️ {e}, allocating another name")
+            names.disown(target_stem)
+            names.load()
+            continue
+        except BaseException:
+            names.release(target_stem)
+            raise
+
+        for _, dst in moves:
+            print(f"✅ Renamed → {os.path.relpath(dst)}")
+        _repoint(moves[0][1], processed_new)
+        return moves[0][1]
+
+
+def _repoint(link_path: str, target: str):
+    """Keep a symlinked extraction copy (INVOICEBRAIN_FILE_MODE=symlink) on its renamed original."""
+    if not os.path.islink(link_path):
+        return
+    rel = os.path.relpath(target, os.path.dirname(link_path))
+    if os.readlink(link_path) != rel:
+        tmp = f"{link_path}.part"
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        os.symlink(rel, tmp)
+        os.replace(tmp, link_path)
+
+
+def extractor(doc_type: str):
+    """(ocr_header, ocr_footer, extract) functions of a document type, or None."""
     if doc_type == "PO":
-        print("⚠️ Could not rename: missing date_norm or order_number.")
-    elif doc_type == "RO":
-        print("⚠️ Could not rename: missing date_norm or reception_number.")
-    else:
-        print("⚠️ Skipping rename for unsupported document type.")
+        from extractors import PO_final_extractor as mod
+        return mod.ocr_header, mod.ocr_footer, mod.extract_PO_data
+    if doc_type == "RO":
+        from extractors import RO_final_extractor as mod
+        return mod.ocr_header, mod.ocr_footer, mod.extract_RO_data
+    return None
+
+
+def extract_fields(meta: dict, header=None, footer=None, header_dpi=None, footer_dpi=None):
+    """Run the extractor of the document type; None for unsupported types.
+
+    `header`/`footer` are already-parsed results (e.g. from the text layer)
+    that skip OCR; `header_dpi`/`footer_dpi` are the DPIs they were read at.
+    """
+    pdf_path = meta.get("path")
+    doc_type = meta.get("type")
+
+    print(f"📄 Processing: {pdf_path} ({doc_type})")
+
+    # === Run extraction according to type ===
+    funcs = extractor(doc_type)
+    if funcs is None:
+        print(f"⚠️ Unknown document type: {doc_type}")
+        return None
+    *_, extract = funcs
+    output = extract(pdf_path, header, footer, header_dpi, footer_dpi)
+
+    print(json.dumps(output, ensure_ascii=False, indent=2))
+    return output
+
+
+def finish_document(pdf_path: str, doc_type: str, output: dict, digest: str, source=None) -> dict:
+    """Rename the files of an extracted document and queue its row in the store."""
+    with span("rename"):
+        pdf_path = rename_outputs(pdf_path, doc_type, output, digest)
+
+    result = {"path": pdf_path, "type": doc_type, "fields": output}
+    with span("store"):
+        store.record(digest, dict(result, source=source))
+
+    print(f"🏁 Final file: {pdf_path}")
+    return result
+
+
+def process_document(meta: dict, header=None, footer=None, header_dpi=None,
+                     digest=None, source=None) -> dict:
+    """Extract fields for a detected document, rename its files and store them.
+
+    `meta` is the dict returned by detect_type(); see extract_fields() for
+    `header`, `footer` and `header_dpi`. `digest` (content hash, computed
+    when not given) keys the row in the result store; `source` is recorded
+    with it. Returns the final path, the type and the extracted fields
+    (None for unsupported types).
+    """
+    output = extract_fields(meta, header, footer, header_dpi)
+    if output is None:
+        return {"path": meta.get("path"), "type": meta.get("type"), "fields": None}
+
+    # === Drop the shared page rasters, every stage is done with them ===
+    if digest is None:
+        digest = page_cache.file_hash(meta["path"])
+    page_cache.release_digest(digest)
+
+    return finish_document(meta["path"], meta["type"], output, digest, source)
+
+
+def main():
+    # === Input from detect_type.py ===
+    if len(sys.argv) < 2:
+        print("❌ No JSON input provided")
+        sys.exit(1)
+
+    meta = json.loads(sys.argv[1])
+    pdf_path = meta.get("path")
+
+    if not pdf_path or not os.path.exists(pdf_path):
+        print(f"❌ PDF not found: {pdf_path}")
+        sys.exit(1)
+
+    result = process_document(meta)
+    if result["fields"] is None:
+        sys.exit(1)
+
 
-print(f"🏁 Final file: {pdf_path}")
+if __name__ == "__main__":
+    main()
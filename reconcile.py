@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""PO ↔ RO reconciliation on top of the result store.
+
+Receptions are joined to their purchase order through the digits of the
+order number (store.order_key: the PO's "DAC…" reference and the RO's
+N° Commande), summed per order and compared with the PO totals. One row per
+order key lives in the `reconciliation` table:
+
+    matched       RO totals equal the PO totals (within TOLERANCE)
+    partial       less was received than ordered (TTC)
+    over          more was received than ordered (TTC)
+    mismatch      TTC agrees but the HT / TVA split does not
+    incomplete    a total is missing on the PO or on a reception
+    duplicate_po  several POs carry the same order number
+    unmatched_po  PO without any reception yet
+    unmatched_ro  reception(s) without a known PO
+
+store.flush() calls refresh() for the order keys of each batch, inside the
+batch's transaction, so the table is always current without rescans. One
+GROUP BY over the (order_key, document_type) index rebuilds everything.
+
+    python3 reconcile.py rebuild
+    python3 reconcile.py report [--status mismatch] [--limit 50]
+    python3 reconcile.py show ORDER_NUMBER
+    python3 reconcile.py stats
+"""
+import sys, json, argparse
+
+import store
+from extractors.adaptive import TOTALS_TOLERANCE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reconciliation (
+    order_key    TEXT PRIMARY KEY,
+    po_count     INTEGER NOT NULL,
+    ro_count     INTEGER NOT NULL,
+    po_digest    TEXT,
+    po_ht        REAL,
+    po_tax       REAL,
+    po_ttc       REAL,
+    ro_ht        REAL,
+    ro_tax       REAL,
+    ro_ttc       REAL,
+    delta_ht     REAL,
+    delta_tax    REAL,
+    delta_ttc    REAL,
+    status       TEXT NOT NULL,
+    updated_at   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reconciliation_status ON reconciliation (status);
+"""
+
+# Per-order aggregate of the documents table; deltas are received − ordered.
+# A total missing on any document makes the sum NULL (→ incomplete).
+_GROUPS = """
+SELECT order_key,
+       SUM(document_type = 'PO') AS po_count,
+       SUM(document_type = 'RO') AS ro_count,
+       MAX(CASE WHEN document_type = 'PO' THEN digest END) AS po_digest,
+       {po_ht} AS po_ht, {po_tax} AS po_tax, {po_ttc} AS po_ttc,
+       {ro_ht} AS ro_ht, {ro_tax} AS ro_tax, {ro_ttc} AS ro_ttc
+FROM documents
+WHERE order_key IS NOT NULL AND document_type IN ('PO', 'RO') {filter}
+GROUP BY order_key
+""".format(
+    filter="{filter}",
+    **{
+        f"{t.lower()}_{f}": (
+            f"CASE WHEN SUM(document_type = '{t}' AND total_{f} IS NULL) = 0 "
+            f"THEN SUM(CASE WHEN document_type = '{t}' THEN total_{f} END) END"
+        )
+        for t in ("PO", "RO")
+        for f in ("ht", "tax", "ttc")
+    },
+)
+
+_INSERT = """
+INSERT INTO reconciliation
+SELECT order_key, po_count, ro_count, po_digest,
+       po_ht, po_tax, po_ttc, ro_ht, ro_tax, ro_ttc,
+       ro_ht - po_ht, ro_tax - po_tax, ro_ttc - po_ttc,
+       CASE
+           WHEN po_count = 0 THEN 'unmatched_ro'
+           WHEN ro_count = 0 THEN 'unmatched_po'
+           WHEN po_count > 1 THEN 'duplicate_po'
+           WHEN po_ttc IS NULL OR ro_ttc IS NULL THEN 'incomplete'
+           WHEN ro_ttc - po_ttc < -(:abs + ABS(po_ttc) * :rel) THEN 'partial'
+           WHEN ro_ttc - po_ttc > :abs + ABS(po_ttc) * :rel THEN 'over'
+           WHEN ABS(COALESCE(ro_ht - po_ht, 0)) > :abs + ABS(po_ttc) * :rel
+             OR ABS(COALESCE(ro_tax - po_tax, 0)) > :abs + ABS(po_ttc) * :rel THEN 'mismatch'
+           ELSE 'matched'
+       END,
+       strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')
+FROM ({groups})
+"""
+
+# Same tolerance as the HT + TVA = TTC check of the extractors
+TOLERANCE = {"abs": TOTALS_TOLERANCE, "rel": 0.001}
+CHUNK = 500  # order keys per statement (SQLite host parameter limit)
+
+
+def _ensure(conn):
+    # Plain execute(): executescript() would commit the caller's transaction
+    for statement in filter(str.strip, SCHEMA.split(";")):
+        conn.execute(statement)
+
+
+def refresh(conn, keys):
+    """Recompute the given order keys (call inside the writing transaction)."""
+    keys = [k for k in keys if k]
+    if not keys:
+        return
+    _ensure(conn)
+    for i in range(0, len(keys), CHUNK):
+        chunk = keys[i:i + CHUNK]
+        marks = ", ".join(f":k{j}" for j in range(len(chunk)))
+        params = dict(TOLERANCE, **{f"k{j}": k for j, k in enumerate(chunk)})
+        conn.execute(f"DELETE FROM reconciliation WHERE order_key IN ({marks})", params)
+        conn.execute(
+            _INSERT.format(groups=_GROUPS.format(filter=f"AND order_key IN ({marks})")),
+            params,
+        )
+
+
+def rebuild(conn=None) -> int:
+    """Recompute every order from the documents table; returns the order count."""
+    conn = conn or store.connect()
+    _ensure(conn)
+    with conn:
+        conn.execute("DELETE FROM reconciliation")
+        conn.execute(_INSERT.format(groups=_GROUPS.format(filter="")), TOLERANCE)
+    return conn.execute("SELECT COUNT(*) FROM reconciliation").fetchone()[0]
+
+
+def report(status=None, limit=None):
+    """Orders that need attention (everything but 'matched'), or one status."""
+    conn = store.connect()
+    _ensure(conn)
+    if status:
+        sql, params = "SELECT * FROM reconciliation WHERE status = ?", (status,)
+    else:
+        sql, params = "SELECT * FROM reconciliation WHERE status != 'matched'", ()
+    sql += " ORDER BY ABS(COALESCE(delta_ttc, 0)) DESC, order_key"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return [dict(r) for r in conn.execute(sql, params)]
+
+
+def unkeyed():
+    """PO/RO documents whose order number could not be read: never matchable."""
+    return [dict(r) for r in store.connect().execute(
+        "SELECT digest, path, document_type, date_norm, reception_number FROM documents "
+        "WHERE order_key IS NULL AND document_type IN ('PO', 'RO') ORDER BY id"
+    )]
+
+
+def show(order_number: str) -> dict:
+    """Reconciliation row and documents of one order."""
+    key = store.order_key(order_number)
+    conn = store.connect()
+    _ensure(conn)
+    row = conn.execute("SELECT * FROM reconciliation WHERE order_key = ?", (key,)).fetchone()
+    docs = conn.execute(
+        "SELECT document_type, path, date_norm, reception_number, total_ht, total_tax, total_ttc "
+        "FROM documents WHERE order_key = ? ORDER BY document_type, date_norm", (key,)
+    )
+    return {"reconciliation": dict(row) if row else None, "documents": [dict(d) for d in docs]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile receptions (RO) against purchase orders (PO).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild", help="recompute every order from the store")
+    r = sub.add_parser("report", help="orders that are not matched, as JSON lines")
+    r.add_argument("--status")
+    r.add_argument("--limit", type=int)
+    s = sub.add_parser("show", help="one order with its documents")
+    s.add_argument("order_number")
+    sub.add_parser("stats", help="orders per status")
+    args = parser.parse_args()
+
+    if args.cmd == "rebuild":
+        print(f"🔁 {rebuild()} orders reconciled")
+    elif args.cmd == "report":
+        for row in report(args.status, args.limit):
+            print(json.dumps(row, ensure_ascii=False))
+        if not args.status:
+            for doc in unkeyed():
+                print(json.dumps(dict(doc, status="no_order_number"), ensure_ascii=False))
+    elif args.cmd == "show":
+        print(json.dumps(show(args.order_number), ensure_ascii=False, indent=2))
+    else:
+        conn = store.connect()
+        _ensure(conn)
+        for status, n in conn.execute(
+            "SELECT status, COUNT(*) FROM reconciliation GROUP BY status ORDER BY status"
+        ):
+            print(f"{status:<14}{n:>8}")
+        print(f"{'no_order_number':<14}{len(unkeyed()):>8}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Persistent result cache keyed by PDF content hash.
+
+Suppliers re-send the same PO/RO; a byte-identical copy gets the stored
+type and fields back instead of going through detection and OCR again.
+One JSON file per document under CACHE_DIR; its mtime is refreshed on every
+hit, so eviction (oldest first, beyond MAX_ENTRIES or MAX_AGE_DAYS) is LRU.
+
+    python3 result_cache.py stats | evict | clear
+"""
+import os, sys, json, time
+
+CACHE_DIR = os.path.join("data", "cache", "results")
+MAX_ENTRIES = int(os.environ.get("INVOICEBRAIN_RESULT_CACHE_MAX", "100000"))
+MAX_AGE_DAYS = float(os.environ.get("INVOICEBRAIN_RESULT_CACHE_DAYS", "180"))
+EVICT_EVERY = 500  # puts between two eviction sweeps
+
+_puts = 0
+
+
+def _entry_path(digest: str) -> str:
+    return os.path.join(CACHE_DIR, digest[:2], f"{digest}.json")
+
+
+def get(digest: str):
+    """Cached result for `digest`, or None. Entries whose files vanished are dropped."""
+    path = _entry_path(digest)
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if time.time() - os.path.getmtime(path) > MAX_AGE_DAYS * 86400 or not os.path.exists(entry.get("path", "")):
+        invalidate(digest)
+        return None
+
+    os.utime(path)  # LRU: a hit makes the entry young again
+    return entry
+
+
+def put(digest: str, result: dict):
+    """Store the pipeline result ({path, type, fields}) for `digest`."""
+    global _puts
+    path = _entry_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {
+        "path": result["path"],
+        "type": result["type"],
+        "fields": result["fields"],
+        "cached_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+    _puts += 1
+    if _puts % EVICT_EVERY == 0:
+        evict()
+
+
+def invalidate(digest: str):
+    try:
+        os.remove(_entry_path(digest))
+    except FileNotFoundError:
+        pass
+
+
+def _entries():
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    found = []
+    for shard in os.scandir(CACHE_DIR):
+        if shard.is_dir():
+            found.extend(
+                (e.stat().st_mtime, e.path) for e in os.scandir(shard.path) if e.name.endswith(".json")
+            )
+    return found
+
+
+def evict(max_entries: int = MAX_ENTRIES, max_age_days: float = MAX_AGE_DAYS) -> int:
+    """Remove expired entries, then the least recently used beyond `max_entries`."""
+    entries = sorted(_entries())
+    cutoff = time.time() - max_age_days * 86400
+    expired = [p for m, p in entries if m < cutoff]
+    kept = [p for m, p in entries if m >= cutoff]
+    doomed = expired + kept[:max(0, len(kept) - max_entries)]
+    for p in doomed:
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+    return len(doomed)
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if cmd == "stats":
+        print(f"📦 {len(_entries())} cached results in {CACHE_DIR}")
+    elif cmd == "evict":
+        print(f"🧹 Evicted {evict()} entries")
+    elif cmd == "clear":
+        print(f"🧹 Evicted {evict(max_entries=0)} entries")
+    else:
+        print("❌ Usage: result_cache.py stats | evict | clear")
+        sys.exit(1)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Pipelined scheduler: documents overlap across stages inside one process.
+
+pipeline.process() runs the stages of a document back to back. Here each
+stage has its own thread pool and a bounded queue in front of it:
+
+    detect   hash, title pass, filing        DETECT_WORKERS threads
+    extract  header ∥ footer OCR, parsing    OCR_WORKERS documents at a time
+    finish   rename, store                   one thread
+
+so document N+1 renders while N is in Tesseract and N-1 is renamed, and the
+header and footer of one document are OCRed at the same time. Poppler and
+Tesseract run as subprocesses and OpenCV releases the GIL, so threads are
+enough. Once footer templates were learned per supplier, the footer waits
+for the supplier code of its header instead, as in pipeline.process(). A full queue holds back the stage before it, and submit() blocks
+while the detect queue is full: at most about QUEUE_DEPTH + workers
+documents wait or run per stage.
+
+Journal transitions, result cache, telemetry and debug artifacts are the
+ones of pipeline.process(); a document's context variables travel with it
+from thread to thread. The time spent waiting in front of a stage is logged
+as a "wait_<stage>" span together with the queue depth found on arrival,
+and the queue depths are printed every REPORT_SECONDS while work is queued.
+CPU times of concurrent spans overlap: compare wall times.
+
+Used by `batch.py --pipelined` and `watch_incoming.py --pipelined`.
+"""
+import os, sys, time, asyncio, threading, contextlib, contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from extractors import telemetry
+
+DETECT_WORKERS = int(os.environ.get("INVOICEBRAIN_DETECT_WORKERS", "2"))
+OCR_WORKERS = int(os.environ.get("INVOICEBRAIN_OCR_WORKERS", os.cpu_count() or 1))
+QUEUE_DEPTH = int(os.environ.get("INVOICEBRAIN_QUEUE_DEPTH", "4"))
+REPORT_SECONDS = 10
+
+STAGES = ("detect", "extract", "finish")
+
+
+class _Doc:
+    """A document on its way through the stages."""
+
+    def __init__(self, label, force=False, debug=None, pdf_path=None, job_id=None):
+        self.label = label
+        self.pdf_path = pdf_path
+        self.job_id = job_id
+        self.force = force
+        self.debug = debug
+        self.job = None
+        self.result = None
+        self.future = Future()
+        # Entered in the first stage, left in the last one
+        self.context = contextvars.copy_context()
+        self.telemetry = contextlib.ExitStack()
+        self.scope = contextlib.ExitStack()
+        self.queued_at = 0.0
+        self.depth = 0
+
+
+class AsyncPipeline:
+    """In-process pipelined scheduler, used like batch.WorkerPool."""
+
+    def __init__(self, detect_workers: int = DETECT_WORKERS, ocr_workers: int = OCR_WORKERS,
+                 depth: int = QUEUE_DEPTH):
+        from batch import THREAD_ENV
+        os.environ.update(THREAD_ENV)  # one thread per tesseract: the pools give the parallelism
+        import cv2
+        cv2.setNumThreads(1)
+        import pipeline  # noqa: F401  warm the imports before the first document
+
+        self.workers = {"detect": max(1, detect_workers), "extract": max(1, ocr_workers), "finish": 1}
+        self.depth = max(1, depth)
+        self.executors = {
+            "detect": ThreadPoolExecutor(self.workers["detect"], thread_name_prefix="detect"),
+            # header and footer of each document in extraction
+            "extract": ThreadPoolExecutor(2 * self.workers["extract"], thread_name_prefix="ocr"),
+            "finish": ThreadPoolExecutor(1, thread_name_prefix="finish"),
+        }
+        self.inflight = 0
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._serve, args=(ready,), name="scheduler", daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    # -- event loop side ---------------------------------------------------
+
+    def _serve(self, ready: threading.Event):
+        asyncio.set_event_loop(self.loop)
+        self.queues = {stage: asyncio.Queue(self.depth) for stage in STAGES}
+        self.tasks = [self.loop.create_task(self._worker(stage))
+                      for stage in STAGES for _ in range(self.workers[stage])]
+        self.tasks.append(self.loop.create_task(self._report()))
+        ready.set()
+        self.loop.run_forever()
+
+    async def _put(self, stage: str, doc: _Doc):
+        doc.queued_at, doc.depth = time.perf_counter(), self.queues[stage].qsize()
+        await self.queues[stage].put(doc)
+
+    def _run(self, stage: str, doc: _Doc, fn, *args):
+        """Run fn(*args) on the stage's pool, in the document's context."""
+        # A copy per call: the header and footer reads run at the same time
+        ctx = doc.context.copy()
+        return self.loop.run_in_executor(self.executors[stage], ctx.run, fn, *args)
+
+    async def _worker(self, stage: str):
+        step = getattr(self, f"_{stage}")
+        queue = self.queues[stage]
+        while True:
+            doc = await queue.get()
+            waited = (time.perf_counter() - doc.queued_at) * 1000
+            try:
+                going_on = await step(doc)
+                # After the step: the detect step opens the telemetry document
+                doc.context.run(telemetry.add_span, f"wait_{stage}", waited, depth=doc.depth)
+            except Exception as e:
+                await self._close(doc, e)
+            else:
+                if going_on and stage != STAGES[-1]:
+                    await self._put(STAGES[STAGES.index(stage) + 1], doc)
+                else:
+                    await self._close(doc)
+            finally:
+                queue.task_done()
+
+    async def _detect(self, doc: _Doc) -> bool:
+        # The document context is entered here and every later stage sees it
+        return await self.loop.run_in_executor(
+            self.executors["detect"], doc.context.run, self._begin, doc
+        )
+
+    def _begin(self, doc: _Doc) -> bool:
+        import journal, pipeline
+        if doc.job_id is None:
+            doc.telemetry.enter_context(telemetry.document(doc.pdf_path))
+            doc.job, doc.result = pipeline._open(doc.pdf_path, doc.force)
+            if doc.job is None:
+                return False  # duplicate, or run by another process
+        else:
+            if not journal.claim(doc.job_id):
+                return False
+            doc.job = journal.get(doc.job_id)
+            print(f"♻️ Resuming job {doc.job_id} ({doc.job['state']}): {doc.job['path']}")
+            doc.telemetry.enter_context(telemetry.document(doc.job["path"]))
+            telemetry.annotate(resumed_from=doc.job["state"])
+        doc.scope.enter_context(pipeline._job_scope(doc.job, doc.debug))
+        return pipeline._detect(doc.job)
+
+    async def _extract(self, doc: _Doc) -> bool:
+        import pipeline, process_doc
+        from extractors import layout
+        job = doc.job
+        reads, given = {}, {}
+        funcs = process_doc.extractor(job["doc_type"]) if job["state"] == "detected" else None
+        if funcs is not None:
+            ocr_header, ocr_footer, _ = funcs
+            header = job["context"].get("header")
+            footer_needed = not job["context"].get("footer")
+            if not header and footer_needed and layout.has_supplier_templates(job["doc_type"], "footer"):
+                # The footer could go to its supplier's template: the header
+                # (and its supplier code) is read first instead of alongside
+                header, given["header_dpi"] = await self._run("extract", doc, ocr_header, job["path"])
+                given["header"] = header
+            elif not header:
+                reads["header"] = self._run("extract", doc, ocr_header, job["path"])
+            if footer_needed:
+                supplier = (header or {}).get("supplier_code")
+                reads["footer"] = self._run("extract", doc, ocr_footer, job["path"], supplier)
+        # Both reads finish before a failure is raised: none outlives the job
+        values = await asyncio.gather(*reads.values(), return_exceptions=True)
+        for part, value in zip(reads, values):
+            if isinstance(value, BaseException):
+                raise value
+            given[part], given[f"{part}_dpi"] = value
+        return await self._run("extract", doc, lambda: pipeline._extract(job, **given))
+
+    async def _finish(self, doc: _Doc) -> bool:
+        import pipeline
+        return await self._run("finish", doc, pipeline._finish, doc.job)
+
+    async def _close(self, doc: _Doc, error: BaseException = None):
+        """Leave the document's scopes (journaling a failure) and resolve its future."""
+        import pipeline
+
+        def close():
+            if error is None:
+                doc.scope.close()
+                if doc.job is not None:
+                    doc.result = pipeline._done(doc.job)
+                doc.telemetry.close()
+            else:
+                exc = (type(error), error, error.__traceback__)
+                try:
+                    doc.scope.__exit__(*exc)
+                finally:
+                    doc.telemetry.__exit__(*exc)
+            return doc.result
+
+        try:
+            result = await self.loop.run_in_executor(self.executors["finish"], doc.context.run, close)
+        except BaseException as e:
+            error = error or e
+        if error is None:
+            doc.future.set_result(result)
+        else:
+            doc.future.set_exception(error)
+        self.inflight -= 1
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(REPORT_SECONDS)
+            if any(q.qsize() for q in self.queues.values()):
+                print(f"📥 {self.describe()}")
+
+    async def _drain(self):
+        # A document reaches the next queue before leaving this one, so
+        # joining the queues in order waits for everything in flight
+        for stage in STAGES:
+            await self.queues[stage].join()
+
+    async def _stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    # -- caller side -------------------------------------------------------
+
+    def depths(self) -> dict:
+        """Documents waiting in front of each stage."""
+        return {stage: self.queues[stage].qsize() for stage in STAGES}
+
+    def describe(self) -> str:
+        queues = " · ".join(f"{s} {n}/{self.depth}" for s, n in self.depths().items())
+        return f"queues: {queues} · in flight {self.inflight}"
+
+    def _enter(self, doc: _Doc) -> Future:
+        async def put():
+            self.inflight += 1
+            await self._put(STAGES[0], doc)
+        # Blocks while the detect queue is full: backpressure on the caller
+        asyncio.run_coroutine_threadsafe(put(), self.loop).result()
+        return doc.future
+
+    def submit(self, pdf_path: str, force: bool = False, debug: bool = None) -> Future:
+        return self._enter(_Doc(pdf_path, force, debug, pdf_path=pdf_path))
+
+    def submit_resume(self, job_id: int, debug: bool = None) -> Future:
+        return self._enter(_Doc(job_id, debug=debug, job_id=job_id))
+
+    def run(self, pdf_paths, force: bool = False, debug: bool = None, job_ids=()):
+        """Same contract as batch.WorkerPool.run()."""
+        futures = {self.submit_resume(j, debug): j for j in job_ids}
+        futures.update({self.submit(p, force, debug): p for p in pdf_paths})
+        for fut in as_completed(futures):
+            try:
+                yield futures[fut], fut.result(), None
+            except Exception as e:
+                yield futures[fut], None, e
+
+    def shutdown(self, wait: bool = True):
+        if wait:
+            asyncio.run_coroutine_threadsafe(self._drain(), self.loop).result()
+        asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait)
+
+
+if __name__ == "__main__":
+    print("ℹ️ Use batch.py --pipelined or watch_incoming.py --pipelined")
+    sys.exit(1)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Split scanned stacks (many POs / ROs in one PDF) into one PDF per document.
+
+The mailroom scans whole piles into a single file; detection only reads
+page 1 and the footers only the last page, so every document in between
+used to be lost. Here the stack is read one page at a time: the title band
+of the page is taken from the text layer or rasterized alone (lowest DPI
+level) and OCRed, then dropped before the next page, so memory does not
+grow with the stack.
+
+A page titled BON DE COMMANDE / BON DE RECEPTION starts a new document,
+unless it repeats the header number of the document in progress (headers
+reprinted on every page); any other page continues the current document.
+Pages before the first title form a part of their own, so nothing is
+dropped. Each part is cut with pdfseparate + pdfunite and yielded as soon
+as its last page is known: callers extract it while the rest of the stack
+is still being read. Keep stacks out of incoming/: the watcher would take
+them for a single document.
+
+    python3 split_batch.py SCAN.pdf [...] [--out incoming]   # the watcher takes the parts
+    python3 batch.py --split SCAN.pdf [...]                  # parts go straight to the workers
+"""
+import os, sys, shutil, argparse, subprocess, tempfile
+
+from extractors import page_cache, text_layer
+from extractors.adaptive import DPI_LEVELS
+from extractors.words import text_in
+from detect_type import PROCESSED, TITLE_BOX, classify_text, classify_words, read_top
+from pipeline import STAGES
+
+SPLIT_DIR = os.path.join("data", "split")  # parts waiting for the pipeline
+BATCHES_DIR = os.path.join(PROCESSED, "batches")  # stacks once fully split
+TIMEOUT = 120  # seconds per poppler call
+
+
+def _header_number(doc, text):
+    header_mod, _, dac_field = STAGES[doc]
+    return header_mod.parse_header(text.upper()).get(dac_field)
+
+
+def classify_page(pdf_path: str, page_no: int):
+    """(doc type, header number or None) of one page, from its title band."""
+    try:
+        size = text_layer.page_size(pdf_path, page_no)
+        text = text_layer.region_text(pdf_path, page_no, TITLE_BOX, size)
+    except Exception:
+        text = ""
+    if text:
+        doc = classify_text(text)
+        if doc not in STAGES:
+            return doc, None
+        box = STAGES[doc][0].HEADER_BOX
+        return doc, _header_number(doc, text_layer.region_text(pdf_path, page_no, box, size))
+
+    # Scanned page: a title reads fine at the lowest DPI level
+    words, _ = read_top(pdf_path, DPI_LEVELS[0], page_no)
+    page_cache.release_page(pdf_path, page_no)
+    doc = classify_words(words)
+    if doc not in STAGES:
+        return doc, None
+    return doc, _header_number(doc, text_in(words, STAGES[doc][0].HEADER_BOX))
+
+
+def group_pages(pages):
+    """Yield (first page, last page, doc type) runs of (page no, doc type, header number)."""
+    current = None  # [first, last, doc, header number]
+    for page_no, doc, number in pages:
+        repeated = (current is not None and doc == current[2]
+                    and number is not None and number == current[3])
+        if current is None or (doc in STAGES and not repeated):
+            if current is not None:
+                yield current[0], current[1], current[2]
+            current = [page_no, page_no, doc, number]
+        else:
+            current[1] = page_no
+    if current is not None:
+        yield current[0], current[1], current[2]
+
+
+def boundaries(pdf_path: str):
+    """Yield (first page, last page, doc type) of each document of the stack, in order."""
+    yield from group_pages(
+        (page_no, *classify_page(pdf_path, page_no))
+        for page_no in range(1, page_cache.page_count(pdf_path) + 1)
+    )
+
+
+def cut(pdf_path: str, first: int, last: int, dest: str):
+    """Write pages first..last of `pdf_path` to `dest` (appears complete, never partial)."""
+    # Work inside a hidden folder next to dest: watchers of that folder
+    # only see the final rename
+    with tempfile.TemporaryDirectory(prefix=".split-", dir=os.path.dirname(dest) or ".") as tmp:
+        pattern = os.path.join(tmp, "p-%d.pdf")
+        subprocess.run(["pdfseparate", "-f", str(first), "-l", str(last), pdf_path, pattern],
+                       capture_output=True, timeout=TIMEOUT, check=True)
+        pages = [pattern % n for n in range(first, last + 1)]
+        part = pages[0]
+        if len(pages) > 1:
+            part = os.path.join(tmp, "part.pdf")
+            subprocess.run(["pdfunite", *pages, part],
+                           capture_output=True, timeout=TIMEOUT, check=True)
+        os.replace(part, dest)
+
+
+def split(pdf_path: str, out_dir: str = SPLIT_DIR):
+    """Yield the path of each document of a scanned stack as soon as it is cut.
+
+    Once every part is written the stack moves to BATCHES_DIR.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    try:
+        for first, last, doc in boundaries(pdf_path):
+            dest = os.path.join(out_dir, f"{stem}-p{first:03d}-{last:03d}.pdf")
+            cut(pdf_path, first, last, dest)
+            print(f"✂️ {doc} pages {first}-{last} of {os.path.basename(pdf_path)} → {dest}")
+            yield dest
+    finally:
+        page_cache.release(pdf_path)
+    os.makedirs(BATCHES_DIR, exist_ok=True)
+    shutil.move(pdf_path, os.path.join(BATCHES_DIR, os.path.basename(pdf_path)))
+
+
+def split_all(pdf_paths, out_dir: str = SPLIT_DIR):
+    """split() every stack in turn; one stream of part paths."""
+    for pdf_path in pdf_paths:
+        yield from split(pdf_path, out_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split scanned stacks into one PDF per document.")
+    parser.add_argument("stacks", nargs="+", help="scanned PDFs holding several documents")
+    parser.add_argument("--out", default="incoming",
+                        help="folder for the parts (default: incoming/, where the watcher takes them)")
+    args = parser.parse_args()
+
+    missing = [p for p in args.stacks if not os.path.exists(p)]
+    if missing:
+        print(f"❌ PDF not found: {', '.join(missing)}")
+        return 1
+    parts = sum(1 for _ in split_all(args.stacks, args.out))
+    print(f"🏁 {len(args.stacks)} stacks → {parts} documents in {args.out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
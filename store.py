@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""SQLite store of extraction results.
+
+One row per processed document (keyed by PDF content hash) with every
+extracted field as an indexed column, so questions like "the PO of this
+reception" or "all ROs of supplier X last month" are one query instead of
+opening thousands of CSVs. The database runs in WAL mode: readers (the
+query CLI, reconciliation) never block the pipeline.
+
+Rows are buffered and written in one transaction once BATCH_SIZE rows are
+queued or BATCH_SECONDS after the first one, and at exit; each worker
+process keeps its own buffer and connection, and no write transaction is
+held open between batches. The per-document field,value CSVs are no longer
+written by the extractors unless INVOICEBRAIN_WRITE_CSV=1; `export`
+rebuilds them.
+
+    python3 store.py query [--type PO|RO] [--order N] [--reception N]
+                           [--supplier CODE] [--since YYYYMMDD] [--until YYYYMMDD]
+    python3 store.py export [--out DIR]     # CSVs next to each PDF, or into DIR
+    python3 store.py stats
+"""
+import os, re, sys, csv, json, time, atexit, sqlite3, argparse, threading
+
+DB_PATH = os.environ.get("INVOICEBRAIN_DB", os.path.join("data", "invoicebrain.db"))
+WRITE_CSV = os.environ.get("INVOICEBRAIN_WRITE_CSV", "0").lower() in ("1", "true", "yes", "on")
+BATCH_SIZE = 50
+BATCH_SECONDS = 5.0
+BUSY_TIMEOUT_MS = 30000
+
+# CSV field order per document type (as the extractors always wrote them)
+CSV_FIELDS = {
+    "PO": ["document_type", "date", "date_norm", "order_number", "supplier_code",
+           "total_ht", "total_tax", "total_ttc"],
+    "RO": ["document_type", "date", "date_norm", "reception_number", "order_number",
+           "total_ht", "total_tax", "total_ttc"],
+}
+COLUMNS = ["digest", "path", "document_type", "date", "date_norm", "order_number",
+           "order_key", "reception_number", "supplier_code", "total_ht", "total_tax",
+           "total_ttc", "header_dpi", "footer_dpi", "source", "processed_at"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id               INTEGER PRIMARY KEY,
+    digest           TEXT NOT NULL UNIQUE,
+    path             TEXT NOT NULL,
+    document_type    TEXT NOT NULL,
+    date             TEXT,
+    date_norm        TEXT,
+    order_number     TEXT,
+    order_key        TEXT,
+    reception_number TEXT,
+    supplier_code    TEXT,
+    total_ht         REAL,
+    total_tax        REAL,
+    total_ttc        REAL,
+    header_dpi       INTEGER,
+    footer_dpi       INTEGER,
+    source           TEXT,
+    processed_at     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_type ON documents (document_type, date_norm);
+CREATE INDEX IF NOT EXISTS documents_order ON documents (order_number);
+CREATE INDEX IF NOT EXISTS documents_reception ON documents (reception_number);
+CREATE INDEX IF NOT EXISTS documents_supplier ON documents (supplier_code, date_norm);
+CREATE INDEX IF NOT EXISTS documents_date ON documents (date_norm);
+"""
+# Created after _migrate(): older databases get the column first
+INDEXES = """
+CREATE INDEX IF NOT EXISTS documents_order_key ON documents (order_key, document_type);
+"""
+
+_UPSERT = (
+    f"INSERT INTO documents ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+    "ON CONFLICT (digest) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in COLUMNS if c != "digest")
+)
+
+_connections = {}  # owner → (pid, db path, connection)
+_connect_lock = threading.RLock()
+_pending = []
+_oldest = None
+_lock = threading.Lock()
+
+
+def order_key(order_number):
+    """Digits of an order number: 'DAC0045123' (PO) and '45123' (RO) → '45123'."""
+    digits = re.sub(r"\D", "", order_number or "").lstrip("0")
+    return digits or None
+
+
+def _migrate(conn: sqlite3.Connection):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+    if "order_key" not in columns:
+        conn.create_function("order_key", 1, order_key, deterministic=True)
+        with conn:
+            conn.execute("ALTER TABLE documents ADD COLUMN order_key TEXT")
+            conn.execute("UPDATE documents SET order_key = order_key(order_number)")
+
+
+def connection(owner: str, setup=None, isolation_level: str = "",
+               synchronous: str = "NORMAL") -> sqlite3.Connection:
+    """This process's WAL connection to DB_PATH for `owner`, opened on first use.
+
+    Each module that writes (store, journal, names, layouts) has its own
+    connection, so one module's transactions never commit or roll back
+    another's. `setup(conn)` creates the owner's tables once;
+    `isolation_level` and `synchronous` are passed to sqlite3 / the pragma.
+    """
+    with _connect_lock:
+        pid, path, conn = _connections.get(owner, (None, None, None))
+        if pid != os.getpid() or path != DB_PATH:
+            os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+            conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000,
+                                   isolation_level=isolation_level, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={synchronous}")
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            if setup:
+                setup(conn)
+            _connections[owner] = (os.getpid(), DB_PATH, conn)
+        return conn
+
+
+def _setup(conn: sqlite3.Connection):
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    conn.executescript(INDEXES)
+
+
+def connect() -> sqlite3.Connection:
+    """This process's connection, schema created on first use."""
+    # synchronous=NORMAL: durable at checkpoints, safe with WAL
+    return connection("store", _setup)
+
+
+def write_csv(pdf_path: str, fields: dict) -> str:
+    """Write the legacy two-column field,value CSV next to `pdf_path`."""
+    csv_path = f"{os.path.splitext(pdf_path)[0]}.csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["field", "value"])
+        for k, v in fields.items():
+            w.writerow([k, v])
+    return csv_path
+
+
+def record(digest: str, result: dict):
+    """Queue the pipeline result ({path, type, fields, source}) of one document."""
+    global _oldest
+    fields = result.get("fields") or {}
+    row = dict(fields, digest=digest, path=result["path"],
+               order_key=order_key(fields.get("order_number")),
+               document_type=result["type"], source=result.get("source"),
+               processed_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    with _lock:
+        _pending.append(tuple(row.get(c) for c in COLUMNS))
+        if _oldest is None:
+            _oldest = time.monotonic()
+            # An idle watcher or worker still gets its last rows written
+            timer = threading.Timer(BATCH_SECONDS, flush)
+            timer.daemon = True
+            timer.start()
+        due = len(_pending) >= BATCH_SIZE
+    if due:
+        flush()
+
+
+def flush():
+    """Write every queued row in a single transaction."""
+    global _pending, _oldest
+    with _lock:
+        rows, _pending, _oldest = _pending, [], None
+        if not rows:
+            return
+        conn = connect()
+        key_at = COLUMNS.index("order_key")
+        with conn:
+            # A re-processed document may move to another order: refresh both
+            digests = [row[0] for row in rows]
+            keys = {k for (k,) in conn.execute(
+                f"SELECT order_key FROM documents WHERE digest IN ({', '.join('?' * len(digests))})",
+                digests,
+            )}
+            conn.executemany(_UPSERT, rows)
+            keys.update(row[key_at] for row in rows)
+            import reconcile  # reconciliation follows every batch, in the same transaction
+            reconcile.refresh(conn, keys)
+
+
+atexit.register(flush)
+
+
+def query(doc_type=None, order=None, reception=None, supplier=None,
+          since=None, until=None, limit=None):
+    """Rows matching every given filter, newest date first."""
+    clauses, params = [], []
+    for column, value in (("document_type", doc_type), ("order_number", order),
+                          ("reception_number", reception), ("supplier_code", supplier)):
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if since:
+        clauses.append("date_norm >= ?")
+        params.append(since)
+    if until:
+        clauses.append("date_norm <= ?")
+        params.append(until)
+    sql = "SELECT * FROM documents"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY date_norm DESC, id DESC"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    return [dict(r) for r in connect().execute(sql, params)]
+
+
+def export(out_dir: str = None) -> int:
+    """Write the per-document CSVs (next to each PDF, or into `out_dir`)."""
+    count = 0
+    for row in connect().execute("SELECT * FROM documents ORDER BY id"):
+        keys = CSV_FIELDS.get(row["document_type"])
+        if not keys:
+            continue
+        fields = {k: row[k] for k in keys if row[k]}
+        pdf_path = row["path"]
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+            pdf_path = os.path.join(out_dir, os.path.basename(pdf_path))
+        elif not os.path.isdir(os.path.dirname(pdf_path) or "."):
+            print(f"⚠️ Folder of {pdf_path} is gone, skipping")
+            continue
+        write_csv(pdf_path, fields)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or export the extraction result store.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    q = sub.add_parser("query", help="print matching documents as JSON lines")
+    q.add_argument("--type", choices=["PO", "RO"])
+    q.add_argument("--order", help="order number (DAC… for POs, digits for ROs)")
+    q.add_argument("--reception")
+    q.add_argument("--supplier")
+    q.add_argument("--since", help="YYYYMMDD, inclusive")
+    q.add_argument("--until", help="YYYYMMDD, inclusive")
+    q.add_argument("--limit", type=int)
+    e = sub.add_parser("export", help="write the legacy field,value CSVs")
+    e.add_argument("--out", help="write all CSVs into this folder instead")
+    sub.add_parser("stats", help="documents per type")
+    args = parser.parse_args()
+
+    if args.cmd == "query":
+        for row in query(args.type, args.order, args.reception, args.supplier,
+                         args.since, args.until, args.limit):
+            print(json.dumps(row, ensure_ascii=False))
+    elif args.cmd == "export":
+        print(f"📝 {export(args.out)} CSV files written")
+    else:
+        for row in connect().execute(
+            "SELECT document_type, COUNT(*) AS n, MIN(date_norm) AS first, MAX(date_norm) AS last "
+            "FROM documents GROUP BY document_type"
+        ):
+            print(f"{row['document_type']}: {row['n']} documents ({row['first']} → {row['last']})")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import store  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """An empty database and data/ folders in a temporary working directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(store, "DB_PATH", str(tmp_path / "data" / "invoicebrain.db"))
+    monkeypatch.setattr(store, "_connections", {})
+    monkeypatch.setattr(store, "_pending", [])
+    monkeypatch.setattr(store, "_oldest", None)
+    yield tmp_path
+    for _, _, conn in store._connections.values():
+        conn.close()
@@ -0,0 +1,32 @@
+from extractors.adaptive import escalate, header_ok, totals_ok
+
+
+def test_header_needs_a_calendar_date_and_a_dac_number():
+    assert header_ok({"date": "31/01/2024", "po_reference": "DAC45123"}, "po_reference")
+    assert not header_ok({"date": "31/02/2024", "po_reference": "DAC45123"}, "po_reference")
+    assert not header_ok({"date": "31/01/2024", "po_reference": "DAC45"}, "po_reference")
+
+
+def test_totals_must_add_up():
+    assert totals_ok({"total_ht": 100.0, "total_tax": 20.0, "total_ttc": 120.01})
+    assert not totals_ok({"total_ht": 100.0, "total_tax": 20.0, "total_ttc": 121.0})
+    assert not totals_ok({"total_ht": 100.0, "total_tax": None, "total_ttc": 120.0})
+
+
+def test_escalate_stops_at_the_first_level_that_passes():
+    rendered = []
+
+    def render(dpi):
+        rendered.append(dpi)
+        return f"crop@{dpi}"
+
+    result, dpi = escalate(lambda crop, dpi: (crop, dpi), render, lambda r: r[1] >= 300,
+                           levels=(200, 300, 400))
+    assert (result, dpi) == (("crop@300", 300), 300)
+    assert rendered == [200, 300]
+
+
+def test_escalate_keeps_the_highest_level_when_none_passes():
+    result, dpi = escalate(lambda crop, dpi: crop, lambda dpi: dpi, lambda r: False,
+                           levels=(200, 300))
+    assert (result, dpi) == (300, 300)
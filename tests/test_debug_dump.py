@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("cv2")
+
+from extractors import debug_dump  # noqa: E402
+
+
+def _scope(name):
+    with debug_dump.document(name, enabled=True):
+        return debug_dump._current.get()
+
+
+def test_dots_in_the_stem_are_kept():
+    assert _scope("scan.2024.01-1a2b3c4d") == "scan.2024.01-1a2b3c4d"
+    assert _scope("scan.2024.02-5e6f7a8b") != _scope("scan.2024.01-1a2b3c4d")
+
+
+def test_pdf_extension_is_dropped():
+    assert _scope("incoming/Scan 01.PDF") == "Scan_01"
@@ -0,0 +1,100 @@
+import os, time
+
+import pytest
+
+import journal, store
+
+FIELDS = {"document_type": "PO", "date": "31/01/2024", "date_norm": "20240131",
+          "order_number": "DAC0045123", "total_ht": 100.0, "total_tax": 20.0, "total_ttc": 120.0}
+
+
+def _renamed(digest="d1"):
+    job = journal.start("incoming/scan.pdf", digest)
+    journal.advance(job, "detected", path="data/PO_detected/scan.pdf", doc_type="PO",
+                    context={"source": "ocr"})
+    journal.advance(job, "extracted", context={"fields": FIELDS})
+    journal.advance(job, "renamed", path="data/PO_detected/PO-20240131-DAC0045123.pdf")
+    return job
+
+
+def test_transitions_are_stored(db):
+    job = _renamed()
+    stored = journal.get(job["id"])
+    assert stored["state"] == "renamed"
+    assert stored["doc_type"] == "PO"
+    assert stored["context"] == {"source": "ocr", "fields": FIELDS}
+    assert stored["owner"] is None and journal.due() == []
+
+
+def test_advance_from_a_stale_state(db):
+    job = journal.start("incoming/scan.pdf", "d1")
+    stale = dict(job)
+    journal.advance(job, "detected")
+    with pytest.raises(journal.StaleJob):
+        journal.advance(stale, "detected")
+
+
+def test_lease_keeps_other_processes_out(db):
+    job = journal.start("incoming/scan.pdf", "d1")
+    journal._write("UPDATE jobs SET owner = ? WHERE id = ?", (os.getpid() + 1, job["id"]))
+    assert not journal.claim(job["id"])
+    assert journal.start("incoming/scan.pdf", "d1") is None
+
+
+def test_fail_backs_off_then_gives_up(db, monkeypatch):
+    monkeypatch.setattr(journal, "MAX_ATTEMPTS", 2)
+    job = journal.start("incoming/scan.pdf", "d1")
+    journal.advance(job, "detected")
+    journal.fail(job, "tesseract crashed")
+    stored = journal.get(job["id"])
+    assert stored["state"] == "detected" and stored["attempts"] == 1
+    assert stored["next_attempt"] > time.time()
+    assert journal.due() == []
+
+    journal.fail(stored, "tesseract crashed again")
+    stored = journal.get(job["id"])
+    assert stored["state"] == "failed" and stored["resume_state"] == "detected"
+
+    assert journal.retry(job["id"])
+    stored = journal.get(job["id"])
+    assert stored["state"] == "detected" and stored["attempts"] == 0
+    assert journal.due() == [job["id"]]
+
+
+def test_recover_releases_leases_of_dead_processes(db, monkeypatch):
+    job = journal.start("incoming/scan.pdf", "d1")
+    assert journal.due() == []
+    monkeypatch.setattr(journal, "_alive", lambda pid: False)
+    assert journal.recover() == 1
+    assert journal.due() == [job["id"]]
+
+
+def test_recover_rerecords_rows_lost_with_the_batch(db):
+    _renamed("d1")
+    store._pending.clear()  # the process stopped before the batch was written
+    assert [job["digest"] for job in journal.unrecorded()] == ["d1"]
+
+    journal.recover()
+    (row,) = store.query()
+    assert row["digest"] == "d1" and row["order_key"] == "45123"
+    assert row["path"] == "data/PO_detected/PO-20240131-DAC0045123.pdf"
+    assert journal.unrecorded() == []
+
+
+def _start_in_child(barrier, digest):
+    barrier.wait()
+    journal.start("incoming/scan.pdf", digest)
+
+
+def test_concurrent_starts_open_one_job(db):
+    mp = pytest.importorskip("multiprocessing").get_context("fork")
+    journal.connect()  # schema in place before the children race
+    barrier = mp.Barrier(4)
+    children = [mp.Process(target=_start_in_child, args=(barrier, "d1")) for _ in range(4)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join(30)
+        assert child.exitcode == 0
+    count = journal.connect().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+    assert count == 1
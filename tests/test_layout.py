@@ -0,0 +1,63 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from extractors import layout  # noqa: E402
+from extractors.footer.PO_Total_Crop import FOOTER_ANCHORS  # noqa: E402
+from extractors.header.PO_Header_Crop import HEADER_ANCHORS  # noqa: E402
+
+# (line, top, text): one synthetic PO page, rows 0.03 apart
+PAGE = [
+    (0, 0.11, "BON DE COMMANDE"),
+    (1, 0.17, "Date : 31/01/2024"),
+    (2, 0.20, "Ref : DAC 45123"),
+    (3, 0.23, "Code Fournisseur : 123456"),
+    (4, 0.34, "Article Qte Prix Total HT"),
+    (5, 0.37, "Article 1234 Qte 2 10,00 20,00"),
+    (6, 0.40, "Livraison le 02/02/2024"),
+    (7, 0.705, "Total HT : 100,00"),
+    (8, 0.73, "TVA : 20,00"),
+    (9, 0.755, "Total TTC : 120,00"),
+]
+
+
+@pytest.fixture
+def page(monkeypatch):
+    def words(img, page_shape, box, **kwargs):
+        return [{"text": t, "line": n, "box": (0.05 + 0.1 * i, top, 0.14 + 0.1 * i, top + 0.012)}
+                for n, top, text in PAGE for i, t in enumerate(text.split())]
+    monkeypatch.setattr(layout.page_cache, "region", lambda *a, **k: np.zeros((10, 10), np.uint8))
+    monkeypatch.setattr(layout.prep, "top", lambda img: img)
+    monkeypatch.setattr(layout, "ocr_words", words)
+
+
+def test_header_block_holds_the_date(page):
+    box = layout.locate("x.pdf", 1, HEADER_ANCHORS, block="first")
+    assert box[1] < 0.17 and 0.23 < box[3] < 0.34
+
+
+def test_totals_block_skips_the_column_header(page):
+    box = layout.locate("x.pdf", 1, FOOTER_ANCHORS, block="last")
+    assert 0.40 < box[1] < 0.705 and box[3] > 0.755
+
+
+def test_failing_template_is_demoted_then_dropped(db, monkeypatch):
+    monkeypatch.setattr(layout, "_fingerprints", {})
+    template = ("supplier", "123456")
+    layout.learn("PO", "footer", (0.1, 0.6, 0.98, 0.7), supplier="123456")
+    layout._hit("PO", "footer", template)
+
+    assert not layout._miss("PO", "footer", template)  # had a hit: demoted only
+    assert layout.lookup("PO", "footer", "123456")[1] == template
+    assert layout._miss("PO", "footer", template)
+    assert layout.lookup("PO", "footer", "123456") == (None, None)
+
+
+def test_supplier_templates_are_known_per_part(db, monkeypatch):
+    monkeypatch.setattr(layout, "_fingerprints", {})
+    layout.learn("PO", "footer", (0.1, 0.6, 0.98, 0.7), fp="0" * 16)
+    assert not layout.has_supplier_templates("PO", "footer")
+    layout.learn("PO", "footer", (0.1, 0.6, 0.98, 0.7), supplier="123456")
+    assert layout.has_supplier_templates("PO", "footer")
+    assert not layout.has_supplier_templates("PO", "header")
@@ -0,0 +1,95 @@
+import os, threading
+
+import pytest
+
+import names
+
+
+def test_reserve_on_an_empty_database(db):
+    # The first connect() loads the index: must not deadlock on the lock
+    t = threading.Thread(target=names.reserve, args=("PO-20240131-DAC123-2", "abc"), daemon=True)
+    t.start()
+    t.join(10)
+    assert not t.is_alive(), "reserve() deadlocked"
+    assert names.allocate("PO-20240131-DAC123") == "PO-20240131-DAC123"
+    assert names.allocate("PO-20240131-DAC123") == "PO-20240131-DAC123-3"
+
+
+def test_allocate_hands_out_suffixes(db):
+    base = "PO-20240131-DAC123"
+    assert names.allocate(base, "a") == base
+    assert names.allocate(base, "b") == f"{base}-2"
+    assert names.allocate(base, "c") == f"{base}-3"
+
+
+def test_same_digest_gets_its_stem_back(db):
+    base = "RO-20240131-4512"
+    first = names.allocate(base, "a")
+    names.allocate(base, "b")
+    assert names.allocate(base, "a") == first
+
+
+def test_disown_keeps_the_stem_taken(db):
+    base = "RO-20240131-4512"
+    stem = names.allocate(base, "a")
+    names.disown(stem)
+    assert names.allocate(base, "a") == f"{base}-2"
+
+
+def test_release_frees_the_stem(db):
+    base = "RO-20240131-4512"
+    stem = names.allocate(base, "a")
+    names.release(stem)
+    assert names.allocate(base, "b") == stem
+
+
+def test_index_is_loaded_from_the_folders(db):
+    folder = os.path.join("data", "processed")
+    os.makedirs(folder)
+    open(os.path.join(folder, "PO-20240131-DAC9.pdf"), "w").close()
+    open(os.path.join(folder, "notes.txt"), "w").close()
+    assert names.allocate("PO-20240131-DAC9") == "PO-20240131-DAC9-2"
+
+
+def test_split():
+    assert names.split("PO-20240131-DAC123-3") == ("PO-20240131-DAC123", 3)
+    assert names.split("PO-20240131-DAC123") == ("PO-20240131-DAC123", 1)
+    assert names.split("scan_0042") is None
+
+
+def test_move_all_undoes_on_a_taken_target(tmp_path):
+    a, b, taken = tmp_path / "a", tmp_path / "b", tmp_path / "taken"
+    for p in (a, b, taken):
+        p.write_text(p.name)
+    with pytest.raises(FileExistsError):
+        names.move_all([(a, tmp_path / "a2"), (b, taken)])
+    assert a.read_text() == "a" and not (tmp_path / "a2").exists()
+    assert taken.read_text() == "taken"
+
+
+def test_move_all_skips_moves_already_done(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    (tmp_path / "a2").write_text("a")
+    b.write_text("b")
+    done = names.move_all([(a, tmp_path / "a2"), (b, tmp_path / "b2")])
+    assert done == [(b, tmp_path / "b2")]
+
+
+def test_allocate_reuses_the_first_gap(db):
+    base = "PO-20240131-DAC123"
+    for digest in "abc":
+        names.allocate(base, digest)
+    names.release(f"{base}-2")
+    assert names.allocate(base, "d") == f"{base}-2"
+    assert names.allocate(base, "e") == f"{base}-4"
+
+
+def test_reload_drops_stems_of_removed_files(db):
+    folder = os.path.join("data", "processed")
+    os.makedirs(folder)
+    for stem in ("PO-20240131-DAC9", "PO-20240131-DAC9-2"):
+        open(os.path.join(folder, f"{stem}.pdf"), "w").close()
+    names.connect()
+    os.remove(os.path.join(folder, "PO-20240131-DAC9.pdf"))
+    assert names.load(prune=True) == 1
+    assert names.allocate("PO-20240131-DAC9") == "PO-20240131-DAC9"
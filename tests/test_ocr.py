@@ -0,0 +1,18 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pytesseract")
+
+from extractors import ocr  # noqa: E402
+
+
+def test_pytesseract_is_told_the_resolution(monkeypatch):
+    calls = []
+    monkeypatch.setattr(ocr, "BACKEND", "pytesseract")
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string",
+                        lambda img, lang, config: calls.append(config) or "")
+    monkeypatch.setattr(ocr.pytesseract, "image_to_data",
+                        lambda img, lang, config, output_type: calls.append(config) or {})
+    ocr.image_to_string(None, config="--psm 7", dpi=200)
+    ocr.image_to_data(None, config="", dpi=100)
+    assert calls == ["--psm 7 --dpi 200", "--dpi 100"]
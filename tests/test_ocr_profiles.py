@@ -0,0 +1,13 @@
+from extractors.ocr_profiles import ocr_args
+
+
+def test_free_text_keeps_both_language_models():
+    for doc_type, field in (("default", "top"), ("PO", "header"), ("RO", "header"),
+                            ("default", "anchors")):
+        assert ocr_args(doc_type, field)["lang"] == "fra+eng"
+
+
+def test_numeric_fields_get_a_whitelist_and_a_single_line():
+    args = ocr_args("PO", "date")
+    assert "--psm 7" in args["config"]
+    assert "tessedit_char_whitelist=/0123456789" in args["config"]
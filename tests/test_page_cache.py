@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from extractors import page_cache  # noqa: E402
+from extractors.header.PO_Header_Crop import HEADER_BOX  # noqa: E402
+from detect_type import TITLE_BOX  # noqa: E402
+
+A4 = (595.0, 842.0)
+
+
+@pytest.fixture
+def renders(tmp_path, monkeypatch):
+    """Fake poppler: each render is a page-sized gradient cut to the box."""
+    calls = []
+
+    def render(pdf_path, page_no, box, dpi, gray):
+        calls.append((box, dpi))
+        w, h = A4[0] * dpi / 72, A4[1] * dpi / 72
+        page = (np.arange(int(h))[:, None] + np.arange(int(w))[None, :]) % 251
+        x1, y1, x2, y2 = page_cache._pixels(pdf_path, page_no, box, dpi)
+        return page[y1:y2, x1:x2].astype(np.uint8)
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(page_cache, "_memory", {})
+    monkeypatch.setattr(page_cache, "page_size", lambda pdf_path, page_no: A4)
+    monkeypatch.setattr(page_cache, "_render_region", render)
+    (tmp_path / "doc.pdf").write_bytes(b"%PDF-1.4 test")
+    return calls
+
+
+def test_header_is_cut_from_the_title_band(renders):
+    title = page_cache.region("doc.pdf", 1, TITLE_BOX, dpi=200, gray=True)
+    header = page_cache.region("doc.pdf", 1, HEADER_BOX, dpi=200, gray=True)
+    assert renders == [(TITLE_BOX, 200)]
+    direct = page_cache._render_region("doc.pdf", 1, HEADER_BOX, 200, True)
+    assert header.shape == direct.shape and (header == direct).all()
+    assert title.shape[0] > header.shape[0]
+
+
+def test_lower_dpi_is_downsampled_from_a_containing_region(renders):
+    page_cache.region("doc.pdf", 1, TITLE_BOX, dpi=300, gray=True)
+    page_cache.region("doc.pdf", 1, HEADER_BOX, dpi=200, gray=True)
+    assert renders == [(TITLE_BOX, 300)]
+
+
+def test_a_box_outside_the_cached_ones_is_rendered(renders):
+    page_cache.region("doc.pdf", 1, TITLE_BOX, dpi=200, gray=True)
+    page_cache.region("doc.pdf", 1, TITLE_BOX, dpi=300, gray=True)  # higher DPI
+    page_cache.region("doc.pdf", 1, (0.6, 0.7, 0.98, 0.78), dpi=200, gray=True)
+    page_cache.region("doc.pdf", 1, HEADER_BOX, dpi=200, gray=False)  # colour
+    assert len(renders) == 4
+
+
+def test_rasters_stay_in_memory_by_default(renders):
+    page_cache.region("doc.pdf", 1, TITLE_BOX, dpi=200, gray=True)
+    assert not os.path.exists(page_cache.CACHE_DIR)
+    page_cache.release("doc.pdf")
+    assert page_cache._memory == {}
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+import pipeline  # noqa: E402
+
+
+def test_reread_fills_only_the_missing_field(monkeypatch):
+    monkeypatch.setattr(pipeline, "text_in",
+                        lambda words, box: "DATE : 31/01/2024\nREF : DAC 45I234\n12345678")
+    monkeypatch.setattr(pipeline, "reread", lambda img, words, anchor, **kw: "DAC 4512345")
+    header = pipeline.header_from_words("PO", [], None, 200)
+    assert header["po_reference"] == "DAC4512345"
+    assert header["supplier_code"] == "12345678"  # not the re-read DAC digits
+    assert header["date_norm"] == "20240131"
+
+
+def test_unreadable_header_is_left_to_the_header_script(monkeypatch):
+    monkeypatch.setattr(pipeline, "text_in", lambda words, box: "DATE : 31/01/2024")
+    monkeypatch.setattr(pipeline, "reread", lambda img, words, anchor, **kw: "")
+    assert pipeline.header_from_words("PO", [], None, 200) is None
+
+
+def test_original_gone_before_filing_fails_at_once(db):
+    job = pipeline.journal.start("incoming/scan.pdf", "d1")
+    pipeline.journal.note(job, doc_type="PO", context={"filed_as": "PO_scan.pdf"})
+    assert pipeline._detect(job) is False
+    stored = pipeline.journal.get(job["id"])
+    assert stored["state"] == "failed" and stored["attempts"] == 1
@@ -0,0 +1,60 @@
+import reconcile, store
+
+
+def _record(digest, doc_type, order, ht, tax, ttc):
+    fields = {"order_number": order, "total_ht": ht, "total_tax": tax, "total_ttc": ttc}
+    store.record(digest, {"path": f"{digest}.pdf", "type": doc_type, "fields": fields})
+
+
+def _status(order):
+    return reconcile.show(order)["reconciliation"]["status"]
+
+
+def test_statuses(db):
+    _record("p1", "PO", "DAC0001001", 100.0, 20.0, 120.0)
+    _record("r1", "RO", "1001", 60.0, 12.0, 72.0)
+    _record("r2", "RO", "1001", 40.0, 8.0, 48.0)  # two receptions make up the order
+    _record("p2", "PO", "DAC0001002", 100.0, 20.0, 120.0)
+    _record("r3", "RO", "1002", 50.0, 10.0, 60.0)
+    _record("p3", "PO", "DAC0001003", 100.0, 20.0, 120.0)
+    _record("r4", "RO", "1003", 100.0, 20.0, 130.0)
+    _record("p4", "PO", "DAC0001004", 100.0, 20.0, 120.0)
+    _record("r5", "RO", "1004", 110.0, 10.0, 120.0)
+    _record("p5", "PO", "DAC0001005", 100.0, 20.0, None)
+    _record("r6", "RO", "1005", 100.0, 20.0, 120.0)
+    _record("p6", "PO", "DAC0001006", 100.0, 20.0, 120.0)
+    _record("p7", "PO", "DAC0001006", 100.0, 20.0, 120.0)
+    _record("r7", "RO", "1006", 100.0, 20.0, 120.0)
+    _record("p8", "PO", "DAC0001007", 100.0, 20.0, 120.0)
+    _record("r8", "RO", "1008", 100.0, 20.0, 120.0)
+    store.flush()
+
+    assert _status("1001") == "matched"
+    assert _status("1002") == "partial"
+    assert _status("1003") == "over"
+    assert _status("1004") == "mismatch"
+    assert _status("1005") == "incomplete"
+    assert _status("1006") == "duplicate_po"
+    assert _status("1007") == "unmatched_po"
+    assert _status("1008") == "unmatched_ro"
+
+
+def test_reprocessed_document_moves_to_its_new_order(db):
+    _record("p1", "PO", "DAC0001001", 100.0, 20.0, 120.0)
+    _record("r1", "RO", "1001", 100.0, 20.0, 120.0)
+    store.flush()
+    assert _status("1001") == "matched"
+
+    _record("r1", "RO", "1002", 100.0, 20.0, 120.0)  # order number read again, differently
+    store.flush()
+    assert _status("1001") == "unmatched_po"
+    assert _status("1002") == "unmatched_ro"
+
+
+def test_rebuild_matches_the_incremental_table(db):
+    _record("p1", "PO", "DAC0001001", 100.0, 20.0, 120.0)
+    _record("r1", "RO", "1001", 50.0, 10.0, 60.0)
+    store.flush()
+    before = reconcile.report()
+    assert reconcile.rebuild() == 1
+    assert [r["status"] for r in reconcile.report()] == [r["status"] for r in before] == ["partial"]
@@ -0,0 +1,43 @@
+import os, time
+
+import pytest
+
+import result_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    open("PO-20240131-DAC45123.pdf", "w").close()
+    return {"path": "PO-20240131-DAC45123.pdf", "type": "PO", "fields": {"total_ttc": 120.0}}
+
+
+def test_put_then_get(cache):
+    result_cache.put("ab12", cache)
+    entry = result_cache.get("ab12")
+    assert (entry["path"], entry["type"], entry["fields"]) == (cache["path"], "PO", cache["fields"])
+    assert result_cache.get("cd34") is None
+
+
+def test_entry_of_a_vanished_file_is_dropped(cache):
+    result_cache.put("ab12", cache)
+    os.remove(cache["path"])
+    assert result_cache.get("ab12") is None
+    assert not os.path.exists(result_cache._entry_path("ab12"))
+
+
+def test_expired_entry_is_dropped(cache, monkeypatch):
+    result_cache.put("ab12", cache)
+    old = time.time() - (result_cache.MAX_AGE_DAYS + 1) * 86400
+    os.utime(result_cache._entry_path("ab12"), (old, old))
+    assert result_cache.get("ab12") is None
+
+
+def test_evict_keeps_the_most_recently_used(cache):
+    for n, digest in enumerate(("aa01", "bb02", "cc03")):
+        result_cache.put(digest, cache)
+        os.utime(result_cache._entry_path(digest), (1e9 + n, time.time() - 10 + n))
+    result_cache.get("aa01")  # a hit makes it young again
+    assert result_cache.evict(max_entries=2) == 1
+    assert result_cache.get("bb02") is None
+    assert result_cache.get("aa01") and result_cache.get("cc03")
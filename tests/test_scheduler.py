@@ -0,0 +1,50 @@
+import asyncio, contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+import pipeline, process_doc, scheduler  # noqa: E402
+from extractors import layout  # noqa: E402
+
+
+def _extract(monkeypatch, learned):
+    """The supplier the footer was read with, and what reached pipeline._extract."""
+    seen = {}
+
+    def ocr_header(path):
+        return {"supplier_code": "123456"}, 200
+
+    def ocr_footer(path, supplier):
+        seen["supplier"] = supplier
+        return {}, 200
+
+    monkeypatch.setattr(layout, "has_supplier_templates", lambda doc_type, part: learned)
+    monkeypatch.setattr(process_doc, "extractor", lambda doc_type: (ocr_header, ocr_footer, None))
+    monkeypatch.setattr(pipeline, "_extract", lambda job, **given: seen.update(given) or True)
+    sched = scheduler.AsyncPipeline.__new__(scheduler.AsyncPipeline)
+    sched.loop = asyncio.new_event_loop()
+    sched.executors = {"extract": ThreadPoolExecutor(2)}
+    doc = scheduler._Doc("scan.pdf")
+    doc.job = {"state": "detected", "doc_type": "PO", "path": "scan.pdf", "context": {}}
+    doc.context = contextvars.copy_context()
+    try:
+        assert sched.loop.run_until_complete(sched._extract(doc))
+    finally:
+        sched.loop.close()
+        sched.executors["extract"].shutdown()
+    return seen
+
+
+def test_footer_waits_for_the_supplier_once_templates_exist(monkeypatch):
+    seen = _extract(monkeypatch, learned=True)
+    assert seen["supplier"] == "123456"
+    assert seen["header"] == {"supplier_code": "123456"} and seen["header_dpi"] == 200
+
+
+def test_header_and_footer_run_together_without_supplier_templates(monkeypatch):
+    seen = _extract(monkeypatch, learned=False)
+    assert seen["supplier"] is None
+    assert seen["header"] == {"supplier_code": "123456"} and seen["footer_dpi"] == 200
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from split_batch import group_pages  # noqa: E402
+
+
+def _runs(*pages):
+    return list(group_pages((n, doc, number) for n, (doc, number) in enumerate(pages, 1)))
+
+
+def test_each_title_starts_a_document():
+    assert _runs(("PO", "DAC1"), ("UNKNOWN", None), ("RO", "DAC2"), ("PO", "DAC3")) == [
+        (1, 2, "PO"), (3, 3, "RO"), (4, 4, "PO")]
+
+
+def test_reprinted_header_continues_the_document():
+    assert _runs(("PO", "DAC1"), ("PO", "DAC1"), ("PO", "DAC2"), ("PO", None)) == [
+        (1, 2, "PO"), (3, 3, "PO"), (4, 4, "PO")]
+
+
+def test_pages_before_the_first_title_are_kept():
+    assert _runs(("UNKNOWN", None), ("UNKNOWN", None), ("RO", "DAC2")) == [
+        (1, 2, "UNKNOWN"), (3, 3, "RO")]
+    assert _runs() == []
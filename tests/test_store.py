@@ -0,0 +1,65 @@
+import os
+
+import journal, names, store
+
+
+def test_each_module_has_its_own_connection(db):
+    conns = {store.connect(), journal.connect(), names.connect()}
+    assert len(conns) == 3
+    assert store.connect() is store.connect()
+    assert names.connect().isolation_level is None
+    (sync,) = journal.connect().execute("PRAGMA synchronous").fetchone()
+    assert sync == 2  # FULL
+    (mode,) = store.connect().execute("PRAGMA journal_mode").fetchone()
+    assert mode == "wal"
+
+
+def test_a_new_process_opens_a_new_connection(db, monkeypatch):
+    conn = store.connect()
+    monkeypatch.setattr(os, "getpid", lambda: -1)
+    assert store.connect() is not conn
+
+
+def _record(digest, doc_type="PO", **fields):
+    store.record(digest, {"path": f"data/processed/{digest}.pdf", "type": doc_type,
+                          "fields": dict({"document_type": doc_type}, **fields)})
+
+
+def test_rows_are_written_in_batches(db, monkeypatch):
+    monkeypatch.setattr(store, "BATCH_SIZE", 3)
+    _record("a", order_number="DAC0045123")
+    _record("b")
+    assert store.query() == []
+    _record("c")
+    assert len(store.query()) == 3 and store._pending == []
+
+
+def test_flush_writes_the_rest(db):
+    _record("a", order_number="DAC0045123", date_norm="20240131")
+    store.flush()
+    (row,) = store.query(doc_type="PO", since="20240101")
+    assert row["order_key"] == "45123" and row["path"] == "data/processed/a.pdf"
+
+
+def test_a_reprocessed_document_replaces_its_row(db):
+    _record("a", total_ttc=120.0)
+    store.flush()
+    _record("a", total_ttc=130.0)
+    store.flush()
+    (row,) = store.query()
+    assert row["total_ttc"] == 130.0
+
+
+def test_order_key():
+    assert store.order_key("DAC0045123") == store.order_key("45123") == "45123"
+    assert store.order_key(None) is None and store.order_key("DAC") is None
+
+
+def test_export_writes_the_legacy_csv(db):
+    os.makedirs(os.path.join("data", "processed"))
+    _record("a", order_number="DAC0045123", total_ttc=120.0)
+    store.flush()
+    assert store.export() == 1
+    with open(os.path.join("data", "processed", "a.csv"), encoding="utf-8") as f:
+        assert f.read().splitlines() == ["field,value", "document_type,PO",
+                                         "order_number,DAC0045123", "total_ttc,120.0"]
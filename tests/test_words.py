@@ -0,0 +1,40 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from extractors import words as words_mod  # noqa: E402
+
+LINE = [
+    {"text": "Date", "line": (1, 1, 1), "px": (10, 10, 60, 30)},
+    {"text": ":", "line": (1, 1, 1), "px": (65, 10, 70, 30)},
+    {"text": "31/01/2024", "line": (1, 1, 1), "px": (80, 10, 200, 30)},
+    {"text": "DAC", "line": (1, 1, 2), "px": (10, 40, 50, 60)},
+    {"text": "45123", "line": (1, 1, 2), "px": (55, 40, 120, 60)},
+]
+
+
+@pytest.fixture
+def crops(monkeypatch):
+    seen = []
+
+    def image_to_string(img, **kwargs):
+        seen.append(img.shape)
+        return " text "
+    monkeypatch.setattr(words_mod.ocr, "image_to_string", image_to_string)
+    return seen
+
+
+def test_reread_takes_the_rest_of_the_line(crops):
+    assert words_mod.reread(np.zeros((100, 300), np.uint8), LINE, r"DAC", pad=0) == "text"
+    assert crops == [(20, 110)]
+
+
+def test_reread_alone_takes_only_the_matching_word(crops):
+    words_mod.reread(np.zeros((100, 300), np.uint8), LINE, r"\d{2}[/.]\d{2}", pad=0, alone=True)
+    assert crops == [(20, 120)]
+
+
+def test_reread_without_a_match(crops):
+    assert words_mod.reread(np.zeros((100, 300), np.uint8), LINE, r"TTC") == ""
+    assert crops == []
@@ -1,12 +1,18 @@
 #!/usr/bin/env python3
 import os
 import time
-import subprocess
+import queue
+import argparse
 from datetime import datetime
 
+import journal
+from incoming_events import start_watcher
+from extractors import telemetry
+
 INCOMING_DIR = "incoming"
 PROCESSED_DIR = "data/processed"
-SLEEP_INTERVAL = 5  # seconds between directory checks
+DEDUP_WINDOW = 3600  # seconds a dispatched file signature is remembered
+RESUME_CHECK = 10  # seconds between looks at the journal for due retries
 
 os.makedirs(INCOMING_DIR, exist_ok=True)
 os.makedirs(PROCESSED_DIR, exist_ok=True)
@@ -15,59 +21,127 @@ def process_new_pdf(pdf_path: str):
     """Run the full classification + processing pipeline on one PDF."""
     print(f"📄 New file detected: {pdf_path}")
 
-    # 1️⃣ Run detect_type.py
+    from pipeline import process  # not before a pool has set its thread limits
     try:
-        print("🤖 Detecting document type...")
-        result = subprocess.run(
-            ["python3", "detect_type.py", pdf_path],
-            capture_output=True, text=True, check=True
-        )
-        print("📄 detect_type.py output:\n", result.stdout.strip())
-    except subprocess.CalledProcessError as e:
-        print(f"❌ detect_type.py failed for {pdf_path}")
-        print(e.stderr)
+        result = process(pdf_path)
+    except Exception as e:
+        print(f"❌ Pipeline failed for {pdf_path}: {e}")
         return
 
-    # 2️⃣ Run process_doc.py
-    try:
-        print("⚙️ Processing document...")
-        subprocess.run(
-            ["python3", "process_doc.py", result.stdout.strip()],
-            check=True
-        )
-
-    except subprocess.CalledProcessError as e:
-        print(f"❌ process_doc.py failed for {pdf_path}")
-        print(e.stderr)
+    if result is None:
+        return  # another worker owns its journal job
+    if result["fields"] is None:
+        print(f"⚠️ {pdf_path} left in {os.path.dirname(result['path'])} ({result['type']})")
         return
 
-    # 3️⃣ Mark completion (file already moved by detect_type.py)
     print("✅ Processing completed successfully!")
-    print("   (Original PDF already relocated by detect_type.py)")
+    print(f"   (Original PDF relocated to {PROCESSED_DIR})")
+
+
+def resume_job(job_id: int):
+    """Continue a journal job left unfinished or waiting for a retry."""
+    from pipeline import resume
+    try:
+        result = resume(job_id)
+    except Exception as e:
+        print(f"❌ Job {job_id} failed again: {e}")
+        return
+    if result is not None:
+        print(f"✅ Job {job_id} → {result['path']} ({result['type']})")
+
+
+def _report(pdf_path: str, fut):
+    try:
+        result = fut.result()
+    except Exception as e:
+        print(f"❌ Pipeline failed for {pdf_path}: {e}")
+        return
+    if result is not None:
+        print(f"✅ {pdf_path} → {result['path']} ({result['type']})")
+
+
+def _signature(pdf_path: str):
+    try:
+        st = os.stat(pdf_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
 
 
 def main():
-    print(f"👀 Watching folder: {INCOMING_DIR}")
-    seen: set[str] = set()
+    parser = argparse.ArgumentParser(description=f"Watch {INCOMING_DIR}/ and process new PDFs.")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="process documents in parallel with N warm worker processes")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="overlap the stages of successive documents in this process "
+                             "(scheduler.py); --workers sets the documents in OCR at a time")
+    parser.add_argument("--poll", action="store_true",
+                        help="list the folder periodically instead of using inotify")
+    args = parser.parse_args()
+
+    pool = None
+    handle, handle_job = process_new_pdf, resume_job
+    inflight = set()  # job ids handed to the pool and not finished yet
+    if args.pipelined:
+        from scheduler import AsyncPipeline
+        pool = AsyncPipeline(ocr_workers=args.workers)
+    elif args.workers > 1:
+        from batch import WorkerPool
+        pool = WorkerPool(args.workers)
+    if pool is not None:
+        def handle(pdf_path: str):
+            print(f"📄 New file queued: {pdf_path}")
+            pool.submit(pdf_path).add_done_callback(lambda fut: _report(pdf_path, fut))
+
+        def handle_job(job_id: int):
+            inflight.add(job_id)
+
+            def done(fut):
+                inflight.discard(job_id)
+                _report(f"job {job_id}", fut)
+            pool.submit_resume(job_id).add_done_callback(done)
+
+    # Jobs of a previous run that died mid-pipeline: free their leases
+    released = journal.recover()
+    if released:
+        print(f"♻️ Released {released} jobs left by a stopped process")
+
+    # kill -USR1 <pid> prints p50/p95/p99 per stage from the spans log
+    telemetry.install_summary_signal()
+
+    # Start watching before listing, so nothing written in between is missed.
+    ready: "queue.Queue[str]" = queue.Queue()
+    watcher = start_watcher(INCOMING_DIR, ready, poll=args.poll)
+    print(f"👀 Watching folder: {INCOMING_DIR} ({type(watcher).__name__})")
 
     # Process any PDFs already present before watching for new ones.
-    existing_files = sorted(
-        f for f in os.listdir(INCOMING_DIR) if f.lower().endswith(".pdf")
-    )
-    for filename in existing_files:
-        pdf_path = os.path.join(INCOMING_DIR, filename)
-        process_new_pdf(pdf_path)
-
-    seen.update(existing_files)
-
-    while True:
-        time.sleep(SLEEP_INTERVAL)
-        current_files = set(f for f in os.listdir(INCOMING_DIR) if f.lower().endswith(".pdf"))
-        new_files = sorted(current_files - seen)
-        for filename in new_files:
-            pdf_path = os.path.join(INCOMING_DIR, filename)
-            process_new_pdf(pdf_path)
-        seen = current_files
+    for filename in sorted(f for f in os.listdir(INCOMING_DIR) if f.lower().endswith(".pdf")):
+        ready.put(os.path.join(INCOMING_DIR, filename))
+
+    dispatched = {}  # file signature → dispatch time, drops duplicate events
+    next_check = 0.0
+    try:
+        while True:
+            # Unfinished and retry-due journal jobs, between new files
+            if time.monotonic() >= next_check:
+                for job_id in journal.due():
+                    if job_id not in inflight:
+                        handle_job(job_id)
+                next_check = time.monotonic() + RESUME_CHECK
+            try:
+                pdf_path = ready.get(timeout=RESUME_CHECK)
+            except queue.Empty:
+                continue
+            sig = _signature(pdf_path)
+            if sig is None or sig in dispatched:
+                continue  # already moved away, or reported twice
+            now = time.monotonic()
+            dispatched = {s: t for s, t in dispatched.items() if now - t < DEDUP_WINDOW}
+            dispatched[sig] = now
+            handle(pdf_path)
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
 if __name__ == "__main__":
     main()